@@ -0,0 +1,134 @@
+"""Synthetic graph generators for benchmarks.
+
+Each generator writes python source for a graph of watched functions
+and executes it in a fresh namespace so that dependency discovery sees
+real function calls, exactly as it would in user code.
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Tuple
+
+from calcengine import CalcEngine
+
+PATH = "bench."
+
+DECORATOR = f'@ce.watch(path="{PATH}")'
+
+
+@dataclass
+class Graph:
+    """Generated graph of watched functions.
+
+    top evaluates the whole graph. inputs are (function, args) pairs
+    that can be invalidated, eg inputs[0][0].invalidate(*inputs[0][1]).
+    """
+
+    name: str
+    engine: CalcEngine
+    top: Callable[[], Any]
+    inputs: List[Tuple[Callable, tuple]] = field(default_factory=list)
+
+    def invalidate(self, n: int = 1):
+        for func, args in self.inputs[:n]:
+            func.invalidate(*args)
+
+
+def _build(source: str):
+    ce = CalcEngine()
+    ns = {"ce": ce}
+    exec(compile(source, f"<{PATH}>", "exec"), ns)
+    return ce, ns
+
+
+def _watched(name: str, body: str, args: str = ""):
+    return f"{DECORATOR}\ndef {name}({args}):\n    return {body}\n"
+
+
+def _sum_calls(names):
+    return " + ".join(f"{n}()" for n in names) or "0"
+
+
+def chain(n: int):
+    """n0 <- n1 <- .. <- n(n-1), each node requiring the previous."""
+    source = _watched("n0", "1")
+    for i in range(1, n):
+        source += _watched(f"n{i}", f"n{i - 1}() + 1")
+    ce, ns = _build(source)
+    return Graph("chain", ce, ns[f"n{n - 1}"], [(ns["n0"], ())])
+
+
+def fan_in(n: int):
+    """Single node requiring n independent leaves."""
+    leaves = [f"l{i}" for i in range(n)]
+    source = "".join(_watched(name, str(i)) for i, name in enumerate(leaves))
+    source += _watched("top", _sum_calls(leaves))
+    ce, ns = _build(source)
+    return Graph("fan_in", ce, ns["top"], [(ns[name], ()) for name in leaves])
+
+
+def fan_out(n: int):
+    """Single leaf required by n nodes which are summed by top."""
+    children = [f"c{i}" for i in range(n)]
+    source = _watched("source", "1")
+    source += "".join(
+        _watched(name, f"source() + {i}") for i, name in enumerate(children)
+    )
+    source += _watched("top", _sum_calls(children))
+    ce, ns = _build(source)
+    return Graph("fan_out", ce, ns["top"], [(ns["source"], ())])
+
+
+def diamonds(n: int):
+    """n stacked diamonds, a -> (b, c) -> d -> next a."""
+    source = _watched("a0", "1")
+    for i in range(n):
+        source += _watched(f"b{i}", f"a{i}() + 1")
+        source += _watched(f"c{i}", f"a{i}() * 2")
+        source += _watched(f"a{i + 1}", f"b{i}() + c{i}()")
+    ce, ns = _build(source)
+    return Graph("diamonds", ce, ns[f"a{n}"], [(ns["a0"], ())])
+
+
+def random_dag(n: int, max_requires: int = 3, seed: int = 0):
+    """n nodes each requiring up to max_requires earlier nodes."""
+    rng = random.Random(seed)
+    source = ""
+    required, leaves = set(), []
+    for i in range(n):
+        k = rng.randint(0, min(i, max_requires))
+        requires = [f"r{j}" for j in rng.sample(range(i), k)]
+        required.update(requires)
+        if not requires:
+            leaves.append(f"r{i}")
+        source += _watched(f"r{i}", _sum_calls(requires) if requires else str(i))
+    sinks = [f"r{i}" for i in range(n) if f"r{i}" not in required]
+    source += _watched("top", _sum_calls(sinks))
+    ce, ns = _build(source)
+    rng.shuffle(leaves)
+    return Graph("random_dag", ce, ns["top"], [(ns[name], ()) for name in leaves])
+
+
+def methods(n: int):
+    """Chain of n method nodes on a class instance, see tests.Foo."""
+    source = "class Foo:\n"
+    source += f"    {DECORATOR}\n    def m0(self):\n        return 1\n"
+    for i in range(1, n):
+        source += (
+            f"    {DECORATOR}\n"
+            f"    def m{i}(self):\n"
+            f"        return self.m{i - 1}() + 1\n"
+        )
+    ce, ns = _build(source)
+    foo = ns["Foo"]()
+    top = getattr(foo, f"m{n - 1}")
+    return Graph("methods", ce, top, [(ns["Foo"].m0, (foo,))])
+
+
+GENERATORS = {
+    "chain": chain,
+    "fan_in": fan_in,
+    "fan_out": fan_out,
+    "diamonds": diamonds,
+    "random_dag": random_dag,
+    "methods": methods,
+}
@@ -0,0 +1,161 @@
+"""Benchmarks for the calculation engine's core paths.
+
+Run from the repository root, eg:
+
+    python -m benchmarks.run --size 200 --output bench.json
+    python -m benchmarks.run --output new.json --compare bench.json
+
+Results are written as JSON including the git commit so runs can be
+compared across commits.
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+
+from .graphs import GENERATORS, Graph
+
+# number of hits timed per sample as a single hit is very quick
+HITS_PER_SAMPLE = 1000
+
+
+def _time(func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = perf_counter()
+        func()
+        samples.append(perf_counter() - start)
+    return samples
+
+
+def bench_graph(graph: Graph, repeat: int, batch: int):
+    ce, top = graph.engine, graph.top
+
+    def hits():
+        for _ in range(HITS_PER_SAMPLE):
+            top()
+
+    results = {}
+    results["cold"] = _time(top, repeat, setup=ce.clear_cache)
+
+    top()
+    results["warm_hit"] = [t / HITS_PER_SAMPLE for t in _time(hits, repeat)]
+    results["invalidate_one"] = _time(lambda: (graph.invalidate(1), top()), repeat)
+    results["invalidate_batch"] = _time(
+        lambda: (graph.invalidate(batch), top()), repeat
+    )
+
+    ce.clear_cache()
+    tracemalloc.start()
+    top()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = len(ce.cache)
+    rows = [
+        {
+            "graph": graph.name,
+            "nodes": nodes,
+            "metric": metric,
+            "unit": "s",
+            "min": min(samples),
+            "median": statistics.median(samples),
+            "repeat": len(samples),
+        }
+        for metric, samples in results.items()
+    ]
+    rows.append(
+        {
+            "graph": graph.name,
+            "nodes": nodes,
+            "metric": "memory_per_node",
+            "unit": "B",
+            "min": memory / max(nodes, 1),
+            "median": memory / max(nodes, 1),
+            "repeat": 1,
+        }
+    )
+    return rows
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:  # noqa
+        return None
+
+
+def run(graphs, size, repeat, batch):
+    results = []
+    for name in graphs:
+        graph = GENERATORS[name](size)
+        results.extend(bench_graph(graph, repeat, batch))
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.now().isoformat(),
+            "size": size,
+            "repeat": repeat,
+            "batch": batch,
+        },
+        "results": results,
+    }
+
+
+def compare(base, new):
+    """Lines comparing median of new results against base."""
+    base_rows = {(r["graph"], r["metric"]): r for r in base["results"]}
+    lines = [f"{'graph':<12} {'metric':<18} {'base':>12} {'new':>12} {'ratio':>7}"]
+    for row in new["results"]:
+        key = (row["graph"], row["metric"])
+        if key not in base_rows:
+            continue
+        b, n = base_rows[key]["median"], row["median"]
+        ratio = n / b if b else float("nan")
+        lines.append(f"{key[0]:<12} {key[1]:<18} {b:>12.3g} {n:>12.3g} {ratio:>7.2f}")
+    return lines
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--graphs", nargs="+", default=list(GENERATORS), choices=list(GENERATORS)
+    )
+    parser.add_argument("--size", type=int, default=200, help="nodes per graph")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--batch", type=int, default=10, help="inputs invalidated in batch"
+    )
+    parser.add_argument("--output", help="write JSON results to file")
+    parser.add_argument("--compare", help="JSON results to compare against")
+    args = parser.parse_args(args)
+
+    # deep chains recurse through several frames per node
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * args.size))
+
+    data = run(args.graphs, args.size, args.repeat, args.batch)
+    text = json.dumps(data, indent=2)
+    if args.output:
+        with open(args.output, "w") as fp:
+            fp.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            print("\n".join(compare(json.load(fp), data)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,15 @@
-from .base import CalcEngine
+from .base import CalcEngine, CycleError
+from .context import CalcContext
+from .dispatch import AsyncioDispatcher, ThreadDispatcher
+from .distributed import Coordinator
+from .var import Var
 
-__all__ = ['CalcEngine']
\ No newline at end of file
+__all__ = [
+    'CalcEngine',
+    'CycleError',
+    'CalcContext',
+    'Var',
+    'ThreadDispatcher',
+    'AsyncioDispatcher',
+    'Coordinator',
+]
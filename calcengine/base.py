@@ -1,39 +1,128 @@
 from functools import wraps, partial
 from collections import defaultdict
-from dataclasses import dataclass, field
+from concurrent.futures import Executor, ThreadPoolExecutor
 import logging
-from typing import Any, Optional
+import threading
+import weakref
+from time import monotonic, perf_counter
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    Hashable,
+    IO,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
-from .function_helper import FunctionHelper
-from .event import Event
-from .utility import deep_getattr
+from . import snapshot
+from .compression import Compression, CompressionStats, compression_of
+from .node import CompressedNodeData, NodeData
+from .function_helper import FunctionHelper, Watched, node_label
+from .dispatch import Dispatcher
+from .event import Event, EventBatch, Subscription
+from .feed import CALCULATED, INVALIDATED, SET, ChangeFeed, publish
+from .profiler import Profiler
+from .context import CalcContext
+from .dedup import ValueStore
+from .var import Var
+from .instances import InstanceRegistry
+from .tiers import TieredStore, pickled_size
+from .plan import Plan
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class NodeData:
-    """Store child nodes and cached values.
+class NodeEvent(Event):
+    """Node event that can queue batched subscribers on
+    the engine's event batch.
     """
 
-    requires: set = field(default_factory=set)
-    value = None
+    def __init__(self, batch: EventBatch):
+        super().__init__()
+        self.batch = batch
+
+    def notify(self, node_id: str, value: Any):
+        """Calls subscribers with value. Batched subscribers are
+        queued and later called with a dict of node id to value.
+        """
+        dispatcher = self.dispatcher
+        for f in self:
+            if isinstance(f, Subscription) and f.batched:
+                self.batch.queue(f, node_id, value, dispatcher)
+            elif dispatcher is None:
+                f(value)
+            else:
+                dispatcher.submit(f, value)
 
 
-class NodeCalculatedEvent(Event):
+class NodeCalculatedEvent(NodeEvent):
     """Called after node function completes.
     """
 
     pass
 
 
-class NodeValueSetEvent(Event):
+class NodeValueSetEvent(NodeEvent):
     """Called after node value has been set.
     """
 
     pass
 
 
+class NodeInvalidatedEvent(NodeEvent):
+    """Called with the set of node ids removed from the base cache
+    by invalidation, once per batch.
+    """
+
+    def notify(self, node_ids: Iterable[str]):  # type: ignore
+        self.batch.collect(self, node_ids)
+
+    def deliver(self, node_ids: Set[str]):
+        dispatcher = self.dispatcher
+        for f in self:
+            if dispatcher is None:
+                f(node_ids)
+            else:
+                dispatcher.submit(f, node_ids)
+
+
+class CycleError(RuntimeError):
+    """Raised when calculating a node requires the node itself,
+    directly or through other nodes. Attribute path holds the ids of
+    the nodes in the cycle, starting and ending with the same node.
+    """
+
+    def __init__(self, path: List[str], labels: List[str]):
+        super().__init__("Cycle detected: " + " -> ".join(labels))
+        self.path = path
+
+
+class _Calculation:
+    """Node being calculated without holding the engine lock.
+
+    Other threads calling the node wait on done. A calculation is
+    stale if a node it requires is invalidated meanwhile, so its
+    result is not cached.
+    """
+
+    __slots__ = ("key", "sid", "requires", "owner", "stale", "done")
+
+    def __init__(self, key: Optional[Tuple[int, str]], sid: str, requires: set):
+        self.key = key
+        self.sid = sid
+        self.requires = requires
+        self.owner = threading.get_ident()
+        self.stale = False
+        self.done = threading.Event()
+
+
 class CalcEngine:
     """Simple lazy calculation engine.
 
@@ -53,27 +142,568 @@ class CalcEngine:
         # shorter hex variant.
         self.id_map = {}
 
+        # queues batched event notifications during
+        # a recalculation pass, one per thread.
+        self.event_batch = EventBatch()
+
+        # guards the cache so the engine can be used from
+        # several threads. Not held while calculating nodes.
+        self.lock = threading.RLock()
+
+        # calculations by id of cache and node id, other callers
+        # of a node wait for its calculation
+        self._pending: Dict[Tuple[int, str], _Calculation] = {}
+        # calculations waited for by thread id
+        self._waiting: Dict[int, _Calculation] = {}
+        # all calculations in progress, including those of map
+        self._calculations: Set[_Calculation] = set()
+
+        # node events of watched functions and variables by id, delivered
+        # by dispatcher if set. Held weakly as functions are watched
+        # again, eg when a spreadsheet cell's formula is edited. Events
+        # are lists so cannot be held in a WeakSet.
+        self.events: "weakref.WeakValueDictionary[int, NodeEvent]" = (
+            weakref.WeakValueDictionary()
+        )
+        self.dispatcher: Optional[Dispatcher] = None
+
+        # engine wide streams of changes
+        self.feeds: List[ChangeFeed] = []
+
+        # called with ids of nodes removed by invalidation
+        self.node_invalidated = self._event(NodeInvalidatedEvent)
+
+        # time used for expiry of nodes, see watch ttl
+        self.clock: Callable[[], float] = monotonic
+        self._expiring = False
+        self._refreshing: Set[str] = set()
+        self._refresher: Optional[ThreadPoolExecutor] = None
+
+        # optional per node statistics
+        self.profiler: Optional[Profiler] = None
+
+        # optional spilling of base cache, see enable_tiering
+        self.tiers: Optional[TieredStore] = None
+
+        # optional sharing of equal values, see enable_dedup
+        self.dedup: Optional[ValueStore] = None
+
+        # identifies instances of watched methods
+        self.instances = InstanceRegistry()
+
+        # input variables by node id
+        self.vars: Dict[str, Var] = {}
+
+        # ids of base cache nodes directly requiring each node id
+        self._dependants: DefaultDict[str, Set[str]] = defaultdict(set)
+
+        # per thread stack of active contexts
+        self._local = threading.local()
+        # live contexts, told of changes to the base cache
+        self._contexts: "weakref.WeakSet[CalcContext]" = weakref.WeakSet()
+
+    def _context_stack(self):
+        try:
+            return self._local.contexts
+        except AttributeError:
+            self._local.contexts = []
+            return self._local.contexts
+
+    def _calculating(self) -> Dict[str, _Calculation]:
+        """Calculations of this thread by node id, in order."""
+        try:
+            return self._local.calculating
+        except AttributeError:
+            self._local.calculating = {}
+            return self._local.calculating
+
+    def _cycle(self, calculating: Dict[str, _Calculation], sid: str):
+        ids = list(calculating)
+        return ids[ids.index(sid) :] + [sid]
+
+    def _cycle_error(self, path: List[str]):
+        return CycleError(path, [node_label(self.id_map.get(id_)) for id_ in path])
+
+    def _start(self, cache: Dict[str, NodeData], sid: str, requires: set):
+        """Start calculating node sid into cache on this thread. If
+        another thread is calculating it, returns that calculation to
+        wait for instead. Called holding the lock.
+
+        Raises:
+            CycleError: If the node requires itself, or waiting for
+                it would deadlock with threads waiting for this one.
+        """
+        calculating = self._calculating()
+        if sid in calculating:
+            raise self._cycle_error(self._cycle(calculating, sid))
+        key = (id(cache), sid)
+        running = self._pending.get(key)
+        if running is not None:
+            me = threading.get_ident()
+            path, waited = [sid], running
+            while waited.owner != me:
+                # a chain of waits ending at this thread is a cycle,
+                # others end at a thread still calculating
+                waited = self._waiting.get(waited.owner)  # type: ignore
+                if waited is None:
+                    self._waiting[me] = running
+                    return running
+                path.append(waited.sid)
+            raise self._cycle_error(path + [sid])
+        calculation = self._pending[key] = _Calculation(key, sid, requires)
+        self._calculations.add(calculation)
+        calculating[sid] = calculation
+        return calculation
+
+    def _wait(self, calculation: _Calculation):
+        """Wait for another thread's calculation returned by _start."""
+        try:
+            calculation.done.wait()
+        finally:
+            with self.lock:
+                del self._waiting[threading.get_ident()]
+
+    def _finish(self, calculation: _Calculation):
+        """End calculation, waking threads waiting for it. Called
+        holding the lock.
+        """
+        self._calculations.discard(calculation)
+        if calculation.key is not None:
+            del self._pending[calculation.key]
+            del self._calculating()[calculation.sid]
+        calculation.done.set()
+
+    def _reading(self, id_: str):
+        """Node id_ is read by the node this thread is calculating, if
+        any, eg a variable read other than by a call found in its body.
+        """
+        calculating = self._calculating()
+        if calculating:
+            calculation = calculating[next(reversed(calculating))]
+            if id_ not in calculation.requires:
+                with self.lock:
+                    # requires may be shared by calculations of map
+                    calculation.requires = calculation.requires | {id_}
+
+    def _changed(self, ids: Set[str]):
+        """Nodes ids of the base cache changed or were removed. Marks
+        calculations requiring them stale and removes nodes requiring
+        them from contexts.
+        """
+        if self._calculations:
+            self._stale(ids)
+        if self._contexts:
+            contexts = list(self._contexts)
+            # found before removing as contexts read their ancestors
+            affected = [context.affected(ids) for context in contexts]
+            for context, context_ids in zip(contexts, affected):
+                context.discard(context_ids)
+
+    def _stale(self, ids: Set[str]):
+        """Mark calculations requiring ids, directly or through other
+        calculations, as stale.
+        """
+        while ids and self._calculations:
+            found = [
+                calculation
+                for calculation in self._calculations
+                if not calculation.stale and ids & calculation.requires
+            ]
+            for calculation in found:
+                calculation.stale = True
+            ids = {calculation.sid for calculation in found}
+
+    @property
+    def current_context(self) -> Optional[CalcContext]:
+        """Innermost active context on this thread, None for base."""
+        contexts = getattr(self._local, "contexts", None)
+        return contexts[-1] if contexts else None
+
+    def context(self):
+        """Create a scenario context layered over the current context,
+        or over the base cache if none active. See CalcContext.
+        """
+        return CalcContext(self, parent=self.current_context)
+
+    def enable_profiling(self):
+        """Start recording per node statistics.
+
+        Returns:
+            Profiler: queryable statistics, see Profiler.
+        """
+        if self.profiler is None:
+            self.profiler = Profiler()
+        return self.profiler
+
+    def disable_profiling(self):
+        """Stop recording statistics, returns the profiler if any."""
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    def enable_tiering(
+        self,
+        hot_bytes: int = 256 << 20,
+        warm_bytes: int = 1 << 30,
+        directory: Optional[str] = None,
+        compression: Optional[Compression] = None,
+        sizeof: Callable[[Any], int] = pickled_size,
+    ):
+        """Move nodes of the base cache between tiers, see TieredStore.
+
+        Args:
+            hot_bytes (int, optional): Budget of values held as is.
+            warm_bytes (int, optional): Budget of values held compressed.
+            directory (Optional[str], optional): Directory of the cold tier's
+                files. Defaults to None for a temporary directory.
+            compression (Optional[Compression], optional): Compression of
+                warm and cold values. Defaults to None for zlib.
+            sizeof (Callable[[Any], int], optional): Estimates size in bytes
+                of hot values. Defaults to the size of their pickle, as
+                sys.getsizeof does not count the items of containers.
+
+        Returns:
+            TieredStore: store with counters per tier.
+        """
+        with self.lock:
+            if self.tiers is None:
+                self.tiers = TieredStore(
+                    self, hot_bytes, warm_bytes, directory, compression, sizeof
+                )
+            return self.tiers
+
+    def disable_tiering(self):
+        """Promote all nodes to memory and stop tiering, returns the
+        store if any.
+        """
+        with self.lock:
+            tiers, self.tiers = self.tiers, None
+            if tiers is not None:
+                tiers.close()
+            return tiers
+
+    def enable_dedup(self, min_size: int = 1024):
+        """Share equal values between nodes of the base cache, see
+        ValueStore. Values smaller than min_size bytes are not shared.
+
+        Returns:
+            ValueStore: store reporting bytes saved.
+        """
+        with self.lock:
+            if self.dedup is None:
+                self.dedup = ValueStore(min_size)
+            return self.dedup
+
+    def disable_dedup(self):
+        """Stop sharing values, returns the store if any."""
+        with self.lock:
+            dedup, self.dedup = self.dedup, None
+            return dedup
+
+    def var(self, name: str, value: Any = None):
+        """Create an input variable, see Var.
+
+        Args:
+            name (str): Unique name of variable in this engine.
+            value (Any, optional): Initial value. Defaults to None.
+        """
+        var = Var(self, name, value, self._event(NodeValueSetEvent))
+        with self.lock:
+            if var.id in self.vars:
+                raise ValueError(f"Variable {name} already exists")
+            self.vars[var.id] = var
+            self.id_map[var.id] = var.long_id
+        return var
+
+    def _set_expiry(self, node: NodeData, ttl: Optional[float], lookup: Callable):
+        """Node expires after ttl or when first of its requirements
+        expires, ignoring those already expired and being refreshed.
+        """
+        now = self.clock()
+        expires = None if ttl is None else now + ttl
+        for id_ in node.requires:
+            required = lookup(id_)
+            if required is not None and required.expires is not None:
+                if required.expires > now and (
+                    expires is None or required.expires < expires
+                ):
+                    expires = required.expires
+        node.expires = expires
+
+    def _refresh(self, sid: str, revalidate: Callable[[], Any]):
+        """Recalculate a node on a background thread unless already."""
+        with self.lock:
+            if sid in self._refreshing:
+                return
+            self._refreshing.add(sid)
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(
+                    thread_name_prefix="calcengine-refresh"
+                )
+        self._refresher.submit(self._run_refresh, sid, revalidate)
+
+    def _run_refresh(self, sid: str, revalidate: Callable[[], Any]):
+        try:
+            revalidate()
+        except Exception:  # noqa
+            logger.exception("Refreshing %s failed", sid)
+        finally:
+            with self.lock:
+                self._refreshing.discard(sid)
+
+    def _expired(
+        self,
+        context: Optional[CalcContext],
+        sid: str,
+        node: NodeData,
+        stale_while_revalidate: Optional[float],
+        revalidate: Optional[Callable[[], Any]],
+    ):
+        """Handles call of an expired node. Returns node if its stale
+        value can be used, otherwise None after invalidating it.
+        """
+        if context is not None:
+            # recalculated within context, base cache is unchanged
+            return None
+        if (
+            stale_while_revalidate is not None
+            and revalidate is not None
+            and node.expires is not None
+            and self.clock() < node.expires + stale_while_revalidate
+        ):
+            self._refresh(sid, revalidate)
+            return node
+        self._remove(self.required_by(sid) | {sid})
+        return None
+
+    def _assign(
+        self,
+        cache: Dict[str, NodeData],
+        sid: str,
+        value: Any,
+        compression: Optional[Compression],
+        cost: float = 0.0,
+    ):
+        """Sets value of calculated node, held compressed if large
+        enough. Cost is the time taken to calculate. Returns value,
+        or an equal value if shared, see enable_dedup.
+        """
+        if self.dedup is not None and cache is self.cache:
+            if compression is None:
+                value = self.dedup.share(sid, value)
+            else:
+                # compressed values are held by their node
+                self.dedup.release(sid)
+        node = cache[sid]
+        compressed = None if compression is None else compression.compress(value)
+        if compressed is not None:
+            cache[sid] = node = CompressedNodeData(
+                node.requires, compression, *compressed  # type: ignore
+            )
+        elif type(node) is not NodeData:
+            # compressed or tiered node
+            cache[sid] = node = NodeData(node.requires)
+            node.value = value
+        else:
+            node.value = value
+        if self.tiers is not None and cache is self.cache:
+            # may move node to another tier
+            self.tiers.added(sid, node, cost)
+        return value
+
+    def compression_stats(self):
+        """Sizes of compressed values in the base cache, see watch
+        compress.
+        """
+        stats = CompressionStats()
+        with self.lock:
+            for node in self.cache.values():
+                if type(node) is CompressedNodeData:
+                    stats.nodes += 1
+                    stats.raw_bytes += node.size
+                    stats.compressed_bytes += len(node.data)
+        return stats
+
+    def _set_requires(self, sid: str, requires: set):
+        """Sets ids required by node sid of the base cache, indexing
+        it as their dependant. Called holding the lock.
+        """
+        node = self.cache[sid]
+        for id_ in node.requires - requires:
+            self._unlink(sid, id_)
+        node.requires = requires
+        for id_ in requires:
+            self._dependants[id_].add(sid)
+
+    def _unlink(self, sid: str, required_id: str):
+        dependants = self._dependants.get(required_id)
+        if dependants is not None:
+            dependants.discard(sid)
+            if not dependants:
+                del self._dependants[required_id]
+
+    def set_dispatcher(self, dispatcher: Optional[Dispatcher]):
+        """Deliver notifications of all node events asynchronously
+        with dispatcher, or synchronously if None. Events can also
+        be set individually, eg f.node_calculated.dispatcher.
+
+        Returns:
+            Optional[Dispatcher]: dispatcher, see calcengine.dispatch.
+        """
+        with self.lock:
+            self.dispatcher = dispatcher
+            for event in list(self.events.values()):
+                event.dispatcher = dispatcher
+        return dispatcher
+
+    def _event(self, event_type):
+        event = event_type(self.event_batch)
+        event.dispatcher = self.dispatcher
+        self.events[id(event)] = event
+        return event
+
+    def batch(self):
+        """Context manager deferring batched event subscribers
+        until the outermost batch completes. Each watched function
+        call that misses the cache is implicitly a batch.
+        """
+        return self.event_batch
+
     def clear_cache(self):
-        """Clears all cached node data.
+        """Clears all cached node data. Removed nodes are notified by
+        node_invalidated and feeds.
+        """
+        with self.lock:
+            for calculation in self._calculations:
+                calculation.stale = True
+            removed = list(self.cache)
+            if removed and self.feeds:
+                self._publish([(id_, INVALIDATED, None) for id_ in removed])
+            self.cache.clear()
+            self.id_map.clear()
+            self.instances.clear()
+            if self.tiers is not None:
+                self.tiers.clear()
+            if self.dedup is not None:
+                self.dedup.clear()
+            self._dependants.clear()
+            for var in self.vars.values():
+                self.id_map[var.id] = var.long_id
+            if removed:
+                self.node_invalidated.notify(removed)
+
+    def snapshot(self, file: Union[str, IO[bytes]]):
+        """Write base cache, id map and graph to a file name or binary
+        file object. Values are pickled, see calcengine.snapshot.
+        """
+        snapshot.dump(self, file)
+
+    def restore(self, file: Union[str, IO[bytes]]):
+        """Replace base cache with a snapshot, possibly taken in
+        another process. Replaced nodes are notified as by clear_cache.
+
+        Returns:
+            int: Number of nodes restored.
         """
-        self.cache.clear()
-        self.id_map.clear()
+        return snapshot.load(self, file)
+
+    def plan(self, func: Callable, *args: Any, **kwds: Any):
+        """Plan of the nodes required to call a watched function with
+        args and kwds, in the order they can be calculated. Run the
+        plan to warm the cache, eg at startup.
+
+        Returns:
+            Plan: Reusable plan, see calcengine.plan.
+        """
+        return Plan.build(self, func, args, kwds)
+
+    def load_plan(self, file: Union[str, IO[bytes]]):
+        """Load a plan saved with Plan.save."""
+        return Plan.load(self, file)
+
+    def evict_collected(self):
+        """Removes nodes of garbage collected instances. Called
+        whenever a watched function is calculated.
+        """
+        with self.lock:
+            ids = self.instances.pop_collected()
+            self._remove(ids)
+            for id_ in ids:
+                self.id_map.pop(id_, None)
 
     def required_by(self, id_):
         """Finds all nodes required by this node.
         """
-        all_ids = set()
         if id_ in self.cache:
-            ids = set([id_])
-            while ids:
-                new_ids = set()
-                for node_id, node_data in self.cache.items():
-                    if ids & node_data.requires:
-                        new_ids.add(node_id)
-                ids = new_ids
-                all_ids.update(new_ids)
+            return self._required_by({id_})
+        return set()
+
+    def _required_by(self, ids: set):
+        all_ids: set = set()
+        stack = list(ids)
+        while stack:
+            for node_id in self._dependants.get(stack.pop(), ()):
+                if node_id not in all_ids:
+                    all_ids.add(node_id)
+                    stack.append(node_id)
         return all_ids
 
+    def _remove(self, ids: Iterable[str]):
+        """Removes nodes from base cache, notifying those removed."""
+        ids = set(ids)
+        self._changed(ids)
+        removed = []
+        for id_ in ids:
+            node = self.cache.pop(id_, None)
+            if node is not None:
+                for required_id in node.requires:
+                    self._unlink(id_, required_id)
+                removed.append(id_)
+        if self.tiers is not None:
+            self.tiers.discard(removed)
+        if self.dedup is not None:
+            for id_ in removed:
+                self.dedup.release(id_)
+        if removed:
+            if self.feeds:
+                self._publish([(id_, INVALIDATED, None) for id_ in removed])
+            self.node_invalidated.notify(removed)
+        return removed
+
+    def _publish(self, changes: List[Tuple[str, str, Any]]):
+        publish(self.feeds, self.id_map, changes)
+
+    def feed(
+        self,
+        functions: Optional[Iterable[Watched]] = None,
+        prefix: Optional[str] = None,
+        kinds: Iterable[str] = (CALCULATED, SET, INVALIDATED),
+        maxsize: int = 1000,
+        overflow: str = "block",
+    ):
+        """Stream of changes to nodes in the base cache.
+
+        Args:
+            functions (Optional[Iterable[Callable]], optional): Watched
+                functions or variables to include. Defaults to None for all.
+            prefix (Optional[str], optional): Include only functions whose
+                fully qualified name starts with prefix. Defaults to None.
+            kinds (Iterable[str], optional): Kinds of change to include,
+                any of "calculated", "set" and "invalidated".
+            maxsize (int, optional): Changes held before applying
+                overflow. Defaults to 1000.
+            overflow (str, optional): "block" to block calculations until
+                the consumer catches up, so it must not call the engine
+                itself, or "drop_oldest". Defaults to "block".
+
+        Returns:
+            ChangeFeed: Iterable, or async iterable, of Change tuples.
+                Closing the feed stops it receiving changes.
+        """
+        feed = ChangeFeed(self, functions, prefix, kinds, maxsize, overflow)
+        with self.lock:
+            self.feeds.append(feed)
+        return feed
+
     def invalidate(self, fh: FunctionHelper, *args: Any, **kwds: Any):
         """Invalidate a node.
 
@@ -81,12 +711,15 @@ class CalcEngine:
         nodes that require it.
         """
         sid, _ = fh.make_node_id_pair(args, kwds)
-        # find all nodes required by current node
-        all_ids = self.required_by(sid)
-        # also clear this node from cache
-        all_ids.add(sid)
-        for id_ in all_ids:
-            self.cache.pop(id_, None)
+        context = self.current_context
+        if context is not None:
+            return context.invalidate_id(sid)
+        with self.lock:
+            # find all nodes required by current node
+            all_ids = self.required_by(sid)
+            # also clear this node from cache
+            all_ids.add(sid)
+            self._remove(all_ids)
 
     def set_value(
         self,
@@ -99,10 +732,20 @@ class CalcEngine:
         """Set value for a node.
 
         Does not automatically invalidate nodes required by this node.
+        Within a context the value is overridden in that context.
         """
-        sid, _ = fh.make_node_id_pair(args, kwds)  # type: ignore
-        self.cache[sid].value = new_val
-        node_value_set_event(new_val)
+        sid, lid = fh.make_node_id_pair(args, kwds)  # type: ignore
+        context = self.current_context
+        if context is not None:
+            return context.override_id(sid, new_val)
+        with self.lock:
+            self.id_map[sid] = lid
+            if self.dedup is not None:
+                new_val = self.dedup.share(sid, new_val)
+            self.cache[sid].value = new_val
+            node_value_set_event.notify(sid, new_val)
+            if self.feeds:
+                self._publish([(sid, SET, new_val)])
 
     def set_value_and_invalidate(
         self,
@@ -114,22 +757,259 @@ class CalcEngine:
     ):
         """Set value for a node.
 
-        Invalidate nodes required by this node.
+        Invalidate nodes required by this node. Within a context the
+        value is overridden in that context.
         """
-        sid, _ = fh.make_node_id_pair(args, kwds)  # type: ignore
-        self.cache[sid].value = new_val
-        # find all nodes required by current node
-        all_ids = self.required_by(sid)
-        for id_ in all_ids:
-            self.cache.pop(id_, None)
-        # TODO: perhaps have different event here?
-        node_value_set_event(new_val)
+        sid, lid = fh.make_node_id_pair(args, kwds)  # type: ignore
+        context = self.current_context
+        if context is not None:
+            return context.override_id(sid, new_val)
+        with self.lock:
+            self.id_map[sid] = lid
+            if self.dedup is not None:
+                new_val = self.dedup.share(sid, new_val)
+            self.cache[sid].value = new_val
+            # find all nodes required by current node, these are
+            # notified by node_invalidated
+            all_ids = self.required_by(sid)
+            self._changed({sid})
+            node_value_set_event.notify(sid, new_val)
+            if self.feeds:
+                self._publish([(sid, SET, new_val)])
+            self._remove(all_ids)
+
+    def store(
+        self,
+        fh: FunctionHelper,
+        node_calculated_event: NodeCalculatedEvent,
+        ttl: Optional[float],
+        compression: Optional[Compression],
+        new_val: Any,
+        *args: Any,
+        **kwds: Any
+    ):
+        """Store a value calculated elsewhere, eg by a worker process.
+
+        Unlike set_value the node's required nodes are recorded and
+        node_calculated is notified, as if the engine had calculated it.
+        """
+        sid, lid = fh.make_node_id_pair(args, kwds)  # type: ignore
+        this = args[0] if fh.is_method and args else None
+        with self.lock:
+            self.id_map[sid] = lid
+            self._set_requires(sid, fh.get_required_node_ids(this))
+            self._assign(self.cache, sid, new_val, compression)
+            if self._expiring:
+                self._set_expiry(self.cache[sid], ttl, self.cache.get)
+            node_calculated_event.notify(sid, new_val)
+            if self.feeds:
+                self._publish([(sid, CALCULATED, new_val)])
+
+    def map(
+        self,
+        fh: FunctionHelper,
+        node_calculated_event: NodeCalculatedEvent,
+        arg_sets: Iterable[Any],
+        executor: Optional[Executor] = None,
+        vectorized: Optional[Callable[[List[tuple]], Sequence[Any]]] = None,
+        ttl: Optional[float] = None,
+        compression: Optional[Compression] = None,
+    ):
+        """Calls a watched function for many sets of positional arguments.
+
+        Node ids are computed together and the cache is searched in a
+        single pass. Only distinct misses are calculated, as by calling
+        the watched function, so misses being calculated by another
+        thread are waited for and cycles raise CycleError.
+
+        Args:
+            arg_sets (Iterable[Any]): Tuples of positional arguments, other
+                values are taken to be a single argument.
+            executor (Optional[Executor], optional): Calculates misses
+                concurrently, eg a ThreadPoolExecutor. Defaults to None to
+                calculate serially.
+            vectorized (Optional[Callable], optional): Called once with the
+                list of missing argument tuples, returning a result for
+                each. Defaults to None to call the watched function.
+            ttl (Optional[float], optional): Seconds until calculated nodes
+                expire, set from watch. Expired nodes are recalculated.
+            compression (Optional[Compression], optional): Compression of
+                calculated values, set from watch.
+
+        Returns:
+            list: Result for each set of arguments.
+        """
+        f = fh.func
+        arg_sets = [args if isinstance(args, tuple) else (args,) for args in arg_sets]
+        pairs = fh.make_node_id_pairs(arg_sets)
+        results: List[Any] = [None] * len(arg_sets)
+
+        # node id to arguments and result positions of each miss
+        misses: Dict[str, Tuple[tuple, List[int]]] = {}
+
+        with self.lock:
+            profiler = self.profiler
+            context = self.current_context
+            tiers = self.tiers
+            lookup = self.cache.get if context is None else context.lookup
+            now = self.clock()
+            for i, (sid, lid) in enumerate(pairs):
+                self.id_map[sid] = lid
+                node = lookup(sid)
+                if node is not None and node.expires is not None:
+                    if node.expires <= now:
+                        node = self._expired(context, sid, node, None, None)
+                if node is not None:
+                    if profiler is not None:
+                        profiler.hit(sid, fh)
+                    if tiers is not None:
+                        tiers.hit(sid)
+                    results[i] = node.value
+                elif sid in misses:
+                    misses[sid][1].append(i)
+                else:
+                    misses[sid] = (arg_sets[i], [i])
+
+            if not misses:
+                return results
+
+            cache = self.cache if context is None else context.cache
+            # required node ids by instance
+            requires: Dict[int, set] = {}
+            for args, _ in misses.values():
+                this = args[0] if fh.is_method and args else None
+                if id(this) not in requires:
+                    requires[id(this)] = fh.get_required_node_ids(this)
+
+            calculations: List[_Calculation] = []
+            if vectorized is not None:
+                # misses are calculated together on this thread, those
+                # calculated by another thread are waited for after
+                me = threading.get_ident()
+                try:
+                    for sid, (args, _) in misses.items():
+                        running = self._pending.get((id(cache), sid))
+                        if running is None or running.owner == me:
+                            this = args[0] if fh.is_method and args else None
+                            calculations.append(
+                                self._start(cache, sid, requires[id(this)])
+                            )
+                except CycleError:
+                    for calculation in calculations:
+                        self._finish(calculation)
+                    raise
+
+        def requires_of(args):
+            this = args[0] if fh.is_method and args else None
+            return requires[id(this)]
+
+        def call(args):
+            if context is None:
+                return f(*args)
+            with context:
+                return f(*args)
+
+        def write_back(calculation, value, elapsed):
+            """Caches value of calculation unless stale, returning the
+            value for callers. Called holding the lock.
+            """
+            self._finish(calculation)
+            if calculation.stale:
+                # a required node changed while calculating so the
+                # value is returned but not cached
+                return value
+            sid = calculation.sid
+            if context is None:
+                self._set_requires(sid, calculation.requires)
+            else:
+                cache[sid].requires = calculation.requires
+            value = self._assign(cache, sid, value, compression, elapsed)
+            if self._expiring:
+                self._set_expiry(cache[sid], ttl, lookup)
+            if profiler is not None:
+                profiler.record(sid, fh, elapsed, value)
+            if context is None:
+                node_calculated_event.notify(sid, value)
+                if self.feeds:
+                    self._publish([(sid, CALCULATED, value)])
+            return value
+
+        def calc(sid, args):
+            # started on the thread calculating the miss, like a call of
+            # the watched function, so other threads calling the node
+            # wait for it and misses calling each other are not cycles
+            while True:
+                with self.lock:
+                    node = lookup(sid)
+                    if node is not None and (
+                        node.expires is None or node.expires > self.clock()
+                    ):
+                        # calculated meanwhile
+                        return node.value
+                    calculation = self._start(cache, sid, requires_of(args))
+                    if calculation.owner == threading.get_ident():
+                        break
+                self._wait(calculation)
+            try:
+                start = perf_counter()
+                value = call(args)
+                elapsed = perf_counter() - start
+            except BaseException:
+                with self.lock:
+                    self._finish(calculation)
+                raise
+            with self.lock:
+                return write_back(calculation, value, elapsed)
+
+        if executor is not None and self.lock._is_owned():  # type: ignore
+            # workers would block on the lock for nested nodes
+            executor = None
+
+        with self.event_batch:
+            if vectorized is not None:
+                values: Dict[str, Any] = {}
+                if calculations:
+                    try:
+                        start = perf_counter()
+                        computed = list(
+                            vectorized([misses[c.sid][0] for c in calculations])
+                        )
+                        elapsed = (perf_counter() - start) / len(calculations)
+                    except BaseException:
+                        with self.lock:
+                            for calculation in calculations:
+                                self._finish(calculation)
+                        raise
+                    with self.lock:
+                        for calculation, value in zip(calculations, computed):
+                            values[calculation.sid] = write_back(
+                                calculation, value, elapsed
+                            )
+                for sid, (args, _) in misses.items():
+                    if sid not in values:
+                        values[sid] = calc(sid, args)
+            elif executor is not None:
+                miss_args = [args for args, _ in misses.values()]
+                values = dict(zip(misses, executor.map(calc, misses, miss_args)))
+            else:
+                values = {sid: calc(sid, args) for sid, (args, _) in misses.items()}
+
+        for sid, (_, positions) in misses.items():
+            for i in positions:
+                results[i] = values[sid]
+        return results
 
     def watch(
         self,
         typed: bool = False,
         alias: Optional[str] = None,
         path: Optional[str] = None,
+        method: Optional[bool] = None,
+        key: Optional[Callable[[Any], Hashable]] = None,
+        ttl: Optional[float] = None,
+        stale_while_revalidate: Optional[float] = None,
+        compress: Union[None, bool, str, Compression] = None,
+        normalize: bool = False,
     ):
         """Decorator to indicate function is on graph.
 
@@ -140,53 +1020,169 @@ class CalcEngine:
                 in cache. Defaults to None to use existing name.
             path (Optional[str], optional): Alternative module path for
                 function in cache. Defaults to None to use existing path.
+            method (Optional[bool], optional): Whether function is a method
+                whose first argument is an instance. Defaults to None to
+                guess from the first argument being named self.
+            key (Optional[Callable], optional): Converts each argument to a
+                hashable value used in node ids. Defaults to None to use
+                arguments as is, fingerprinting unhashable arguments such as
+                lists and numpy arrays, see fingerprint.
+            ttl (Optional[float], optional): Seconds until a node expires.
+                Nodes requiring it expire with it. Expired nodes are
+                invalidated when next called. Defaults to None to never
+                expire.
+            stale_while_revalidate (Optional[float], optional): Seconds
+                after expiry during which calls return the expired value
+                while the node is recalculated on a background thread.
+                Defaults to None to always recalculate on call.
+            compress (Union[None, bool, str, Compression], optional): Hold
+                large values compressed, decompressing them when read. True
+                or a codec name, eg "zlib", "lz4" or "zstd", for default
+                settings. Defaults to None to hold values as is.
+            normalize (bool, optional): Whether calls are identified by the
+                values bound to parameters, with defaults applied, so eg
+                d(5, y=-3) and d(x=5, y=-3) are one node. Defaults to False
+                to identify calls by arguments as given.
         """
+        compression = compression_of(compress)
 
         def _watch(f):
 
-            fh = FunctionHelper(f, typed_key=typed, alias=alias, path=path)
+            fh = FunctionHelper(
+                f,
+                typed_key=typed,
+                alias=alias,
+                path=path,
+                is_method=method,
+                instances=self.instances,
+                key=key,
+                normalize=normalize,
+            )
 
             # stores callbacks that can be subscribed to
-            node_calculated_event = NodeCalculatedEvent()
-            node_value_set_event = NodeValueSetEvent()
+            node_calculated_event = self._event(NodeCalculatedEvent)
+            node_value_set_event = self._event(NodeValueSetEvent)
+
+            if ttl is not None:
+                self._expiring = True
+
+            def revalidate(sid, this, args, kwds):
+                # called on background thread without holding the lock
+                # so readers are served the stale value meanwhile
+                requires = fh.get_required_node_ids(this)
+                start = perf_counter()
+                result = f(*args, **kwds)
+                cost = perf_counter() - start
+                with self.lock, self.event_batch:
+                    if sid not in self.cache:
+                        # invalidated while refreshing
+                        return
+                    self._remove(self.required_by(sid))
+                    self._set_requires(sid, requires)
+                    self._assign(self.cache, sid, result, compression, cost)
+                    self._set_expiry(self.cache[sid], ttl, self.cache.get)
+                    node_calculated_event.notify(sid, result)
+                    if self.feeds:
+                        self._publish([(sid, CALCULATED, result)])
+
+            def this_of(args):
+                return args[0] if fh.is_method and args else None
 
             @wraps(f)
             def wrapper(*args: Any, **kwds: Any):
                 nonlocal fh
                 sid, lid = fh.make_node_id_pair(args, kwds)
-                self.id_map[sid] = lid
+                while True:
+                    with self.lock:
+                        self.id_map[sid] = lid
+                        profiler = self.profiler
+                        context = self.current_context
 
-                if sid in self.cache:
-                    return self.cache[sid].value
+                        if context is None:
+                            cache = self.cache
+                            node = cache.get(sid)
+                        else:
+                            cache = context.cache
+                            node = context.lookup(sid)
 
-                # determine if method call (by checking if method call exists
-                # in 1st arg that is potentially an instance, then to see if
-                # that methods unbound function is a wrapper around the same
-                # function - appears to work!).
-                this = None
-                if args:
-                    method_func_wrapped = deep_getattr(
-                        args[0], [f.__name__, "__func__", "__wrapped__"], default=None
-                    )
-                    if method_func_wrapped == f:
-                        this = args[0]
+                        if node is not None:
+                            expires = node.expires
+                            if expires is None or expires > self.clock():
+                                if profiler is not None:
+                                    profiler.hit(sid, fh)
+                                if self.tiers is not None:
+                                    self.tiers.hit(sid)
+                                return node.value
+                            node = self._expired(
+                                context,
+                                sid,
+                                node,
+                                stale_while_revalidate,
+                                partial(revalidate, sid, this_of(args), args, kwds),
+                            )
+                            if node is not None:
+                                if profiler is not None:
+                                    profiler.hit(sid, fh)
+                                return node.value
 
-                self.cache[sid].requires = fh.get_required_node_ids(this)
+                        if self.instances.collected:
+                            self.evict_collected()
+
+                        requires = fh.get_required_node_ids(this_of(args))
+                        calculation = self._start(cache, sid, requires)
+                        if calculation.owner == threading.get_ident():
+                            break
+                    # calculated by another thread, look up again
+                    self._wait(calculation)
 
                 if logger.isEnabledFor(logging.DEBUG):
-                    logger.debug(
-                        "%s called requiring: %s",
-                        sid,
-                        ", ".join(self.cache[sid].requires),
-                    )
-                result = f(*args, **kwds)
-                self.cache[sid].value = result
-                node_calculated_event(result)
+                    logger.debug("%s called requiring: %s", sid, ", ".join(requires))
+
+                with self.event_batch:
+                    # calculated without holding the lock, the node is
+                    # only added once calculated so a failed calculation
+                    # leaves no node behind
+                    try:
+                        start = perf_counter()
+                        if profiler is None:
+                            result = f(*args, **kwds)
+                        else:
+                            with profiler.measure(sid, fh) as frame:
+                                result = frame.result = f(*args, **kwds)
+                        cost = perf_counter() - start
+                    except BaseException:
+                        with self.lock:
+                            self._finish(calculation)
+                        raise
+
+                    with self.lock:
+                        self._finish(calculation)
+                        if calculation.stale:
+                            # a required node changed while calculating
+                            # so the result is returned but not cached
+                            return result
+                        # including ids only found when called, see _reading
+                        if context is None:
+                            self._set_requires(sid, calculation.requires)
+                        else:
+                            cache[sid].requires = calculation.requires
+                        result = self._assign(cache, sid, result, compression, cost)
+                        if self._expiring:
+                            self._set_expiry(
+                                cache[sid],
+                                ttl,
+                                cache.get if context is None else context.lookup,
+                            )
+                        if context is None:
+                            node_calculated_event.notify(sid, result)
+                            if self.feeds:
+                                self._publish([(sid, CALCULATED, result)])
                 return result
 
             # core utility and used to detect
             # if node on graph
             wrapper.helper = fh
+            wrapper.engine = self
 
             # events
             wrapper.node_calculated = node_calculated_event
@@ -194,7 +1190,17 @@ class CalcEngine:
 
             # graph functions
             wrapper.invalidate = partial(self.invalidate, fh)
+            wrapper.map = partial(
+                self.map,
+                fh,
+                node_calculated_event,
+                ttl=ttl,
+                compression=compression,
+            )
             wrapper.set_value = partial(self.set_value, fh, node_value_set_event)
+            wrapper.store = partial(
+                self.store, fh, node_calculated_event, ttl, compression
+            )
             wrapper.set_value_and_invalidate = partial(
                 self.set_value_and_invalidate, fh, node_value_set_event
             )
@@ -0,0 +1,144 @@
+"""Compression of cached node values, see CalcEngine.watch compress.
+
+Values are pickled and compressed with zlib, lzma or bz2 from the
+standard library, or optionally lz4 or zstandard.
+"""
+import bz2
+import lzma
+import pickle
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+Codec = Tuple[Callable[[bytes, Optional[int]], bytes], Callable[[bytes], bytes]]
+
+
+def _zlib():
+    return (
+        lambda data, level: zlib.compress(data, -1 if level is None else level),
+        zlib.decompress,
+    )
+
+
+def _lzma():
+    return (lambda data, level: lzma.compress(data, preset=level), lzma.decompress)
+
+
+def _bz2():
+    return (
+        lambda data, level: bz2.compress(data, 9 if level is None else level),
+        bz2.decompress,
+    )
+
+
+def _lz4():
+    import lz4.frame  # type: ignore
+
+    return (
+        lambda data, level: lz4.frame.compress(data, compression_level=level or 0),
+        lz4.frame.decompress,
+    )
+
+
+def _zstd():
+    import zstandard  # type: ignore
+
+    def compress(data, level):
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(
+            data
+        )
+
+    return compress, zstandard.ZstdDecompressor().decompress
+
+
+# codecs by name, optional packages are imported on first use
+CODECS: Dict[str, Callable[[], Codec]] = {
+    "zlib": _zlib,
+    "lzma": _lzma,
+    "bz2": _bz2,
+    "lz4": _lz4,
+    "zstd": _zstd,
+}
+
+
+class Compression:
+    """Policy for compressing the values of a watched function.
+
+    Values whose pickled size is at least min_size bytes are held
+    compressed and decompressed each time they are read, so readers
+    receive a new copy. Smaller values are held as is.
+
+    Example Usage:
+    >>> @ce.watch(compress=Compression("zlib", min_size=1 << 20))
+    ... def frame():
+    ...     return pd.read_csv("large.csv")
+    >>> ce.compression_stats().ratio
+    6.2
+    """
+
+    def __init__(
+        self, codec: str = "zlib", level: Optional[int] = None, min_size: int = 4096
+    ):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec}")
+        self.codec = codec
+        self.level = level
+        self.min_size = min_size
+        self._compress, self._decompress = CODECS[codec]()
+
+        # number of values decompressed
+        self.decompressed = 0
+
+    def __repr__(self):
+        return "Compression(%r, level=%r, min_size=%r)" % (
+            self.codec,
+            self.level,
+            self.min_size,
+        )
+
+    def __reduce__(self):
+        # codec functions cannot be pickled, eg in snapshots
+        return Compression, (self.codec, self.level, self.min_size)
+
+    def compress(self, value: Any, min_size: Optional[int] = None):
+        """Compressed pickle of value and its uncompressed size, or
+        None if value is smaller than min_size.
+        """
+        data = pickle.dumps(value, protocol=5)
+        if len(data) < (self.min_size if min_size is None else min_size):
+            return None
+        return self._compress(data, self.level), len(data)
+
+    def decompress(self, data: bytes):
+        self.decompressed += 1
+        return pickle.loads(self._decompress(data))
+
+
+def compression_of(compress: Any) -> Optional[Compression]:
+    """Compression from a watch compress argument, True or a codec name
+    for the defaults.
+    """
+    if compress is None or compress is False:
+        return None
+    if compress is True:
+        return Compression()
+    if isinstance(compress, str):
+        return Compression(compress)
+    return compress
+
+
+@dataclass
+class CompressionStats:
+    """Sizes in bytes of compressed node values held by a cache."""
+
+    nodes: int = 0
+    raw_bytes: int = 0
+    compressed_bytes: int = 0
+
+    @property
+    def ratio(self):
+        return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 1.0
+
+    @property
+    def saved_bytes(self):
+        return self.raw_bytes - self.compressed_bytes
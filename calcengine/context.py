@@ -0,0 +1,214 @@
+from collections import defaultdict
+from typing import Any, DefaultDict, Dict, Iterable, List, Optional, Set
+
+from .function_helper import Watched
+from .node import NodeData
+
+
+class CalcContext:
+    """Scenario layered over a parent cache.
+
+    A context holds its own cache of nodes. Nodes that are not in
+    the context's cache are read from the parent context, or the
+    engine's base cache, without copying. Overriding a node in a
+    context shadows that node and all nodes requiring it so they
+    are recalculated within the context only. This includes nodes
+    added to the parent cache after the override.
+
+    Nodes of the context requiring nodes invalidated in the base
+    cache are removed from the context, unless shadowed.
+
+    Contexts are created with CalcEngine.context and activated
+    with a with block. Node events are not fired for calculations
+    within a context.
+
+    Example Usage:
+    >>> f()  # warm base cache
+    >>> scenario = ce.context()
+    >>> scenario.override(a, 200)
+    >>> with scenario:
+    ...     f()  # only recalculates nodes requiring a
+    """
+
+    def __init__(self, engine, parent: Optional["CalcContext"] = None):
+        self.engine = engine
+        self.parent = parent
+        self.cache: DefaultDict[str, NodeData] = defaultdict(
+            engine.cache.default_factory
+        )
+
+        # nodes that must not be read from parent
+        self.shadowed: Set[str] = set()
+
+        # ids of parent nodes found not to require shadowed nodes
+        self._checked: Set[str] = set()
+
+        engine._contexts.add(self)
+
+    def __enter__(self):
+        self.engine._context_stack().append(self)
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.engine._context_stack().pop()
+
+    def context(self):
+        """Create child context of this context."""
+        return CalcContext(self.engine, parent=self)
+
+    def caches(self):
+        """This context's cache, its ancestors' and the base cache."""
+        ctx: Optional[CalcContext] = self
+        while ctx is not None:
+            yield ctx.cache
+            ctx = ctx.parent
+        yield self.engine.cache
+
+    def lookup(self, id_: str):
+        """Node data visible from this context, otherwise None."""
+        ctx: Optional[CalcContext] = self
+        while ctx is not None:
+            node = ctx.cache.get(id_)
+            if node is not None:
+                break
+            if id_ in ctx.shadowed:
+                return None
+            ctx = ctx.parent
+        else:
+            node = self.engine.cache.get(id_)
+            if node is None:
+                return None
+        if ctx is not self and id_ not in self._checked:
+            # parent node may have been calculated after an override
+            if self._requires_shadowed(node, ctx):
+                self.shadowed.add(id_)
+                return None
+            self._checked.add(id_)
+        return node
+
+    def _requires_shadowed(self, node: NodeData, owner: Optional["CalcContext"]):
+        """Whether node of owner's cache, or the base cache if None,
+        requires a node shadowed below owner.
+        """
+        shadowed: List[Set[str]] = []
+        below: List[Dict[str, NodeData]] = []
+        ctx: Optional[CalcContext] = self
+        while ctx is not owner:
+            shadowed.append(ctx.shadowed)  # type: ignore
+            below.append(ctx.cache)  # type: ignore
+            ctx = ctx.parent  # type: ignore
+        caches = [self.engine.cache] if owner is None else list(owner.caches())
+
+        seen: Set[str] = set()
+        stack = [node]
+        while stack:
+            requires = stack.pop().requires
+            if any(requires & ids for ids in shadowed):
+                return True
+            for required_id in requires - seen:
+                seen.add(required_id)
+                # same node already found not to require shadowed nodes
+                if required_id in self._checked and not any(
+                    required_id in cache for cache in below
+                ):
+                    continue
+                for cache in caches:
+                    required = cache.get(required_id)
+                    if required is not None:
+                        stack.append(required)
+                        break
+        return False
+
+    def required_by(self, ids: Iterable[str]):
+        """Finds all nodes, in any visible cache, requiring ids."""
+        all_ids: Set[str] = set()
+        ids = set(ids)
+        while ids:
+            new_ids = set()
+            for cache in self.caches():
+                for node_id, node_data in cache.items():
+                    if ids & node_data.requires:
+                        new_ids.add(node_id)
+            ids = new_ids - all_ids
+            all_ids.update(new_ids)
+        return all_ids
+
+    def shadow(self, ids: Iterable[str]):
+        """Remove ids from this context and stop reading them
+        from parent so they are recalculated in this context.
+        """
+        ids = set(ids)
+        for id_ in ids:
+            self.cache.pop(id_, None)
+            self.shadowed.add(id_)
+        # checks of this context and its descendants are out of date
+        for ctx in list(self.engine._contexts):
+            if ctx._descends_from(self):
+                ctx._checked.clear()
+        if self.engine._calculations:
+            self.engine._stale(ids)
+
+    def _descends_from(self, ctx: "CalcContext"):
+        """Whether ctx is this context or one of its ancestors."""
+        parent: Optional[CalcContext] = self
+        while parent is not None:
+            if parent is ctx:
+                return True
+            parent = parent.parent
+        return False
+
+    def affected(self, ids: Set[str]):
+        """Ids of nodes in this context's cache that are base nodes ids
+        or require them, directly or through nodes visible from this
+        context. Nodes shadowed in this context or its ancestors are not.
+        """
+        # caches of this context and ancestors with the ids that are
+        # not visible in them from this context
+        levels = []
+        hidden: Set[str] = set()
+        ctx: Optional[CalcContext] = self
+        while ctx is not None:
+            levels.append((ctx.cache, hidden))
+            hidden = hidden | ctx.shadowed
+            ctx = ctx.parent
+        # nodes calculated here rather than read from the base cache
+        # are removed too
+        ids = ids - hidden
+        all_ids = set(ids)
+        while ids:
+            new_ids = set()
+            for cache, hidden in levels:
+                for node_id, node_data in cache.items():
+                    if ids & node_data.requires and node_id not in hidden:
+                        new_ids.add(node_id)
+            ids = new_ids - all_ids
+            all_ids.update(new_ids)
+        return all_ids & self.cache.keys()
+
+    def discard(self, ids: Iterable[str]):
+        """Remove ids from this context's cache, without shadowing."""
+        for id_ in ids:
+            self.cache.pop(id_, None)
+        self._checked.clear()
+
+    def override(self, func: Watched, new_val: Any, *args: Any, **kwds: Any):
+        """Set value for a node in this context only. Nodes requiring
+        it are recalculated within this context when next called.
+        """
+        sid, lid = func.helper.make_node_id_pair(args, kwds)
+        self.engine.id_map[sid] = lid
+        self.override_id(sid, new_val)
+
+    def override_id(self, id_: str, new_val: Any):
+        with self.engine.lock:
+            self.shadow(self.required_by([id_]) | {id_})
+            self.cache[id_].value = new_val
+
+    def invalidate(self, func: Watched, *args: Any, **kwds: Any):
+        """Invalidate a node and nodes requiring it in this context only."""
+        sid, _ = func.helper.make_node_id_pair(args, kwds)
+        self.invalidate_id(sid)
+
+    def invalidate_id(self, id_: str):
+        with self.engine.lock:
+            self.shadow(self.required_by([id_]) | {id_})
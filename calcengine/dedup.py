@@ -0,0 +1,111 @@
+"""Content addressed deduplication of node values.
+
+Values are identified by a digest of their content, either by a
+fingerprinter, eg for numpy arrays, or of their pickle. Nodes whose
+values have the same digest hold the first such value, so equal
+values are held once. Shared values must not be modified in place.
+"""
+import pickle
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .fingerprint import FINGERPRINTERS, digest, digests, full_class_name
+from .profiler import result_size
+
+
+def content_key(value: Any) -> Optional[Tuple[Hashable, int]]:
+    """Digest of value's content and its size in bytes, or None if
+    value cannot be pickled.
+    """
+    fingerprinter = FINGERPRINTERS.get(full_class_name(value))
+    if fingerprinter is not None:
+        return digests.get(value, fingerprinter), result_size(value)
+    try:
+        data = pickle.dumps(value, protocol=5)
+    except Exception:  # noqa pickling can fail in many ways
+        return None
+    return digest(data), len(data)
+
+
+@dataclass
+class DedupStats:
+    """Distinct values held and bytes saved by sharing them."""
+
+    values: int = 0
+    nodes: int = 0
+    bytes: int = 0
+    saved_bytes: int = 0
+
+
+class _Shared:
+    __slots__ = ("value", "size", "refs")
+
+    def __init__(self, value: Any, size: int):
+        self.value = value
+        self.size = size
+        # nodes holding value
+        self.refs = 0
+
+
+class ValueStore:
+    """Shares equal values between nodes of an engine's base cache,
+    see CalcEngine.enable_dedup.
+
+    Values smaller than min_size bytes are not shared. A value is
+    released when the last node holding it is removed.
+
+    Example Usage:
+    >>> store = ce.enable_dedup()
+    >>> reference("2024-01-01") is reference("2024-01-02")
+    True
+    >>> store.stats().saved_bytes
+    11783
+    """
+
+    def __init__(self, min_size: int = 1024):
+        self.min_size = min_size
+        self.shared: Dict[Hashable, _Shared] = {}
+        # content key of each node's value
+        self.keys: Dict[str, Hashable] = {}
+        self.saved_bytes = 0
+
+    def share(self, sid: str, value: Any):
+        """Value for node sid to hold, an equal value if one is held."""
+        self.release(sid)
+        content = content_key(value)
+        if content is None or content[1] < self.min_size:
+            return value
+        key, size = content
+        shared = self.shared.get(key)
+        if shared is None:
+            shared = self.shared[key] = _Shared(value, size)
+        else:
+            self.saved_bytes += size
+        shared.refs += 1
+        self.keys[sid] = key
+        return shared.value
+
+    def release(self, sid: str):
+        """Release value held by node sid, if shared."""
+        key = self.keys.pop(sid, None)
+        if key is None:
+            return
+        shared = self.shared[key]
+        shared.refs -= 1
+        if shared.refs:
+            self.saved_bytes -= shared.size
+        else:
+            del self.shared[key]
+
+    def clear(self):
+        self.shared.clear()
+        self.keys.clear()
+        self.saved_bytes = 0
+
+    def stats(self):
+        return DedupStats(
+            values=len(self.shared),
+            nodes=len(self.keys),
+            bytes=sum(shared.size for shared in self.shared.values()),
+            saved_bytes=self.saved_bytes,
+        )
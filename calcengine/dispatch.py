@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .event import Subscription
+
+logger = logging.getLogger(__name__)
+
+Call = Tuple[Callable, tuple, dict]
+
+
+def log_error(func: Callable, exc: BaseException):
+    logger.error("Subscriber %r failed", func, exc_info=exc)
+
+
+class Dispatcher:
+    """Delivers event notifications away from the notifying thread.
+
+    Calls submitted while earlier ones are waiting are delivered
+    together. Notifications for the same batched subscriber are
+    merged into a single dict. An exception raised by a subscriber
+    is passed to on_error, by default logged, and does not affect
+    other subscribers or the calculation that notified.
+
+    Set on an Event, or on all of an engine's events with
+    CalcEngine.set_dispatcher, to make delivery asynchronous.
+    """
+
+    def __init__(
+        self, on_error: Optional[Callable[[Callable, BaseException], Any]] = None
+    ):
+        self.on_error = on_error or log_error
+
+    def submit(self, func: Callable, *args: Any, **kwds: Any):
+        raise NotImplementedError
+
+    def deliver(self, calls: List[Call]):
+        # batched subscribers, called with a dict or set, are merged
+        # by key, latest subscription wins
+        batched: Dict[Any, Tuple[Subscription, Any]] = {}
+        for func, args, kwds in calls:
+            if isinstance(func, Subscription) and func.batched:
+                _, items = batched.pop(func.key, (None, type(args[0])()))
+                items.update(args[0])
+                batched[func.key] = (func, items)
+            else:
+                self.call(func, args, kwds)
+        for func, items in batched.values():
+            self.call(func, (items,), {})
+
+    def call(self, func: Callable, args: tuple, kwds: dict):
+        try:
+            return func(*args, **kwds)
+        except Exception as exc:
+            self.on_error(func, exc)
+
+
+class ThreadDispatcher(Dispatcher):
+    """Delivers notifications on a background thread, started on
+    first use.
+
+    Example Usage:
+    >>> dispatcher = ce.set_dispatcher(ThreadDispatcher())
+    >>> f()  # subscribers called on dispatcher's thread
+    >>> dispatcher.flush()  # wait for delivery
+    """
+
+    def __init__(
+        self,
+        on_error: Optional[Callable[[Callable, BaseException], Any]] = None,
+        name: str = "calcengine-events",
+    ):
+        super().__init__(on_error)
+        self.name = name
+        self.queue: "queue.SimpleQueue[Optional[Call]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, *args: Any, **kwds: Any):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name=self.name, daemon=True
+                    )
+                    self._thread.start()
+        self.queue.put((func, args, kwds))
+
+    def _run(self):
+        while True:
+            calls = [self.queue.get()]
+            while True:
+                try:
+                    calls.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in calls
+            self.deliver([call for call in calls if call is not None])
+            if stop:
+                return
+
+    def flush(self, timeout: Optional[float] = None):
+        """Wait until notifications submitted so far are delivered."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self.queue.put((done.set, (), {}))
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Deliver outstanding notifications and stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join(timeout)
+
+
+class AsyncioDispatcher(Dispatcher):
+    """Delivers notifications on an asyncio event loop. Notifications
+    may be submitted from any thread. Subscribers may be coroutine
+    functions, these are run as tasks.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        on_error: Optional[Callable[[Callable, BaseException], Any]] = None,
+    ):
+        super().__init__(on_error)
+        self.loop = loop
+        self._pending: List[Call] = []
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, *args: Any, **kwds: Any):
+        with self._lock:
+            self._pending.append((func, args, kwds))
+            if len(self._pending) > 1:
+                # delivery already scheduled
+                return
+        self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        with self._lock:
+            calls, self._pending = self._pending, []
+        self.deliver(calls)
+
+    def call(self, func: Callable, args: tuple, kwds: dict):
+        result = super().call(func, args, kwds)
+        if asyncio.iscoroutine(result):
+            task = self.loop.create_task(result)
+            task.add_done_callback(lambda t: self._task_done(func, t))
+        return result
+
+    def _task_done(self, func: Callable, task: "asyncio.Task"):
+        if not task.cancelled() and task.exception() is not None:
+            self.on_error(func, task.exception())  # type: ignore
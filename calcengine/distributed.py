@@ -0,0 +1,121 @@
+"""Evaluation of a node's plan on worker processes.
+
+Short node ids depend on the process' string hashing so nodes are
+referred to by function and arguments, as in plans, and given local
+ids by each process. Functions, arguments and values must therefore
+be picklable, and watched functions importable by the workers.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .plan import Plan, Step
+
+# required function calls and their values
+Inputs = List[Tuple[Step, Any]]
+
+
+def _evaluate(var_values: Dict[str, Any], tasks: List[Tuple[Step, Inputs]]):
+    """Worker entry point. Calculates the step of each task with the
+    values of its required nodes set in the worker's engine.
+    """
+    engines = {id(step.func.engine): step.func.engine for step, _ in tasks}
+    for engine in engines.values():
+        # values of a previous run may be out of date
+        engine.clear_cache()
+        for var in engine.vars.values():
+            if var.name in var_values:
+                var.value = var_values[var.name]
+
+    results = []
+    for step, inputs in tasks:
+        for required, value in inputs:
+            required.func.set_value(value, *required.args, **required.kwds)
+        results.append(step.func(*step.args, **step.kwds))
+    return results
+
+
+class Coordinator:
+    """Calculates the plan of a node on worker processes, merging
+    results into the engine's base cache.
+
+    The steps of each level of the plan are independent. Those not
+    cached are partitioned between the workers, along with the values
+    of the nodes they require and of the engine's variables. Nodes
+    called with non constant arguments are not planned and are
+    calculated by the worker calculating the node calling them.
+
+    Example Usage:
+    >>> with Coordinator(ce, processes=4) as coordinator:
+    ...     coordinator.run(f)
+    809
+    """
+
+    def __init__(
+        self, engine, processes: Optional[int] = None, mp_context: Any = None
+    ):
+        self.engine = engine
+        self.processes = processes or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.processes, mp_context=mp_context)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.close()
+
+    def close(self):
+        """Stop the worker processes."""
+        self.executor.shutdown()
+
+    def run(self, func: Callable, *args: Any, **kwds: Any):
+        """Calculate func with args and kwds, see run_plan."""
+        return self.run_plan(self.engine.plan(func, *args, **kwds))
+
+    def run_plan(self, plan: Plan):
+        """Calculate steps of plan not already cached.
+
+        Returns:
+            Any: Result of the planned call.
+        """
+        engine = self.engine
+        if not plan.steps:
+            return None
+        var_values = {var.name: var.value for var in engine.vars.values()}
+        for level in plan.levels():
+            tasks = []
+            with engine.lock:
+                for step in level:
+                    sid, _ = step.func.helper.make_node_id_pair(step.args, step.kwds)
+                    if sid not in engine.cache:
+                        tasks.append((step, self._inputs(step)))
+            if not tasks:
+                continue
+
+            partitions = [tasks[i :: self.processes] for i in range(self.processes)]
+            futures = [
+                (partition, self.executor.submit(_evaluate, var_values, partition))
+                for partition in partitions
+                if partition
+            ]
+            with engine.event_batch:
+                for partition, future in futures:
+                    for (step, _), value in zip(partition, future.result()):
+                        step.func.store(value, *step.args, **step.kwds)
+
+        top = plan.steps[-1]
+        return top.func(*top.args, **top.kwds)
+
+    def _inputs(self, step: Step):
+        helper = step.func.helper
+        this = step.args[0] if helper.is_method and step.args else None
+        inputs = []
+        for func, args, kwds in helper.required_calls(this):
+            if func.helper is func:
+                # variables are sent separately
+                continue
+            sid, _ = func.helper.make_node_id_pair(args, kwds)
+            node = self.engine.cache.get(sid)
+            if node is not None:
+                inputs.append((Step(func, args, kwds, 0), node.value))
+        return inputs
@@ -1,6 +1,20 @@
 # see https://stackoverflow.com/a/2022629/370696
 
-from typing import Any
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from .dispatch import Dispatcher
 
 
 class Event(list):
@@ -29,11 +43,121 @@ class Event(list):
     >>> e(2)
     g(2)
 
+    Subscribers are called synchronously unless a dispatcher is set,
+    see calcengine.dispatch.
     """
 
+    dispatcher: Optional["Dispatcher"] = None
+
     def __call__(self, *args: Any, **kwargs: Any):
+        dispatcher = self.dispatcher
         for f in self:
-            f(*args, **kwargs)
+            if dispatcher is None:
+                f(*args, **kwargs)
+            else:
+                dispatcher.submit(f, *args, **kwargs)
 
     def __repr__(self):
         return "Event(%s)" % list.__repr__(self)
+
+    def subscribe(self, key: Hashable, f: Callable, batched: bool = False):
+        """Subscribe f under key replacing any existing subscriber
+        with the same key. Repeated subscriptions are idempotent.
+
+        Batched subscribers are not called directly but queued on an
+        EventBatch, see NodeEvent.notify.
+        """
+        self.unsubscribe(key)
+        self.append(Subscription(key, f, batched))
+
+    def unsubscribe(self, key: Hashable):
+        """Remove subscriber with key if present."""
+        self[:] = [
+            s for s in self if not (isinstance(s, Subscription) and s.key == key)
+        ]
+
+
+class Subscription:
+    """Callable subscriber registered under a key."""
+
+    __slots__ = ("key", "func", "batched")
+
+    def __init__(self, key: Hashable, func: Callable, batched: bool = False):
+        self.key = key
+        self.func = func
+        self.batched = batched
+
+    def __call__(self, *args: Any, **kwargs: Any):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return "Subscription(%r, %r, batched=%r)" % (self.key, self.func, self.batched)
+
+
+class EventBatch(threading.local):
+    """Coalesces notifications for batched subscribers.
+
+    While active, as a possibly nested context manager, notifications
+    are queued per subscriber key with later values for the same item
+    replacing earlier ones. When the outermost batch exits each
+    subscriber is called once with a dict of item to value. Outside
+    a batch notifications are delivered immediately.
+
+    State is thread local so subscribers are called on the thread
+    that completed the batch.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.pending: Dict[Hashable, Tuple[Subscription, Dict[Any, Any], Any]] = {}
+        # items collected per event, by id of event
+        self.collected: Dict[int, Tuple[Any, Set[Any]]] = {}
+
+    def __enter__(self):
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.depth -= 1
+        if not self.depth:
+            self.flush()
+
+    def queue(
+        self,
+        subscription: Subscription,
+        item: Hashable,
+        value: Any,
+        dispatcher: Any = None,
+    ):
+        """Queue item for subscription, delivered with dispatcher
+        if given, see calcengine.dispatch.
+        """
+        # latest subscription for key wins
+        entry = self.pending.get(subscription.key)
+        items = entry[1] if entry else {}
+        items[item] = value
+        self.pending[subscription.key] = (subscription, items, dispatcher)
+        if not self.depth:
+            self.flush()
+
+    def collect(self, event: Any, items: Iterable[Any]):
+        """Collect items for event, calls event.deliver with all
+        items collected once the outermost batch completes.
+        """
+        entry = self.collected.get(id(event))
+        if entry is None:
+            entry = self.collected[id(event)] = (event, set())
+        entry[1].update(items)
+        if not self.depth:
+            self.flush()
+
+    def flush(self):
+        collected, self.collected = self.collected, {}
+        for event, items in collected.values():
+            event.deliver(items)
+        pending, self.pending = self.pending, {}
+        for subscription, items, dispatcher in pending.values():
+            if dispatcher is None:
+                subscription(items)
+            else:
+                dispatcher.submit(subscription, items)
@@ -0,0 +1,161 @@
+import asyncio
+import queue
+import threading
+from collections import deque
+from typing import Any, Deque, Iterable, NamedTuple, Optional, Tuple
+
+from .function_helper import Watched
+
+CALCULATED = "calculated"
+SET = "set"
+INVALIDATED = "invalidated"
+
+
+class Change(NamedTuple):
+    """Change to a node in an engine's base cache. Value is None
+    for invalidated nodes.
+    """
+
+    node_id: str
+    kind: str
+    value: Any
+
+
+def node_path(long_id: Any):
+    """Fully qualified function name of a node's long id."""
+    if isinstance(long_id, list):
+        if len(long_id) == 2 and long_id[0] == "___VAR___":
+            # variables are named
+            return long_id[1]
+        return long_id[0] if long_id else ""
+    return long_id if isinstance(long_id, str) else ""
+
+
+class ChangeFeed:
+    """Stream of changes to nodes of an engine, see CalcEngine.feed.
+
+    Iterate over a feed in a thread, or asynchronously, to receive
+    Change tuples. Changes are filtered by function or by prefix
+    of function path. A feed holds at most maxsize changes; once
+    full the calculation publishing a change blocks until there is
+    room, or with overflow "drop_oldest" the oldest change is
+    dropped and counted in dropped.
+
+    Example Usage:
+    >>> with ce.feed(prefix="sheet.") as feed:
+    ...     for change in feed:
+    ...         mirror[change.node_id] = change.value
+    """
+
+    def __init__(
+        self,
+        engine,
+        functions: Optional[Iterable[Watched]] = None,
+        prefix: Optional[str] = None,
+        kinds: Iterable[str] = (CALCULATED, SET, INVALIDATED),
+        maxsize: int = 1000,
+        overflow: str = "block",
+    ):
+        if overflow not in ("block", "drop_oldest"):
+            raise ValueError(f"Unknown overflow {overflow}")
+        self.engine = engine
+        self.paths = (
+            None if functions is None else {f.helper.fqn() for f in functions}
+        )
+        self.prefix = prefix
+        self.kinds = frozenset(kinds)
+        self.overflow = overflow
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+        self._items: Deque[Change] = deque()
+        self._changed = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.close()
+
+    def wants(self, kind: str, path: str):
+        return (
+            kind in self.kinds
+            and (self.paths is None or path in self.paths)
+            and (self.prefix is None or path.startswith(self.prefix))
+        )
+
+    def put(self, change: Change):
+        with self._changed:
+            if self.overflow == "block":
+                self._changed.wait_for(
+                    lambda: len(self._items) < self.maxsize or self.closed
+                )
+            elif len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            if self.closed:
+                return
+            self._items.append(change)
+            self._changed.notify_all()
+
+    def get(self, timeout: Optional[float] = None):
+        """Next change, raises queue.Empty on timeout and StopIteration
+        once closed and drained.
+        """
+        with self._changed:
+            if not self._changed.wait_for(
+                lambda: self._items or self.closed, timeout
+            ):
+                raise queue.Empty
+            if not self._items:
+                raise StopIteration
+            change = self._items.popleft()
+            self._changed.notify_all()
+            return change
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                return self.get(timeout=0)
+            except queue.Empty:
+                pass
+            except StopIteration:
+                raise StopAsyncIteration
+            # wait in executor so the event loop is not blocked
+            try:
+                return await loop.run_in_executor(None, self.get, 0.1)
+            except queue.Empty:
+                pass
+            except StopIteration:
+                raise StopAsyncIteration
+
+    def close(self):
+        """Stop receiving changes and end iteration once drained."""
+        with self._changed:
+            if self.closed:
+                return
+            self.closed = True
+            self._changed.notify_all()
+        # after closing, so calculations blocked putting changes while
+        # holding the lock are released
+        with self.engine.lock:
+            self.engine.feeds.remove(self)
+
+
+def publish(feeds, id_map, changes: Iterable[Tuple[str, str, Any]]):
+    """Put changes on feeds wanting them."""
+    for node_id, kind, value in changes:
+        path = node_path(id_map.get(node_id))
+        for feed in feeds:
+            if feed.wants(kind, path):
+                feed.put(Change(node_id, kind, value))
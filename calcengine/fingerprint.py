@@ -0,0 +1,125 @@
+import hashlib
+import weakref
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+def full_class_name(obj: Any):
+    cls = type(obj)
+    return cls.__module__ + "." + cls.__qualname__
+
+
+def digest(data: Any):
+    """Hex digest of a bytes like object, read without copying."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class DigestCache:
+    """Fingerprints cached per object, held by weak reference so
+    entries are dropped when objects are collected.
+
+    Note objects modified in place after their first use as an
+    argument keep their original fingerprint.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, Tuple[weakref.ref, Hashable]] = {}
+
+    def get(self, obj: Any, compute: Callable[[Any], Hashable]):
+        key = id(obj)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0]() is obj:
+            return entry[1]
+        value = compute(obj)
+        try:
+            ref = weakref.ref(obj, lambda ref: self._drop(key, ref))
+        except TypeError:
+            return value
+        self._entries[key] = (ref, value)
+        return value
+
+    def _drop(self, key: int, ref: weakref.ref):
+        if self._entries.get(key, (None,))[0] is ref:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+digests = DigestCache()
+
+
+class Fingerprint(tuple):
+    """Fingerprint of an unhashable object. Never equal to a tuple, so
+    fingerprints in node ids cannot collide with hashable arguments.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other: Any):
+        return type(other) is Fingerprint and tuple.__eq__(self, other)
+
+    def __ne__(self, other: Any):
+        return not self == other
+
+    def __hash__(self):
+        return hash(("___FINGERPRINT___",) + tuple(self))
+
+
+def _ndarray(arr: Any):
+    if arr.dtype.hasobject:
+        return ("numpy.ndarray", arr.shape, fingerprint(arr.tolist()))
+    # non contiguous views have to be copied to be read as a buffer
+    data = arr if arr.flags.c_contiguous else arr.copy(order="C")
+    return ("numpy.ndarray", arr.dtype.str, arr.shape, digest(data))
+
+
+def _pandas(obj: Any):
+    import pandas as pd  # type: ignore
+
+    hashes = pd.util.hash_pandas_object(obj, index=True).to_numpy()
+    columns = tuple(obj.columns) if hasattr(obj, "columns") else obj.name
+    return (full_class_name(obj), obj.shape, fingerprint(columns), digest(hashes))
+
+
+# fingerprint functions by full class name, returning tuples. These
+# avoid importing modules that might not be installed. Results are
+# cached per object.
+FINGERPRINTERS: Dict[str, Callable[[Any], Hashable]] = {
+    "numpy.ndarray": _ndarray,
+    "pandas.core.frame.DataFrame": _pandas,
+    "pandas.core.series.Series": _pandas,
+}
+
+
+def fingerprint(obj: Any) -> Hashable:
+    """Hashable value identifying obj for use in node ids.
+
+    Hashable objects are returned as is. Containers are fingerprinted
+    by their items and heavy types in FINGERPRINTERS, eg numpy arrays,
+    by hashing their buffers.
+    """
+    fingerprinter = FINGERPRINTERS.get(full_class_name(obj))
+    if fingerprinter is not None:
+        return Fingerprint(digests.get(obj, fingerprinter))
+
+    try:
+        hash(obj)
+        return obj
+    except TypeError:
+        pass
+
+    fp: tuple
+    if isinstance(obj, (list, tuple)):
+        fp = (type(obj).__name__, tuple(fingerprint(item) for item in obj))
+    elif isinstance(obj, dict):
+        fp = ("dict", frozenset((k, fingerprint(v)) for k, v in obj.items()))
+    elif isinstance(obj, set):
+        fp = ("set", frozenset(obj))
+    elif isinstance(obj, (bytearray, memoryview)):
+        fp = (type(obj).__name__, digest(obj))
+    else:
+        raise TypeError(
+            f"Cannot fingerprint unhashable argument of type {full_class_name(obj)},"
+            " consider watch key parameter"
+        )
+    return Fingerprint(fp)
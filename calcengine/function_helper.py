@@ -1,10 +1,46 @@
 import sys
 import struct
 from functools import _make_key  # type: ignore
-from dis import get_instructions
-from typing import Optional, Hashable, Callable, Dict, Any, Tuple
+from dis import HAVE_ARGUMENT, get_instructions, hasjabs, hasjrel, stack_effect
+from inspect import Parameter, iscode, signature
+from typing import (
+    Optional,
+    Hashable,
+    Callable,
+    Dict,
+    Any,
+    Tuple,
+    Iterable,
+    List,
+    Protocol,
+)
 
-from .utility import deep_getattr, deep_hasattr
+from .fingerprint import fingerprint
+from .instances import InstanceRegistry
+from .utility import deep_getattr
+
+
+_JUMPS = set(hasjrel) | set(hasjabs)
+
+
+# separates positional from keyword arguments in long ids
+KWD_MARK = ("___KWDS___",)
+
+
+def node_label(long_id: Any):
+    """Readable call of a node from its long id, eg "mod.d(5, y=-3)"."""
+    if isinstance(long_id, str):
+        return long_id + "()"
+    if not long_id:
+        return "?"
+    name, args = long_id[0], list(long_id[1:])
+    kwds = []
+    if KWD_MARK[0] in args:
+        i = args.index(KWD_MARK[0])
+        pairs = args[i + 1 :]
+        args = args[:i]
+        kwds = ["%s=%r" % pair for pair in zip(pairs[::2], pairs[1::2])]
+    return "%s(%s)" % (name, ", ".join(list(map(repr, args)) + kwds))
 
 
 def hash_unsigned_hex(key: Hashable):
@@ -15,69 +51,269 @@ def hash_unsigned_hex(key: Hashable):
     return hex(struct.unpack("N", struct.pack("n", hash(key)))[0])
 
 
+class _Const:
+    """Constant on simulated stack."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class _Watched:
+    """Watched function or variable on simulated stack."""
+
+    __slots__ = ("func",)
+
+    def __init__(self, func: Callable):
+        self.func = func
+
+
+# other values on simulated stack
+_UNKNOWN = object()
+_SELF = object()
+
+# calls with one slot for callable, others have two for callable
+# and either self or NULL depending on version and call type.
+_SINGLE_SLOT_CALLS = {"CALL_FUNCTION", "CALL_FUNCTION_KW"}
+_CALLS = _SINGLE_SLOT_CALLS | {"CALL_METHOD", "CALL", "CALL_KW"}
+
+# prefixes of instructions that do not leave a new value on the stack
+_NO_VALUE = (
+    "CACHE",
+    "CHECK_",
+    "COPY_FREE_VARS",
+    "DELETE_",
+    "END_",
+    "EXTENDED_ARG",
+    "GEN_START",
+    "JUMP",
+    "MAKE_CELL",
+    "NOP",
+    "POP_",
+    "PRINT_EXPR",
+    "RAISE",
+    "RERAISE",
+    "RESUME",
+    "RETURN",
+    "ROT_",
+    "SETUP_",
+    "STORE_",
+    "SWAP",
+)
+
+
+def _watched(obj: Any):
+    return _Watched(obj) if hasattr(obj, "helper") else _UNKNOWN
+
+
+def _stack_effect(ins, jump: bool):
+    try:
+        arg = ins.arg if ins.opcode >= HAVE_ARGUMENT else None
+        return stack_effect(ins.opcode, arg, jump=jump)
+    except ValueError:
+        return 0
+
+
+def _scan(code, objs, cells, this, self_name, found):
+    """Simulates the value stack of code, without following jumps,
+    recording calls of watched functions with constant arguments.
+    """
+    stack: List[Any] = []
+    depths: Dict[int, int] = {}
+    kw_names: Tuple[str, ...] = ()
+
+    def pop(n: int = 1):
+        items = stack[len(stack) - n :] if n else []
+        del stack[len(stack) - n :]
+        # pad if simulation has lost track
+        return [_UNKNOWN] * (n - len(items)) + items
+
+    for ins in get_instructions(code):
+        # stack depth at a jump target is that of the jump
+        if ins.offset in depths:
+            depth = depths[ins.offset]
+            del stack[depth:]
+            stack.extend([_UNKNOWN] * (depth - len(stack)))
+
+        op = ins.opname
+        if op in ("LOAD_CONST", "LOAD_SMALL_INT"):
+            if iscode(ins.argval):
+                # lambdas, comprehensions and nested functions
+                _scan(ins.argval, objs, cells, this, self_name, found)
+            stack.append(_Const(ins.argval))
+
+        elif op in ("LOAD_GLOBAL", "LOAD_NAME"):
+            if op == "LOAD_GLOBAL" and sys.version_info >= (3, 11) and ins.arg & 1:
+                stack.append(_UNKNOWN)  # NULL
+            stack.append(_watched(objs.get(ins.argval)))
+
+        elif op in ("LOAD_DEREF", "LOAD_CLASSDEREF"):
+            if ins.argval == self_name:
+                stack.append(_SELF)
+            else:
+                stack.append(_watched(cells.get(ins.argval)))
+
+        elif op.startswith("LOAD_FAST"):
+            names = ins.argval if isinstance(ins.argval, tuple) else (ins.argval,)
+            stack.extend(_SELF if n == self_name else _UNKNOWN for n in names)
+
+        elif op in ("LOAD_ATTR", "LOAD_METHOD"):
+            value = _UNKNOWN
+            if pop()[0] is _SELF:
+                # NOTE: we fetch the methods unbound function
+                func = deep_getattr(this, [ins.argval, "__func__"], default=None)
+                value = _watched(func)
+            stack.append(value)
+            if op == "LOAD_METHOD" or (sys.version_info >= (3, 12) and ins.arg & 1):
+                stack.append(_UNKNOWN)  # self or NULL
+
+        elif op == "PRECALL":
+            # 3.11 only, stack is left to CALL
+            pass
+
+        elif op == "KW_NAMES":
+            kw_names = (
+                ins.argval if isinstance(ins.argval, tuple) else code.co_consts[ins.arg]
+            )
+
+        elif op in _CALLS:
+            names: Any = ()
+            if op in ("CALL_FUNCTION_KW", "CALL_KW"):
+                names = pop()[0]
+                names = names.value if isinstance(names, _Const) else None
+            elif op == "CALL":
+                names, kw_names = kw_names, ()
+            args = pop(ins.arg)
+            slots = pop(1 if op in _SINGLE_SLOT_CALLS else 2)
+            funcs = [slot.func for slot in slots if isinstance(slot, _Watched)]
+            if (
+                funcs
+                and names is not None
+                and all(isinstance(arg, _Const) for arg in args)
+            ):
+                values = [arg.value for arg in args]
+                n_pos = len(values) - len(names)
+                found.append(
+                    (funcs[0], tuple(values[:n_pos]), dict(zip(names, values[n_pos:])))
+                )
+            stack.append(_UNKNOWN)
+
+        else:
+            if ins.opcode in _JUMPS:
+                depths.setdefault(ins.argval, len(stack) + _stack_effect(ins, True))
+            effect = _stack_effect(ins, False)
+            if effect < 0:
+                pop(-effect)
+            else:
+                stack.extend([_UNKNOWN] * effect)
+            if stack and not op.startswith(_NO_VALUE):
+                stack[-1] = _UNKNOWN
+
+
 def find_calls(func, this=None):
     """Searches code object for names within function block that
-    have been helper attribute (on graph); then process disassembled
-    code to discover arguments to these functions. This should be
-    enough data to form a unique node.
+    have been helper attribute (on graph); then simulates the stack
+    of disassembled code to discover arguments to these functions.
+    This should be enough data to form a unique node.
 
     Optional parameter this is reference to self. Normally func.__self__.
 
-    TODO: this routine is a shallow implementation. it should unroll
-    loops, comprehensions, etc; perhaps consider conditional branches.
-    Potentially use a decompiler such as python-decompile3.
+    Bytecode of python 3.6 onwards is understood, including the call
+    instructions introduced in 3.11 to 3.13. Nested code objects such
+    as lambdas and comprehensions are also searched. Only calls with
+    constant arguments are found.
+
+    TODO: this routine is a shallow implementation. Branches are all
+    assumed to be taken and loops to be run once.
     """
-    objs = func.__globals__
-    ins = get_instructions(func.__code__)
-    found = []
-    while True:
+    code = func.__code__
+    cells = {}
+    for name, cell in zip(code.co_freevars, func.__closure__ or ()):
         try:
-            oc = next(ins)
-            if (
-                oc.opname in ("LOAD_GLOBAL", "LOAD_ATTR")
-                and oc.argval in objs
-                and hasattr(objs[oc.argval], "helper")
-            ):
-                fn, args_ = objs[oc.argval], []
-                while True:
-                    oc = next(ins)
-                    if oc.opname == "LOAD_CONST":
-                        args_.append(oc.argval)
-
-                    if oc.opname == "CALL_FUNCTION":
-                        found.append((fn, tuple(args_), {}))
-                        break
-
-                    elif oc.opname == "CALL_FUNCTION_KW":
-                        kw_names = args_.pop()
-                        kwds_ = {n: args_.pop() for n in kw_names}
-                        found.append((fn, tuple(args_), kwds_))
-                        break
-
-            if oc.opname in ["LOAD_METHOD", "LOAD_ATTR"] and deep_hasattr(
-                this, [oc.argval, "helper"]
-            ):
-                # NOTE: we fetch the methods unbound function
-                fn, args_ = deep_getattr(this, [oc.argval, "__func__"]), []
-                while True:
-                    oc = next(ins)
-                    if oc.opname == "LOAD_CONST":
-                        args_.append(oc.argval)
+            cells[name] = cell.cell_contents
+        except ValueError:
+            # empty cell
+            pass
+    self_name = code.co_varnames[0] if this is not None and code.co_varnames else None
+    found: List[Tuple[Callable, tuple, dict]] = []
+    _scan(code, func.__globals__, cells, this, self_name, found)
+    return found
 
-                    if oc.opname == "CALL_METHOD":
-                        found.append((fn, tuple(args_), {}))
-                        break
 
-                    elif oc.opname == "CALL_FUNCTION_KW":
-                        kw_names = args_.pop()
-                        kwds_ = {n: args_.pop() for n in kw_names}
-                        found.append((fn, tuple(args_), kwds_))
-                        break
+_MISSING = object()
 
-        except StopIteration:
-            break
 
-    return found
+def make_normalizer(func: Callable):
+    """Returns function converting a call's args and kwds to canonical
+    form: parameters passed by position, with defaults applied, and
+    keyword only or extra keyword arguments sorted by name. Calls that
+    do not match the signature are returned unchanged.
+
+    The signature is inspected once. Calls passing all positional
+    parameters by position, and no keywords, are already canonical
+    unless there are keyword only parameters. Their number is the
+    arity attribute of the function returned, -1 otherwise.
+
+    Example Usage:
+    >>> normalize = make_normalizer(lambda x, y=0: x - y)
+    >>> normalize((5,), {"y": -3}) == normalize((), {"x": 5, "y": -3})
+    True
+    """
+    params = list(signature(func).parameters.values())
+    positional = [
+        p
+        for p in params
+        if p.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)
+    ]
+    n = len(positional)
+    defaults = [p.default for p in positional]
+    # positional only parameters cannot be passed by keyword
+    index = {
+        p.name: i
+        for i, p in enumerate(positional)
+        if p.kind == Parameter.POSITIONAL_OR_KEYWORD
+    }
+    kwonly = {p.name: p.default for p in params if p.kind == Parameter.KEYWORD_ONLY}
+    varkw = any(p.kind == Parameter.VAR_KEYWORD for p in params)
+    varargs = any(p.kind == Parameter.VAR_POSITIONAL for p in params)
+    empty = Parameter.empty
+
+    def normalize(args: Tuple[Any, ...], kwds: Dict[str, Any]):
+        if not kwds and not kwonly and len(args) == n:
+            return args, kwds
+        if len(args) > n and not varargs:
+            return args, kwds
+
+        values = list(args[:n]) + [_MISSING] * (n - len(args))
+        named = {}
+        for name, value in kwds.items():
+            i = index.get(name)
+            if i is not None:
+                if values[i] is not _MISSING:
+                    return args, kwds
+                values[i] = value
+            elif name in kwonly or varkw:
+                named[name] = value
+            else:
+                return args, kwds
+
+        for i, value in enumerate(values):
+            if value is _MISSING:
+                if defaults[i] is empty:
+                    return args, kwds
+                values[i] = defaults[i]
+        for name, default in kwonly.items():
+            if name not in named:
+                if default is empty:
+                    return args, kwds
+                named[name] = default
+
+        return tuple(values) + args[n:], dict(sorted(named.items()))
+
+    # number of positional arguments of calls already canonical
+    normalize.arity = -1 if kwonly else n  # type: ignore
+    return normalize
 
 
 class FunctionHelper:
@@ -89,10 +325,27 @@ class FunctionHelper:
         typed_key: bool = True,
         alias: Optional[str] = None,
         path: Optional[str] = None,
+        is_method: Optional[bool] = None,
+        instances: Optional[InstanceRegistry] = None,
+        key: Optional[Callable[[Any], Hashable]] = None,
+        normalize: bool = False,
     ):
         self.func = func
         self.typed = typed_key
 
+        # converts arguments to canonical form
+        self.normalize = make_normalizer(func) if normalize else None
+
+        # converts each argument to a hashable key
+        self.key = key
+
+        # methods are guessed from the name of the first argument
+        if is_method is None:
+            vn = func.__code__.co_varnames
+            is_method = bool(vn) and vn[0] == "self"
+        self.is_method = is_method
+        self.instances = instances
+
         # overrides for fully qualified names.
         # can be used to name lambdas.
         self.alias = alias
@@ -120,30 +373,90 @@ class FunctionHelper:
         Return a short and long variant of id. The short version can be
         considered as a unique node id.
 
-        Since a method call cannot easily be detected until it is called
-        from a class instance we simply check if the first argument is
-        `self` and convert that argument to unique string id.
+        For methods the first argument is converted to a unique string
+        id of the instance, see InstanceRegistry.
 
-        TODO: add class parameter to allow override `self` word check,
-        eg is_method=True|False or type=Enum(guess,function,instancemeth,..)
+        Arguments are put in canonical form if normalize is set, so
+        calls binding the same values share a node. They are then
+        converted by key function if given. Unhashable
+        arguments are otherwise replaced by their fingerprints.
+
+        Scenario contexts are not part of the id, instead each context
+        has its own cache layered over its parent's, see CalcContext.
+        """
+        return self._node_id_pair(self.fqn(), args, kwds)
 
-        TODO: replace fqn based on module path and function name with one
-        also including context, ie context / module / name.
+    def make_node_id_pairs(self, args_list: Iterable[Tuple[Any, ...]]):
+        """Bulk variant of make_node_id_pair for positional arguments.
+        The fully qualified name is only determined once.
         """
-        vn = self.func.__code__.co_varnames
-        if vn and vn[0] == "self":
-            args = (hex(id(args[0])),) + args[1:]
+        fqn = self.fqn()
+        return [self._node_id_pair(fqn, args, {}) for args in args_list]
+
+    def _node_id_pair(self, fqn: str, args, kwds):
+        normalize = self.normalize
+        if normalize is not None and (kwds or len(args) != normalize.arity):
+            args, kwds = normalize(args, kwds)
+
+        token = None
+        if self.is_method and args:
+            if self.instances is None:
+                token = hex(id(args[0]))
+            else:
+                token = self.instances.token(args[0])
+            args = args[1:]
+
+        if self.key is not None:
+            args = tuple(map(self.key, args))
+            kwds = {k: self.key(v) for k, v in kwds.items()}
+
+        if token is not None:
+            args = (token,) + args
 
         # choose a more presentable keyword mark for _make_key
-        long_id = _make_key(
-            (self.fqn(),) + args, kwds, self.typed, kwd_mark=("___KWDS___",)
-        )
+        try:
+            long_id = _make_key(
+                (fqn,) + args, kwds, self.typed, kwd_mark=KWD_MARK
+            )
+        except TypeError:
+            # unhashable arguments, eg lists or numpy arrays
+            args = tuple(map(fingerprint, args))
+            kwds = {k: fingerprint(v) for k, v in kwds.items()}
+            long_id = _make_key(
+                (fqn,) + args, kwds, self.typed, kwd_mark=KWD_MARK
+            )
         short_id = hash_unsigned_hex(long_id)
+        if token is not None and self.instances is not None:
+            self.instances.nodes[token].add(short_id)
         return short_id, long_id
 
+    def required_calls(self, this):
+        """Calls of watched functions and variables found in function
+        body, as (function, args, kwds) tuples. Instance this is the
+        first argument of calls to its methods.
+        """
+        this_pos_arg = (this,) if this is not None else tuple()
+        calls = []
+        for f, args_, kwds_ in find_calls(self.func, this):
+            if getattr(f.helper, "is_method", False):
+                args_ = this_pos_arg + args_
+            calls.append((f, args_, kwds_))
+        return calls
+
     def get_required_node_ids(self, this):
-        found = find_calls(self.func, this)
-        this_pos_arg = (this,) if this else tuple()
         return {
-            f.helper.make_node_id_pair(this_pos_arg + args_, kwds_)[0] for f, args_, kwds_ in found
+            f.helper.make_node_id_pair(args_, kwds_)[0]
+            for f, args_, kwds_ in self.required_calls(this)
         }
+
+
+class Watched(Protocol):
+    """Function returned by CalcEngine.watch, for type checking."""
+
+    helper: FunctionHelper
+    engine: Any
+    set_value: Callable[..., None]
+    store: Callable[..., None]
+
+    def __call__(self, *args: Any, **kwds: Any) -> Any:
+        ...
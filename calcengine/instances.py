@@ -0,0 +1,59 @@
+import itertools
+import weakref
+from collections import defaultdict
+from typing import Any, Dict, List, Set, Tuple
+
+
+class InstanceRegistry:
+    """Identifies instances of classes with watched methods.
+
+    Each instance is given a token that is never reused, unlike id(),
+    and is held by weak reference. Node ids of an instance's methods
+    are recorded so the engine can evict them once the instance has
+    been collected, see CalcEngine.evict_collected.
+
+    Instances that cannot be weakly referenced, eg classes with
+    __slots__ and no __weakref__ slot, fall back to id().
+    """
+
+    def __init__(self):
+        # id of instance to weak reference and token
+        self._tokens: Dict[int, Tuple[weakref.ref, str]] = {}
+        self._counter = itertools.count()
+
+        # node ids per token
+        self.nodes: Dict[str, Set[str]] = defaultdict(set)
+
+        # tokens of collected instances awaiting eviction. Weak
+        # reference callbacks can run during any allocation so
+        # eviction is left to the engine.
+        self.collected: List[str] = []
+
+    def token(self, obj: Any):
+        entry = self._tokens.get(id(obj))
+        if entry is not None and entry[0]() is obj:
+            return entry[1]
+        key = id(obj)
+        token = "%s@%d" % (type(obj).__qualname__, next(self._counter))
+        try:
+            ref = weakref.ref(obj, lambda ref: self._collect(key, ref, token))
+        except TypeError:
+            return hex(key)
+        self._tokens[key] = (ref, token)
+        return token
+
+    def _collect(self, key: int, ref: weakref.ref, token: str):
+        # id may already be reused by a newer instance
+        if self._tokens.get(key, (None,))[0] is ref:
+            del self._tokens[key]
+        self.collected.append(token)
+
+    def pop_collected(self):
+        """Node ids of instances collected since last called."""
+        ids: Set[str] = set()
+        while self.collected:
+            ids.update(self.nodes.pop(self.collected.pop(), ()))
+        return ids
+
+    def clear(self):
+        self.nodes.clear()
@@ -0,0 +1,38 @@
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from .compression import Compression
+
+
+@dataclass
+class NodeData:
+    """Store child nodes and cached values.
+    """
+
+    requires: set = field(default_factory=set)
+    value = None
+    # clock time node expires, see watch ttl
+    expires: Optional[float] = None
+
+
+class CompressedNodeData(NodeData):
+    """Node holding its value compressed, see calcengine.compression.
+    Each read of value decompresses a new copy.
+    """
+
+    def __init__(
+        self, requires: set, compression: Compression, data: bytes, size: int
+    ):
+        super().__init__(requires)
+        self.compression = compression
+        self.data = data
+        # size of uncompressed pickle
+        self.size = size
+
+    @property  # type: ignore
+    def value(self):
+        return self.compression.decompress(self.data)
+
+    @value.setter
+    def value(self, new_val: Any):
+        self.data, self.size = self.compression.compress(new_val, min_size=0)
@@ -0,0 +1,133 @@
+import pickle
+from concurrent.futures import Executor
+from typing import IO, Callable, Dict, List, NamedTuple, Optional, Union
+
+from .function_helper import Watched
+
+
+class Step(NamedTuple):
+    """Call of a watched function in a plan. Level is one more than
+    the highest level of the steps it requires, 0 for none.
+    """
+
+    func: Watched
+    args: tuple
+    kwds: dict
+    level: int
+
+
+class Plan:
+    """Dependencies of a node in topological order, see CalcEngine.plan.
+
+    Running a plan calls each step after the steps it requires so
+    every node finds its required nodes cached, rather than calling
+    them recursively. Steps of the same level are independent and
+    can be run concurrently.
+
+    Only calls found by find_calls, that is calls with constant
+    arguments, are steps. Other calls are made when the step calling
+    them is run, as usual.
+
+    Plans refer to functions and arguments, not node ids, and can be
+    saved and loaded in another process if these can be pickled.
+
+    Example Usage:
+    >>> plan = ce.plan(f)
+    >>> plan.save("f.plan")
+    >>> # after a restart
+    >>> ce.load_plan("f.plan").run()
+    809
+    """
+
+    def __init__(self, engine, steps: List[Step]):
+        self.engine = engine
+        self.steps = steps
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __repr__(self):
+        return "Plan(%d steps, %d levels)" % (len(self.steps), len(self.levels()))
+
+    @classmethod
+    def build(cls, engine, func: Callable, args: tuple, kwds: dict):
+        """Plan calling func with args and kwds."""
+        steps: Dict[str, Step] = {}
+        visiting = set()
+
+        def visit(f, args_, kwds_):
+            helper = f.helper
+            sid, _ = helper.make_node_id_pair(args_, kwds_)
+            if sid in steps or sid in visiting:
+                return steps[sid].level if sid in steps else 0
+            if helper is f:
+                # variables are inputs and not run
+                return -1
+            visiting.add(sid)
+            this = args_[0] if helper.is_method and args_ else None
+            level = 0
+            for required in helper.required_calls(this):
+                level = max(level, visit(*required) + 1)
+            visiting.discard(sid)
+            steps[sid] = Step(f, args_, kwds_, level)
+            return level
+
+        visit(func, args, kwds)
+        return cls(engine, list(steps.values()))
+
+    def levels(self):
+        """Steps grouped by level, lowest first."""
+        levels: List[List[Step]] = []
+        for step in self.steps:
+            while len(levels) <= step.level:
+                levels.append([])
+            levels[step.level].append(step)
+        return levels
+
+    def run(self, executor: Optional[Executor] = None):
+        """Calculate steps not already cached.
+
+        Args:
+            executor (Optional[Executor], optional): Runs the steps of
+                each level concurrently, eg a ThreadPoolExecutor.
+                Defaults to None to run steps serially.
+
+        Returns:
+            Any: Result of the planned call.
+        """
+        if not self.steps:
+            return None
+        if executor is None:
+            for step in self.steps:
+                result = step.func(*step.args, **step.kwds)
+            return result
+
+        context = self.engine.current_context
+
+        def call(step):
+            if context is None:
+                return step.func(*step.args, **step.kwds)
+            with context:
+                return step.func(*step.args, **step.kwds)
+
+        for level in self.levels():
+            results = list(executor.map(call, level))
+        return results[-1]
+
+    def save(self, file: Union[str, IO[bytes]]):
+        """Pickle plan to a file name or binary file object."""
+        if isinstance(file, str):
+            with open(file, "wb") as fp:
+                return self.save(fp)
+        pickle.dump([tuple(step) for step in self.steps], file)
+
+    @classmethod
+    def load(cls, engine, file: Union[str, IO[bytes]]):
+        """Unpickle plan saved with save."""
+        if isinstance(file, str):
+            with open(file, "rb") as fp:
+                return cls.load(engine, fp)
+        return cls(engine, [Step(*step) for step in pickle.load(file)])
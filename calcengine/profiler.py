@@ -0,0 +1,158 @@
+import sys
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Dict, List, Tuple
+
+from .function_helper import FunctionHelper
+
+
+def result_size(value: Any):
+    """Approximate size in bytes of a node value. Containers
+    such as numpy arrays and pandas frames report their buffers.
+    """
+    try:
+        return sys.getsizeof(value)
+    except TypeError:
+        return 0
+
+
+@dataclass
+class NodeStats:
+    """Statistics recorded for a node or aggregated per function.
+
+    Times are in seconds. Inclusive time includes time spent in
+    required nodes calculated during the call, exclusive does not.
+    """
+
+    name: str
+    hits: int = 0
+    misses: int = 0
+    inclusive: float = 0.0
+    exclusive: float = 0.0
+    size: int = 0
+
+    @property
+    def calls(self):
+        return self.hits + self.misses
+
+    def merge(self, other: "NodeStats"):
+        self.hits += other.hits
+        self.misses += other.misses
+        self.inclusive += other.inclusive
+        self.exclusive += other.exclusive
+        self.size += other.size
+
+
+class _Frame:
+    __slots__ = ("node_id", "label", "start", "children", "result")
+
+    def __init__(self, node_id: str, label: str):
+        self.node_id = node_id
+        self.label = label
+        self.start = perf_counter()
+        self.children = 0.0
+        self.result = None
+
+
+class Profiler:
+    """Records per node statistics for a CalcEngine.
+
+    Enabled with CalcEngine.enable_profiling. When disabled the
+    engine only checks whether a profiler is set.
+
+    Example Usage:
+    >>> profiler = ce.enable_profiling()
+    >>> f()
+    >>> profiler.top(5)
+    >>> print(profiler.collapsed())
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, NodeStats] = {}
+        # exclusive time per stack of function names
+        self.stacks: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._local = threading.local()
+
+    @property
+    def _stack(self) -> List[_Frame]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _stats(self, node_id: str, fh: FunctionHelper):
+        stats = self.nodes.get(node_id)
+        if stats is None:
+            stats = self.nodes[node_id] = NodeStats(fh.fqn())
+        return stats
+
+    def hit(self, node_id: str, fh: FunctionHelper):
+        self._stats(node_id, fh).hits += 1
+
+    @contextmanager
+    def measure(self, node_id: str, fh: FunctionHelper):
+        """Times a node calculation. Set yielded frame's result
+        to record the result size.
+        """
+        stats = self._stats(node_id, fh)
+        stack = self._stack
+        frame = _Frame(node_id, stats.name)
+        stack.append(frame)
+        try:
+            yield frame
+        finally:
+            stack.pop()
+            inclusive = perf_counter() - frame.start
+            exclusive = inclusive - frame.children
+            if stack:
+                stack[-1].children += inclusive
+            stats.misses += 1
+            stats.inclusive += inclusive
+            stats.exclusive += exclusive
+            stats.size = result_size(frame.result)
+            path = tuple(f.label for f in stack) + (frame.label,)
+            self.stacks[path] += exclusive
+
+    def record(self, node_id: str, fh: FunctionHelper, seconds: float, result: Any):
+        """Records a calculation timed outside of measure, eg one of
+        many calculated together by a watched function's map.
+        """
+        stats = self._stats(node_id, fh)
+        stats.misses += 1
+        stats.inclusive += seconds
+        stats.exclusive += seconds
+        stats.size = result_size(result)
+        path = tuple(f.label for f in self._stack) + (stats.name,)
+        self.stacks[path] += seconds
+
+    def clear(self):
+        self.nodes.clear()
+        self.stacks.clear()
+
+    def by_function(self) -> Dict[str, NodeStats]:
+        """Statistics aggregated per function."""
+        funcs: Dict[str, NodeStats] = {}
+        for stats in self.nodes.values():
+            if stats.name not in funcs:
+                funcs[stats.name] = NodeStats(stats.name)
+            funcs[stats.name].merge(stats)
+        return funcs
+
+    def top(self, n: int = 10, key: str = "exclusive"):
+        """Node ids and statistics of n nodes with largest key."""
+        return sorted(
+            self.nodes.items(), key=lambda item: getattr(item[1], key), reverse=True
+        )[:n]
+
+    def collapsed(self):
+        """Exclusive time in microseconds per stack in the collapsed
+        format read by flame graph tools, eg flamegraph.pl.
+        """
+        return "\n".join(
+            "%s %d" % (";".join(path), round(seconds * 1e6))
+            for path, seconds in self.stacks.items()
+        )
@@ -0,0 +1,190 @@
+"""Binary snapshots of an engine's cache and variables.
+
+The file holds a header, the pickled cache and, out of band, the raw
+buffers of values supporting pickle protocol 5, eg numpy arrays. These
+are written and read without intermediate copies.
+
+Short node ids depend on the process' string hashing so nodes are
+stored by long id and given new short ids when restored.
+"""
+import gc
+import pickle
+import struct
+from functools import _HashedSeq  # type: ignore
+from typing import IO, Any, Dict, List, Union
+
+from .function_helper import hash_unsigned_hex
+from .node import CompressedNodeData
+from .tiers import ColdNodeData, WarmNodeData
+from .var import unchanged
+
+MAGIC = b"CALCENG1"
+
+_LENGTH = struct.Struct("<Q")
+
+
+def _open(file: Union[str, IO[bytes]], mode: str):
+    if isinstance(file, str):
+        return open(file, mode)
+    return _Borrowed(file)
+
+
+class _Borrowed:
+    """Leaves file objects passed by callers open."""
+
+    def __init__(self, fp: IO[bytes]):
+        self.fp = fp
+
+    def __enter__(self):
+        return self.fp
+
+    def __exit__(self, *exc_info: Any):
+        pass
+
+
+def dump(engine, file: Union[str, IO[bytes]]):
+    """Write engine's base cache, id map, graph and variable values
+    to file.
+    """
+    with engine.lock:
+        # method nodes are keyed on instances of this process only
+        instance_ids = set().union(*engine.instances.nodes.values())
+
+        # hashed sequences pickle their hash which is process specific,
+        # keys of single values, eg functions without arguments, are not
+        # wrapped in a sequence.
+        short_ids, long_ids = [], []
+        for sid, lid in engine.id_map.items():
+            if sid not in instance_ids:
+                short_ids.append(sid)
+                long_ids.append(list(lid) if isinstance(lid, _HashedSeq) else lid)
+
+        # nodes refer to ids by position in long_ids
+        index = {sid: i for i, sid in enumerate(short_ids)}
+        nodes: List[int] = []
+        values: List[Any] = []
+        requires: List[tuple] = []
+        # compression, data and size of compressed values by position
+        compressed: Dict[int, tuple] = {}
+        # positions of nodes in the warm or cold tier
+        tiered: List[int] = []
+        for sid, node in engine.cache.items():
+            # expiry times are process specific, see watch ttl
+            if sid in index and node.expires is None:
+                if isinstance(node, (CompressedNodeData, ColdNodeData)):
+                    # written as held, not decompressed or promoted
+                    compressed[len(nodes)] = (node.compression, node.data, node.size)
+                    values.append(None)
+                    if isinstance(node, (WarmNodeData, ColdNodeData)):
+                        tiered.append(len(nodes))
+                else:
+                    values.append(node.value)
+                nodes.append(index[sid])
+                requires.append(
+                    tuple(index[id_] for id_ in node.requires if id_ in index)
+                )
+
+        buffers: List[pickle.PickleBuffer] = []
+        data = pickle.dumps(
+            {
+                "long_ids": long_ids,
+                "nodes": nodes,
+                "values": values,
+                "requires": requires,
+                "compressed": compressed,
+                "tiered": tiered,
+                "vars": {var.name: var._value for var in engine.vars.values()},
+            },
+            protocol=5,
+            buffer_callback=buffers.append,
+        )
+
+    with _open(file, "wb") as fp:
+        fp.write(MAGIC)
+        fp.write(_LENGTH.pack(len(data)))
+        fp.write(_LENGTH.pack(len(buffers)))
+        raws = [buffer.raw() for buffer in buffers]
+        for raw in raws:
+            fp.write(_LENGTH.pack(raw.nbytes))
+        fp.write(data)
+        for raw in raws:
+            fp.write(raw)
+
+
+def _read_exactly(fp: IO[bytes], size: int):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    pos = 0
+    while pos < size:
+        # binary files have readinto though IO does not declare it
+        n = fp.readinto(view[pos:])  # type: ignore
+        if not n:
+            raise ValueError("Truncated snapshot")
+        pos += n
+    return buffer
+
+
+def load(engine, file: Union[str, IO[bytes]]):
+    """Replace engine's base cache with snapshot read from file.
+
+    Returns:
+        int: Number of nodes restored.
+    """
+    with _open(file, "rb") as fp:
+        if fp.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a calcengine snapshot")
+        (data_size,) = _LENGTH.unpack(fp.read(_LENGTH.size))
+        (count,) = _LENGTH.unpack(fp.read(_LENGTH.size))
+        sizes = [_LENGTH.unpack(fp.read(_LENGTH.size))[0] for _ in range(count)]
+        data = _read_exactly(fp, data_size)
+        buffers = [_read_exactly(fp, size) for size in sizes]
+
+    # bulk creation of objects triggers many collections
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        snapshot = pickle.loads(data, buffers=buffers)
+        long_ids = [
+            _HashedSeq(tuple(lid)) if isinstance(lid, list) else lid
+            for lid in snapshot["long_ids"]
+        ]
+        ids = list(map(hash_unsigned_hex, long_ids))
+        new_node = engine.cache.default_factory
+        compressed = snapshot.get("compressed", {})
+        nodes = []
+        for pos, (requires, value) in enumerate(
+            zip(snapshot["requires"], snapshot["values"])
+        ):
+            required_ids = {ids[i] for i in requires}
+            if pos in compressed:
+                node = CompressedNodeData(required_ids, *compressed[pos])
+            else:
+                node = new_node(required_ids)
+                node.value = value
+            nodes.append(node)
+
+        with engine.lock:
+            engine.clear_cache()
+            engine.id_map.update(zip(ids, long_ids))
+            node_ids = [ids[i] for i in snapshot["nodes"]]
+            engine.cache.update(zip(node_ids, nodes))
+            for id_, node in zip(node_ids, nodes):
+                engine._set_requires(id_, node.requires)
+            if engine.tiers is not None:
+                tiered = set(snapshot.get("tiered", ()))
+                for pos, (id_, node) in enumerate(zip(node_ids, nodes)):
+                    engine.tiers.restored(id_, node, pos in tiered)
+
+            # restored nodes read the variable values they were
+            # calculated with
+            values = snapshot.get("vars", {})
+            for var in engine.vars.values():
+                if var.name not in values:
+                    engine._remove(engine._required_by({var.id}))
+                elif not unchanged(var._value, values[var.name]):
+                    var._value = values[var.name]
+                    var.node_value_set.notify(var.id, var._value)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return len(nodes)
@@ -0,0 +1,306 @@
+"""Tiered storage of an engine's base cache.
+
+Calculated nodes start in the hot tier, holding their values as is.
+When the hot tier exceeds its budget, the nodes that are cheapest to
+recalculate and least read are compressed into the warm tier, and
+from there spilled to files in the cold tier. Reading a warm or cold
+node's value promotes it back to the hot tier.
+"""
+import os
+import pickle
+import shutil
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .compression import Compression
+from .node import CompressedNodeData, NodeData
+from .profiler import result_size
+
+HOT = "hot"
+WARM = "warm"
+COLD = "cold"
+
+TIERS = (HOT, WARM, COLD)
+
+# demoting stops once a tier is below this fraction of its budget
+LOW_WATER = 0.8
+
+
+def pickled_size(value: Any):
+    """Size in bytes of value's pickle, including out of band buffers,
+    eg of numpy arrays, which are not copied. Unlike result_size this
+    counts the items of containers. Values that cannot be pickled are
+    sized by result_size.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    try:
+        data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    except Exception:  # noqa pickling can fail in many ways
+        return result_size(value)
+    return len(data) + sum(buffer.raw().nbytes for buffer in buffers)
+
+
+@dataclass
+class TierStats:
+    """Counters of a tier. Bytes of the hot tier are estimated by
+    the store's sizeof, others are compressed sizes.
+    """
+
+    nodes: int = 0
+    bytes: int = 0
+    hits: int = 0
+    promotions: int = 0
+    demotions: int = 0
+
+
+class _Entry:
+    __slots__ = ("tier", "size", "cost", "hits")
+
+    def __init__(self, size: int, cost: float):
+        self.tier = HOT
+        self.size = size
+        # seconds taken to calculate
+        self.cost = cost
+        # reads since entering tier
+        self.hits = 0
+
+    def score(self):
+        return (self.hits + 1) * self.cost
+
+
+class WarmNodeData(CompressedNodeData):
+    """Node of the warm tier, promoted when its value is read or set."""
+
+    def __init__(self, requires: set, store: "TieredStore", sid: str, data, size):
+        super().__init__(requires, store.compression, data, size)
+        self.store = store
+        self.sid = sid
+
+    @property  # type: ignore
+    def value(self):
+        value = super().value
+        self.store.promote(self.sid, self, value)
+        return value
+
+    @value.setter
+    def value(self, new_val: Any):
+        self.store.promote(self.sid, self, new_val)
+
+
+class ColdNodeData(NodeData):
+    """Node of the cold tier whose compressed value is in a file,
+    promoted when its value is read or set.
+    """
+
+    def __init__(
+        self, requires: set, store: "TieredStore", sid: str, path: str, size: int
+    ):
+        super().__init__(requires)
+        self.store = store
+        self.sid = sid
+        self.path = path
+        # size of uncompressed pickle
+        self.size = size
+
+    @property
+    def compression(self):
+        return self.store.compression
+
+    @property
+    def data(self):
+        """Compressed value, read without promoting the node."""
+        with open(self.path, "rb") as fp:
+            return fp.read()
+
+    @property  # type: ignore
+    def value(self):
+        value = self.compression.decompress(self.data)
+        self.store.promote(self.sid, self, value)
+        return value
+
+    @value.setter
+    def value(self, new_val: Any):
+        self.store.promote(self.sid, self, new_val)
+
+
+class TieredStore:
+    """Moves nodes of an engine's base cache between a hot, a warm
+    compressed and a cold on disk tier, see CalcEngine.enable_tiering.
+
+    Nodes are demoted from a tier over budget in order of the time
+    they took to calculate times one more than the number of reads,
+    lowest first. The cold tier is not limited.
+
+    Hot values are sized by sizeof, by default the size of their
+    pickle, which pickles each value once when calculated. A cheaper
+    estimate can be given instead. Note sys.getsizeof does not count
+    the items of containers.
+
+    Example Usage:
+    >>> tiers = ce.enable_tiering(hot_bytes=1 << 30, warm_bytes=4 << 30)
+    >>> f()
+    >>> tiers.stats["cold"]
+    TierStats(nodes=12, bytes=3456789, hits=2, promotions=0, demotions=12)
+    """
+
+    def __init__(
+        self,
+        engine,
+        hot_bytes: int = 256 << 20,
+        warm_bytes: int = 1 << 30,
+        directory: Optional[str] = None,
+        compression: Optional[Compression] = None,
+        sizeof: Callable[[Any], int] = pickled_size,
+    ):
+        self.engine = engine
+        self.limits = {HOT: hot_bytes, WARM: warm_bytes}
+        self._own_directory = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix="calcengine-")
+        self.compression = compression or Compression(min_size=0)
+        self.sizeof = sizeof
+        self.entries: Dict[str, _Entry] = {}
+        self.stats = {tier: TierStats() for tier in TIERS}
+
+    def hit(self, sid: str):
+        entry = self.entries.get(sid)
+        if entry is not None:
+            entry.hits += 1
+            self.stats[entry.tier].hits += 1
+
+    def added(self, sid: str, node: NodeData, cost: float):
+        """Track a node calculated into the base cache."""
+        self._drop(sid)
+        if isinstance(node, CompressedNodeData):
+            size = len(node.data)
+        else:
+            size = self.sizeof(node.value)
+        self._enter(sid, _Entry(size, cost), HOT)
+        self._rebalance()
+
+    def restored(self, sid: str, node: NodeData, warm: bool):
+        """Track a node restored into the base cache from a snapshot.
+        Nodes that were warm or cold when saved enter the warm tier.
+        """
+        if not (warm and isinstance(node, CompressedNodeData)):
+            self.added(sid, node, 0.0)
+            return
+        self._drop(sid)
+        data, size = node.data, node.size
+        if node.compression.codec != self.compression.codec:
+            data, size = self.compression.compress(node.value, min_size=0)
+        warm_node = WarmNodeData(node.requires, self, sid, data, size)
+        warm_node.expires = node.expires
+        self.engine.cache[sid] = warm_node
+        self._enter(sid, _Entry(len(data), 0.0), WARM)
+        self._rebalance()
+
+    def discard(self, ids: Iterable[str]):
+        """Stop tracking nodes removed from the base cache."""
+        for sid in ids:
+            self._drop(sid)
+
+    def clear(self):
+        for sid in list(self.entries):
+            self._drop(sid)
+
+    def close(self):
+        """Promote all nodes and remove the cold tier's files."""
+        with self.engine.lock:
+            cache = self.engine.cache
+            self.limits = {HOT: float("inf"), WARM: float("inf")}
+            for sid, entry in list(self.entries.items()):
+                node = cache.get(sid)
+                if entry.tier != HOT and node is not None:
+                    node.value  # promotes
+            self.entries.clear()
+        if self._own_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def promote(self, sid: str, node: NodeData, value: Any):
+        """Replace warm or cold node with a hot node holding value."""
+        with self.engine.lock:
+            cache = self.engine.cache
+            if cache.get(sid) is not node:
+                # read through a stale reference
+                return
+            hot = NodeData(node.requires)
+            hot.value = value
+            hot.expires = node.expires
+            cache[sid] = hot
+            entry = self._drop(sid)
+            if entry is None:
+                return
+            entry.size = self.sizeof(value)
+            entry.hits = 0
+            self._enter(sid, entry, HOT)
+            self.stats[HOT].promotions += 1
+            self._rebalance()
+
+    def _enter(self, sid: str, entry: _Entry, tier: str):
+        entry.tier = tier
+        self.entries[sid] = entry
+        stats = self.stats[tier]
+        stats.nodes += 1
+        stats.bytes += entry.size
+
+    def _drop(self, sid: str):
+        entry = self.entries.pop(sid, None)
+        if entry is not None:
+            stats = self.stats[entry.tier]
+            stats.nodes -= 1
+            stats.bytes -= entry.size
+            if entry.tier == COLD:
+                try:
+                    os.remove(self._path(sid))
+                except FileNotFoundError:
+                    pass
+        return entry
+
+    def _path(self, sid: str):
+        return os.path.join(self.directory, sid)
+
+    def _rebalance(self):
+        for tier, lower in ((HOT, WARM), (WARM, COLD)):
+            stats, limit = self.stats[tier], self.limits[tier]
+            if stats.bytes <= limit:
+                continue
+            victims = sorted(
+                (entry.score(), sid)
+                for sid, entry in self.entries.items()
+                if entry.tier == tier
+            )
+            for _, sid in victims:
+                if stats.bytes <= limit * LOW_WATER:
+                    break
+                self._demote(sid, lower)
+
+    def _demote(self, sid: str, tier: str):
+        cache = self.engine.cache
+        node = cache.get(sid)
+        if node is None:
+            self._drop(sid)
+            return
+        if self.engine.dedup is not None:
+            # value is no longer held as is
+            self.engine.dedup.release(sid)
+        if tier == WARM:
+            data, size = self.compression.compress(node.value, min_size=0)
+            new: NodeData = WarmNodeData(node.requires, self, sid, data, size)
+        else:
+            data = node.data  # type: ignore
+            with open(self._path(sid), "wb") as fp:
+                fp.write(data)
+            new = ColdNodeData(
+                node.requires, self, sid, self._path(sid), node.size  # type: ignore
+            )
+        new.expires = node.expires
+        cache[sid] = new
+        entry = self.entries.pop(sid)
+        stats = self.stats[entry.tier]
+        stats.nodes -= 1
+        stats.bytes -= entry.size
+        entry.size = len(data)
+        entry.hits = 0
+        self._enter(sid, entry, tier)
+        self.stats[tier].demotions += 1
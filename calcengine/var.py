@@ -0,0 +1,115 @@
+from functools import _make_key  # type: ignore
+from typing import TYPE_CHECKING, Any, Set
+
+from .feed import SET
+from .function_helper import hash_unsigned_hex
+
+if TYPE_CHECKING:
+    from .base import NodeEvent
+
+
+def unchanged(old: Any, new: Any):
+    """Whether assigning new over old can be skipped."""
+    if old is new:
+        return True
+    if type(old) is not type(new):
+        return False
+    try:
+        return bool(old == new)
+    except Exception:  # noqa eg numpy arrays compare elementwise
+        return False
+
+
+class Var:
+    """Input node holding a value.
+
+    Watched functions read a variable by calling it. Nodes reading
+    the variable, found in their body or when read, are tracked so
+    assigning a new value invalidates just those nodes and nodes
+    requiring them. Assigning an equal
+    value has no effect. Variables are created with CalcEngine.var.
+
+    Example Usage:
+    >>> rate = ce.var("rate", 0.05)
+    >>> @ce.watch()
+    ... def interest():
+    ...     return 100 * rate()
+    >>> interest()
+    5.0
+    >>> rate.value = 0.1  # invalidates interest
+    """
+
+    def __init__(
+        self, engine, name: str, value: Any, node_value_set: "NodeEvent"
+    ):
+        self.engine = engine
+        self.name = name
+        self.long_id = _make_key(("___VAR___", name), {}, False)
+        self.id = hash_unsigned_hex(self.long_id)
+        self.node_value_set = node_value_set
+        self._value = value
+
+    @property
+    def helper(self):
+        # found as a dependency by find_calls, like watched functions
+        return self
+
+    def fqn(self):
+        return self.name
+
+    def make_node_id_pair(self, args, kwds):
+        return self.id, self.long_id
+
+    @property
+    def readers(self) -> Set[str]:
+        """Ids of nodes in engine's base cache reading this."""
+        return set(self.engine._dependants.get(self.id, ()))
+
+    def __call__(self):
+        # recorded before reading so a concurrent set marks the
+        # reading calculation stale
+        self.engine._reading(self.id)
+        context = self.engine.current_context
+        if context is not None:
+            node = context.lookup(self.id)
+            if node is not None:
+                return node.value
+        return self._value
+
+    def __repr__(self):
+        return "Var(%r, %r)" % (self.name, self._value)
+
+    @property
+    def value(self):
+        return self()
+
+    @value.setter
+    def value(self, new_val: Any):
+        self.set(new_val)
+
+    def set(self, new_val: Any):
+        """Assign value, within a context the value is overridden
+        in that context.
+
+        Returns:
+            bool: False if value unchanged and nothing invalidated.
+        """
+        engine = self.engine
+        context = engine.current_context
+        if context is not None:
+            if unchanged(self(), new_val):
+                return False
+            context.override_id(self.id, new_val)
+            return True
+        with engine.lock:
+            if unchanged(self._value, new_val):
+                return False
+            self._value = new_val
+            readers = engine._required_by({self.id})
+            engine._changed({self.id})
+            self.node_value_set.notify(self.id, new_val)
+            if engine.feeds:
+                engine._publish([(self.id, SET, new_val)])
+            if readers:
+                engine._remove(readers)
+        return True
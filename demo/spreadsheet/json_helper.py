@@ -24,23 +24,101 @@ SIMPLE_TYPE_ATTRIBUTES = {
 SIMPLE_NAMES = {full_class_name(t): t for t in SIMPLE_TYPE_ATTRIBUTES}
 
 
-class InvalidCellDuringCopyException(Exception):
+class InvalidCell:
+    """Marks a value that could not be serialized and
+    so must be recalculated when loaded.
+    """
+
     pass
 
 
-class InvalidCell:
-    """Leverage python's deepcopy to detect cells
-    requiring invalidation within deep structures.
+class LazyValue:
+    """Holds a serialized payload and only decodes it when
+    first resolved. Avoids decoding large dataframes, arrays
+    and images for cells that are never displayed or referenced.
+    """
+
+    __slots__ = ("payload", "_value")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self._value = None
+
+    @property
+    def resolved(self):
+        return self.payload is None
+
+    def resolve(self):
+        if self.payload is not None:
+            self._value = decode_payload(self.payload)
+            self.payload = None
+        return self._value
+
+
+def contains_invalid_cell(obj):
+    """Walks lists and dicts looking for invalid cells. Lazy
+    payloads are leaves so are never decoded here.
     """
-    def __deepcopy__(self, memo):
-        raise InvalidCellDuringCopyException()
+    if isinstance(obj, InvalidCell):
+        return True
+    elif isinstance(obj, list):
+        return any(contains_invalid_cell(o) for o in obj)
+    elif isinstance(obj, dict):
+        return any(contains_invalid_cell(o) for o in obj.values())
+    return False
+
+
+def resolve_lazy(obj):
+    """Resolves any lazy values nested within lists and dicts."""
+    if isinstance(obj, LazyValue):
+        return obj.resolve()
+    elif isinstance(obj, list):
+        return [resolve_lazy(o) for o in obj]
+    elif isinstance(obj, dict):
+        return {k: resolve_lazy(o) for k, o in obj.items()}
+    return obj
 
 
 INVALID_CELL_FCN = full_class_name(InvalidCell)
 
+# payloads that are expensive to decode and so
+# are wrapped in a LazyValue until needed.
+LAZY_TYPES = {
+    "pandas.core.frame.DataFrame",
+    "pandas.core.series.Series",
+    "numpy.ndarray",
+    "PIL.Image.Image",
+}
+
+
+def decode_payload(obj):
+    if obj["_type"] == "pandas.core.frame.DataFrame":
+        import pandas as pd
+
+        return pd.read_json(obj["value"])
+    elif obj["_type"] == "pandas.core.series.Series":
+        import pandas as pd
+
+        return pd.read_json(obj["value"], typ="series")
+    elif obj["_type"] == "numpy.ndarray":
+        import numpy as np
+
+        return np.asarray(obj["value"])
+    elif obj["_type"] == "PIL.Image.Image":
+        import PIL.Image
+
+        return PIL.Image.open(BytesIO(b64decode(obj["value"].encode())))
+
+    return obj
+
 
 class JSONEncoder(json.JSONEncoder):
     def default(self, obj):
+        # lazy values never resolved are written back
+        # as is without decoding and re-encoding.
+        if isinstance(obj, LazyValue):
+            return obj.payload if not obj.resolved else obj.resolve()
+
         # use string type to avoid unneccesary imports for
         # modules that might not be installed.
         fcn = full_class_name(obj)
@@ -90,29 +168,21 @@ class JSONEncoder(json.JSONEncoder):
 
 
 class JSONDecoder(json.JSONDecoder):
+    """Decodes sheet data. Large payloads are wrapped in LazyValue.
+    The invalid_cell_found flag records whether any invalid cells
+    were seen so callers can skip searching for them.
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(object_hook=self.object_hook, *args, **kwargs)
+        self.invalid_cell_found = False
 
     def object_hook(self, obj):
         if "_type" not in obj:
             return obj
 
-        if obj["_type"] == "pandas.core.frame.DataFrame":
-            import pandas as pd
-
-            return pd.read_json(obj["value"])
-        elif obj["_type"] == "pandas.core.series.Series":
-            import pandas as pd
-
-            return pd.read_json(obj["value"], typ="series")
-        elif obj["_type"] == "numpy.ndarray":
-            import numpy as np
-
-            return np.asarray(obj["value"])
-        elif obj["_type"] == "PIL.Image.Image":
-            import PIL.Image
-
-            return PIL.Image.open(BytesIO(b64decode(obj["value"].encode())))
+        if obj["_type"] in LAZY_TYPES:
+            return LazyValue(obj)
         elif obj["_type"] == "decimal.Decimal":
             return decimal.Decimal(obj["value"])
 
@@ -120,6 +190,7 @@ class JSONDecoder(json.JSONDecoder):
             return SIMPLE_NAMES[obj["_type"]](*obj["value"])
 
         elif obj["_type"] == INVALID_CELL_FCN:
+            self.invalid_cell_found = True
             return InvalidCell()
 
         return obj
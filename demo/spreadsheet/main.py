@@ -1,6 +1,7 @@
 import sys
 import re
 from functools import partial
+from collections import defaultdict
 import traceback
 from pathlib import Path
 import json
@@ -13,7 +14,7 @@ import html
 from io import StringIO
 import csv
 from textwrap import dedent
-import copy
+from contextlib import contextmanager
 
 from PyQt5.QtWidgets import (
     QStatusBar,
@@ -21,8 +22,8 @@ from PyQt5.QtWidgets import (
     QToolBar,
     QApplication,
     QAction,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
+    QAbstractItemView,
     QItemDelegate,
     QStyle,
     QMessageBox,
@@ -35,8 +36,9 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
     QWidget,
+    QProgressBar,
 )
-from PyQt5.QtGui import QIcon, QFont, QFontMetrics, QTextCursor
+from PyQt5.QtGui import QIcon, QFont, QFontMetrics, QTextCursor, QImage, QPixmap
 from PyQt5.QtCore import (
     pyqtSignal,
     Qt,
@@ -47,15 +49,21 @@ from PyQt5.QtCore import (
     QThread,
     QByteArray,
     QSettings,
+    QAbstractTableModel,
+    QModelIndex,
 )
 import PIL.Image
-from PIL.ImageQt import ImageQt
 import dateutil
 
 try:
     import matplotlib
+
+    # formulas create figures on the calculation worker thread so
+    # use a non GUI backend, figures are rendered via LazyFigure.
+    matplotlib.use("Agg")
     import matplotlib.artist
     import matplotlib.pyplot as mpl
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
 
     warnings.filterwarnings(
         "ignore", category=matplotlib.cbook.MatplotlibDeprecationWarning
@@ -64,9 +72,15 @@ try:
 except:  # noqa
     HAS_MATPLOTLIB = False
 
-from calcengine import CalcEngine
+from calcengine import CalcEngine, CycleError
 from syntax import PythonHighlighter
-from json_helper import JSONEncoder, JSONDecoder, InvalidCellDuringCopyException
+from json_helper import (
+    JSONEncoder,
+    JSONDecoder,
+    LazyValue,
+    contains_invalid_cell,
+    resolve_lazy,
+)
 
 if hasattr(Qt, "AA_EnableHighDpiScaling"):
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
@@ -91,14 +105,84 @@ def new_name_space():
     ns = dict()
     ns["CE"] = CALC_ENGINE
     ns["datetime"] = datetime
+    # lazy values restored from file keyed by (r1, c1)
+    ns["RESTORED"] = {}
     return ns
 
 
 NAME_SPACE = new_name_space()
 
 
+class LazyFigure:
+    """Matplotlib figure only rendered when first needed, eg when
+    its cell is painted. Rendering uses an Agg canvas whose RGBA
+    buffer is shared with images without copying.
+    """
+
+    __slots__ = ("figure", "drawn")
+
+    def __init__(self, figure):
+        self.figure = figure
+        # attach Agg canvas regardless of pyplot backend
+        FigureCanvasAgg(figure)
+        self.drawn = False
+
+    @property
+    def size(self):
+        return self.figure.canvas.get_width_height()
+
+    def buffer(self):
+        """RGBA memoryview of shape (height, width, 4)."""
+        if not self.drawn:
+            self.figure.canvas.draw()
+            self.drawn = True
+        return self.figure.canvas.buffer_rgba()
+
+    def to_image(self):
+        buffer = self.buffer()
+        height, width = buffer.shape[:2]
+        return PIL.Image.frombuffer(
+            "RGBA", (width, height), buffer, "raw", "RGBA", 0, 1
+        )
+
+    def __repr__(self):
+        return "LazyFigure(%dx%d)" % self.size
+
+
+def to_pixmap(value):
+    """Converts figures and images to pixmap otherwise returns None.
+    For figures the QImage wraps the canvas buffer so the only copy
+    made is the one into the pixmap. PIL images are also copied into
+    a byte buffer first, and converted to RGBA if necessary.
+    """
+    if isinstance(value, LazyFigure):
+        buffer = value.buffer()
+        height, width = buffer.shape[:2]
+        image = QImage(buffer, width, height, 4 * width, QImage.Format_RGBA8888)
+        return QPixmap.fromImage(image)
+    elif isinstance(value, PIL.Image.Image):
+        if value.mode != "RGBA":
+            value = value.convert("RGBA")
+        buffer = value.tobytes("raw", "RGBA")
+        image = QImage(
+            buffer, value.width, value.height, 4 * value.width, QImage.Format_RGBA8888
+        )
+        return QPixmap.fromImage(image)
+    return None
+
+
 class CellData:
-    __slots__ = ("r1", "c1", "_formula", "_value", "_format", "_func")
+    __slots__ = (
+        "r1",
+        "c1",
+        "_formula",
+        "_value",
+        "_format",
+        "_func",
+        "_generation",
+        "_pixmap",
+        "_pixmap_generation",
+    )
 
     def __init__(self, r1, c1, formula=None, value=None, format=None):
         self.r1 = r1
@@ -108,22 +192,41 @@ class CellData:
         self._format = format
         self._func = None
 
+        # pixmap is cached until value changes
+        self._generation = 0
+        self._pixmap = None
+        self._pixmap_generation = -1
+
     @property
     def value(self):
+        # values restored from file are decoded on first access
+        if isinstance(self._value, LazyValue):
+            self._value = self._value.resolve()
         return self._value
 
     @value.setter
     def value(self, val):
-        # convert matplotlib artist into png images
+        # matplotlib artists are rendered when first displayed
         if HAS_MATPLOTLIB and isinstance(val, matplotlib.artist.Artist):
-            canvas = val.figure.canvas
-            canvas.draw()
-            self._value = PIL.Image.frombytes(
-                "RGB", canvas.get_width_height(), canvas.tostring_rgb(),
-            )
             mpl.close(val.figure)
+            self._value = LazyFigure(val.figure)
         else:
             self._value = val
+        self._generation += 1
+
+    def image_size(self):
+        """Width and height if value is displayed as image."""
+        value = self.value
+        if isinstance(value, (LazyFigure, PIL.Image.Image)):
+            return value.size
+        return None
+
+    def pixmap(self):
+        """Pixmap of image values cached per value generation."""
+        if self._pixmap_generation != self._generation:
+            self._pixmap = to_pixmap(self.value)
+            self._pixmap_generation = self._generation
+        return self._pixmap
 
     @property
     def formula(self):
@@ -133,6 +236,29 @@ class CellData:
     def formula(self, val):
         self._formula = val
         self._func = None
+        self.discard_restored()
+
+    @property
+    def node_id(self):
+        node_id, _ = self.func.helper.make_node_id_pair((), {})
+        return node_id
+
+    @property
+    def restored(self):
+        """Whether cell holds a restored value not yet referenced."""
+        return (self.r1, self.c1) in NAME_SPACE["RESTORED"]
+
+    def restore(self, lazy_value):
+        """Restores a saved value without decoding it. The value is
+        resolved when displayed or when the cell function is first
+        called instead of recalculating the formula.
+        """
+        self._value = lazy_value
+        self._generation += 1
+        NAME_SPACE["RESTORED"][(self.r1, self.c1)] = lazy_value
+
+    def discard_restored(self):
+        NAME_SPACE["RESTORED"].pop((self.r1, self.c1), None)
 
     @property
     def format(self):
@@ -212,7 +338,15 @@ class CellData:
                     CellData.FORMULA_REGEX, _to_ce_func, formula, flags=re.IGNORECASE,
                 )
 
-            fn_def = f"def {fn_name}(): return {formula}\n"
+            # restored values are returned in place of formula
+            # on first call, see CellData.restore.
+            key = (self.r1, self.c1)
+            fn_def = (
+                f"def {fn_name}():\n"
+                f"    if {key} in RESTORED:\n"
+                f"        return RESTORED.pop({key}).resolve()\n"
+                f"    return {formula}\n"
+            )
 
             # creates the function
             # TODO: rather than pollute namespace
@@ -248,10 +382,13 @@ class DisplayDelegate(QItemDelegate):
         if (row, col) in self.parent().data:
             cell_data = self.parent().data[(row, col)]
             try:
-                if isinstance(cell_data.value, PIL.Image.Image):
-                    painter.drawImage(option.rect, ImageQt(cell_data.value))
+                pixmap = cell_data.pixmap()
+                if pixmap is not None:
+                    painter.drawPixmap(option.rect, pixmap)
                 else:
-                    painter.drawText(option.rect, Qt.AlignLeft, cell_data.formatted())
+                    painter.drawText(
+                        option.rect, Qt.AlignLeft, index.data(Qt.DisplayRole)
+                    )
                 return
             except Exception as exc:  # noqa
                 pass
@@ -297,42 +434,239 @@ def get_literal(formula):
     return None
 
 
-class GridEditor(QTableWidget):
-    cellEditingStarted = pyqtSignal(int, int)
+class SheetModel(QAbstractTableModel):
+    """Table model over sparse cell data.
+
+    Formatted values are only computed when the view requests
+    them, ie for visible cells, and are cached until the cell
+    changes. Changes made during a batch are emitted as a single
+    dataChanged signal covering all changed cells.
+    """
+
+    cellEdited = pyqtSignal(int, int, str)
+
+    def __init__(self, rows, cols, parent=None):
+        super().__init__(parent)
+        self.rows, self.cols = rows, cols
+
+        # stores the cell data sparsely
+        self.cells: dict[tuple[int, int], CellData] = {}
+
+        # cache of formatted strings
+        self.formatted: dict[tuple[int, int], str] = {}
+
+        # changes pending when batching
+        self.batching = 0
+        self.changed: set[tuple[int, int]] = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.cols
+
+    def data(self, index, role=Qt.DisplayRole):
+        key = (index.row(), index.column())
+        if key not in self.cells:
+            return None
+        if role == Qt.DisplayRole:
+            if key not in self.formatted:
+                self.formatted[key] = self.cells[key].formatted()
+            return self.formatted[key]
+        elif role == Qt.EditRole:
+            return self.cells[key].formula
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole:
+            return False
+        self.cellEdited.emit(index.row(), index.column(), str(value))
+        return True
+
+    def flags(self, index):
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            return f"{section + 1}"
+        return None
+
+    def resize(self, rows, cols):
+        """Grows model to at least rows and cols."""
+        if rows > self.rows:
+            self.beginInsertRows(QModelIndex(), self.rows, rows - 1)
+            self.rows = rows
+            self.endInsertRows()
+        if cols > self.cols:
+            self.beginInsertColumns(QModelIndex(), self.cols, cols - 1)
+            self.cols = cols
+            self.endInsertColumns()
+
+    def reset(self):
+        self.beginResetModel()
+        self.cells = {}
+        self.formatted.clear()
+        self.changed.clear()
+        self.endResetModel()
+
+    def cell_changed(self, row, col):
+        self.formatted.pop((row, col), None)
+        self.changed.add((row, col))
+        if not self.batching:
+            self.flush_changes()
+
+    @contextmanager
+    def batch(self):
+        """Defer dataChanged signals until outer batch completes."""
+        self.batching += 1
+        try:
+            yield
+        finally:
+            self.batching -= 1
+            if not self.batching:
+                self.flush_changes()
+
+    def flush_changes(self):
+        if self.changed:
+            rows, cols = zip(*self.changed)
+            self.changed.clear()
+            self.dataChanged.emit(
+                self.index(min(rows), min(cols)),
+                self.index(max(rows), max(cols)),
+                [Qt.DisplayRole, Qt.EditRole],
+            )
+
+
+class CalcWorker(QObject):
+    """Calculates cells on a background thread.
+
+    Engine operations queued by the grid, eg invalidations, are always
+    applied in order. A run's cell calculations are abandoned between
+    cells once a newer run has been requested.
+    """
+
+    cellsCalculated = pyqtSignal(int, object)
+    cellFailed = pyqtSignal(int, int, int, str, str)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int)
 
     def __init__(self, *args, **kwds):
         super().__init__(*args, **kwds)
-        self.refresh_header_labels()
+        # id of latest requested run, older runs are superseded
+        self.latest_run = 0
 
-        # stores the cell data sparsely
-        self.data: dict[tuple[int, int], CellData] = {}
+    @pyqtSlot(int, object, object)
+    def run(self, run_id, ops, cells):
+        for op in ops:
+            try:
+                op()
+            except Exception:  # noqa
+                traceback.print_exc()
+
+        total = len(cells)
+        for i, ((row, col), func) in enumerate(cells):
+            if run_id != self.latest_run:
+                break
+            try:
+                # each cell's results are streamed back to grid
+                # via its batched node event subscription.
+                func()
+            except CycleError as e:
+                self.cellFailed.emit(run_id, row, col, "#CYCLE", str(e))
+            except Exception as e:
+                self.cellFailed.emit(run_id, row, col, f"#ERR: {e}", str(e))
+            self.progress.emit(i + 1, total)
+        self.finished.emit(run_id)
+
+
+class GridEditor(QTableView):
+    calculationRequested = pyqtSignal(int, object, object)
+
+    def __init__(self, rows, cols, *args, **kwds):
+        super().__init__(*args, **kwds)
+
+        # engine operations applied by worker before next calculation
+        self.pending_ops = []
+        # node ids of cells changed since last calculation
+        self.changed_ids = set()
+        self.run_id = self.finished_run = self.cleared_run = 0
+        self.calc_thread = QThread()
+        self.worker = CalcWorker()
+        self.worker.moveToThread(self.calc_thread)
+        self.calculationRequested.connect(self.worker.run)
+        self.worker.cellsCalculated.connect(self.refresh_cells)
+        self.worker.cellFailed.connect(self.cell_failed)
+        self.worker.progress.connect(self.calculation_progress)
+        self.worker.finished.connect(self.calculation_finished)
+        self.calc_thread.start()
+
+        self.setModel(SheetModel(rows, cols, self))
+        self.setEditTriggers(
+            QAbstractItemView.DoubleClicked
+            | QAbstractItemView.EditKeyPressed
+            | QAbstractItemView.AnyKeyPressed
+        )
+
+        # maps cell node ids to row, col
+        self.node_cells: dict[str, tuple[int, int]] = {}
 
         # events
-        self.itemChanged.connect(self.item_changed)
-        self.itemSelectionChanged.connect(self.item_selection_changed)
+        self.model().cellEdited.connect(self.cell_edited)
+        self.selectionModel().selectionChanged.connect(self.item_selection_changed)
         self.setItemDelegate(DisplayDelegate(self))
 
+    @property
+    def data(self):
+        """Stores the cell data sparsely"""
+        return self.model().cells
+
+    def visible_range(self, header):
+        """First and last visible sections of header."""
+        if header.orientation() == Qt.Horizontal:
+            extent = header.viewport().width()
+        else:
+            extent = header.viewport().height()
+        first = header.logicalIndexAt(0)
+        last = header.logicalIndexAt(extent)
+        if last < 0:
+            last = header.count() - 1
+        return max(first, 0), last
+
     def sizeHintForRow(self, row):
         heights = [22]
-        for key, cell_data in self.data.items():
-            if key[0] == row:
-                if isinstance(cell_data.value, PIL.Image.Image):
-                    heights.append(cell_data.value.height)
-                else:
-                    heights.append(self.fontMetrics().height())
+        first, last = self.visible_range(self.horizontalHeader())
+        for col in range(first, last + 1):
+            cell_data = self.data.get((row, col))
+            if cell_data is None:
+                continue
+            image_size = cell_data.image_size()
+            if image_size:
+                heights.append(image_size[1])
+            else:
+                heights.append(self.fontMetrics().height())
         return max(heights)
 
     def sizeHintForColumn(self, col):
         widths = [50]
-        for key, cell_data in self.data.items():
-            if key[1] == col:
-                if isinstance(cell_data.value, PIL.Image.Image):
-                    widths.append(cell_data.value.width)
-                else:
-                    longest_line = max(cell_data.formatted().splitlines(), key=len)
-                    widths.append(self.fontMetrics().width(longest_line))
+        first, last = self.visible_range(self.verticalHeader())
+        for row in range(first, last + 1):
+            cell_data = self.data.get((row, col))
+            if cell_data is None:
+                continue
+            image_size = cell_data.image_size()
+            if image_size:
+                widths.append(image_size[0])
+            else:
+                text = self.model().data(self.model().index(row, col))
+                longest_line = max(text.splitlines() or [""], key=len)
+                widths.append(self.fontMetrics().width(longest_line))
         return max(widths)
 
+    def formula_at(self, row, col):
+        if (row, col) in self.data:
+            return self.data[(row, col)].formula
+        return None
+
     def move_to_relative_cell(self, dr, dc):
         next_index = self.model().index(
             self.currentIndex().row() + dr, self.currentIndex().column() + dc
@@ -364,10 +698,10 @@ class GridEditor(QTableWidget):
 
         if is_cont and par_max > par_min:
             for y in range(per_min, per_max + 1):
-                item_1 = self.item(*C_(par_min, y))
-                item_2 = self.item(*C_(par_min + 1, y))
-                lit_1 = get_literal(item_1.text()) if item_1 else None
-                lit_2 = get_literal(item_2.text()) if item_2 else None
+                form_1 = self.formula_at(*C_(par_min, y))
+                form_2 = self.formula_at(*C_(par_min + 1, y))
+                lit_1 = get_literal(form_1) if form_1 else None
+                lit_2 = get_literal(form_2) if form_2 else None
                 if (
                     par_max > par_min + 1
                     and lit_1
@@ -382,18 +716,11 @@ class GridEditor(QTableWidget):
                     prev = lit_2
                     for x in range(par_min + 2, par_max + 1):
                         new = prev + diff
-                        self.set_cell_data(
-                            *C_(x, y), formula=str(new), value=None, fmt=None
-                        )
-                        self.setItem(*C_(x, y), QTableWidgetItem(str(new)))
+                        self.set_cell_data(*C_(x, y), formula=str(new), fmt=None)
                         prev = new
-                elif item_1:
-                    form_1 = item_1.text()
+                elif form_1:
                     for x in range(par_min + 1, par_max + 1):
-                        self.set_cell_data(
-                            *C_(x, y), formula=form_1, value=None, fmt=None
-                        )
-                        self.setItem(*C_(x, y), QTableWidgetItem(form_1))
+                        self.set_cell_data(*C_(x, y), formula=form_1, fmt=None)
             self.calculate()
 
     # emulate some Excel style key bindings
@@ -422,43 +749,46 @@ class GridEditor(QTableWidget):
             return True
         return super().eventFilter(obj, event)
 
-    def item_changed(self, item):
-        self.set_cell_data(item.row(), item.column(), formula=str(item.text()))
+    def cell_edited(self, row, col, text):
+        self.set_cell_data(row, col, formula=text)
         self.calculate()
 
-    def refresh_header_labels(self):
-        self.setHorizontalHeaderLabels(
-            [f"{i}" for i in range(1, self.columnCount() + 1)]
-        )
-
     def invalidate_cell(self):
         for index in self.selectedIndexes():
             row, col = index.row(), index.column()
             if (row, col) in self.data:
                 cell_data = self.data[(row, col)]
-                cell_data.func.invalidate()
+                cell_data.discard_restored()
+                self.changed_ids.add(cell_data.node_id)
+                self.pending_ops.append(cell_data.func.invalidate)
         self.calculate()
 
     def clear_cell_at(self, row, col):
         if (row, col) in self.data:
-            self.setItem(row, col, QTableWidgetItem(""))
             cell_data = self.data.pop((row, col))
-            cell_data.func.invalidate()
+            self.raise_data_changed(row, col)
+            cell_data.discard_restored()
+            self.changed_ids.add(cell_data.node_id)
+            # dependants no longer reference cell once function is deleted
+            self.discard_stale_restored()
+            self.pending_ops.append(cell_data.func.invalidate)
             del NAME_SPACE[cell_data.func.__name__]
 
     def clear_cell(self):
-        for index in self.selectedIndexes():
-            self.clear_cell_at(index.row(), index.column())
+        with self.model().batch():
+            for index in self.selectedIndexes():
+                self.clear_cell_at(index.row(), index.column())
         self.calculate()
 
     def format_cell(self):
-        for index in self.selectedIndexes():
-            row, col = index.row(), index.column()
-            if (row, col) in self.data:
-                self.data[(row, col)].format = (
-                    self.parent().toolbar_controls["textfield_format"].text()
-                )
-                self.raise_data_changed(row, col)
+        with self.model().batch():
+            for index in self.selectedIndexes():
+                row, col = index.row(), index.column()
+                if (row, col) in self.data:
+                    self.data[(row, col)].format = (
+                        self.parent().toolbar_controls["textfield_format"].text()
+                    )
+                    self.raise_data_changed(row, col)
 
     def copy_cell(self, attr, clear=False):
         is_cont, r_min, c_min, r_max, c_max = self.get_block_info()
@@ -491,16 +821,13 @@ class GridEditor(QTableWidget):
                     self.set_cell_data(
                         r_min + r_delta, c_min + c_delta, formula=formula
                     )
-                    self.setItem(
-                        r_min + r_delta, c_min + c_delta, QTableWidgetItem(formula)
-                    )
             self.calculate()
         else:
             self.parent().status_bar.showMessage(
                 "Can only paste if single top left cell selected!", 2000
             )
 
-    def item_selection_changed(self):
+    def item_selection_changed(self, selected=None, deselected=None):
         formats = {
             self.data[(ix.row(), ix.column())].format
             for ix in self.selectedIndexes()
@@ -514,21 +841,99 @@ class GridEditor(QTableWidget):
         else:
             line_edit.setText("")
 
+    @property
+    def calculating(self):
+        return self.finished_run != self.run_id
+
+    def submit(self, cells):
+        """Sends pending engine operations and cells to calculate
+        to the worker superseding any calculation in progress.
+        """
+        self.run_id += 1
+        self.worker.latest_run = self.run_id
+        ops, self.pending_ops = self.pending_ops, []
+        self.calculationRequested.emit(self.run_id, ops, cells)
+
+    def discard_stale_restored(self):
+        """Discards restored values of cells requiring changed cells,
+        directly or through other cells, so they are recalculated.
+        Restored values are not in the engine's cache so invalidating
+        their precedents does not reach them.
+        """
+        changed_ids, self.changed_ids = self.changed_ids, set()
+        if not (changed_ids and NAME_SPACE["RESTORED"]):
+            return
+
+        dependants = defaultdict(set)
+        for key, cell_data in self.data.items():
+            try:
+                requires = cell_data.func.helper.get_required_node_ids(None)
+            except Exception:  # noqa
+                continue
+            for node_id in requires:
+                dependants[node_id].add(key)
+
+        stack = list(changed_ids)
+        while stack:
+            for key in dependants.pop(stack.pop(), ()):
+                cell_data = self.data[key]
+                cell_data.discard_restored()
+                stack.append(cell_data.node_id)
+
     def calculate(self):
         self.parent().status_bar.showMessage("Calculating..", 1000)
+        self.discard_stale_restored()
         # TODO: do a topological sort here?
+        cells = []
         for (row, col), cell_data in self.data.items():
+            # restored cells with unchanged precedents are resolved
+            # lazily on reference
+            if cell_data.restored:
+                continue
             try:
-                cell_data.func()
+                cells.append(((row, col), cell_data.func))
             except Exception as e:
-                self.parent().status_bar.showMessage(f"Error: {e}", 2000)
-                # raise DC event to reflect error
-                self.data[(row, col)].value = f"#ERR: {e}"
-                self.raise_data_changed(row, col)
+                self.cell_failed(self.run_id, row, col, f"#ERR: {e}", str(e))
+        self.submit(cells)
+
+    def cell_failed(self, run_id, row, col, text, msg):
+        if run_id < self.cleared_run or (row, col) not in self.data:
+            return
+        self.parent().status_bar.showMessage(f"Error: {msg}", 2000)
+        # raise DC event to reflect error
+        self.data[(row, col)].value = text
+        self.raise_data_changed(row, col)
+
+    def calculation_progress(self, done, total):
+        progress_bar = self.parent().progress_bar
+        progress_bar.setMaximum(total)
+        progress_bar.setValue(done)
+        progress_bar.setVisible(done < total)
+
+    def calculation_finished(self, run_id):
+        self.finished_run = run_id
+        if not self.calculating:
+            self.parent().progress_bar.hide()
+
+    def stop_calculation(self):
+        self.worker.latest_run = -1
+        self.calc_thread.quit()
+        self.calc_thread.wait()
 
     def raise_data_changed(self, row, col):
-        index = self.model().index(row, col)
-        self.dataChanged(index, index, [Qt.EditRole])
+        self.model().cell_changed(row, col)
+
+    def refresh_cells(self, run_id, changes):
+        """Receives batch of node id to value from calc engine."""
+        # ignore results calculated before sheet was cleared
+        if run_id < self.cleared_run:
+            return
+        with self.model().batch():
+            for node_id, value in changes.items():
+                key = self.node_cells.get(node_id)
+                if key in self.data:
+                    self.data[key].value = value
+                    self.raise_data_changed(*key)
 
     def set_cell_data(self, row, col, **kwds):
         """Also takes optional parameters formula, value, fmt"""
@@ -536,6 +941,7 @@ class GridEditor(QTableWidget):
             cell_data = self.data[(row, col)]
         else:
             self.data[(row, col)] = cell_data = CellData(row + 1, col + 1)
+        self.raise_data_changed(row, col)
         try:
             # to avoid clobbering cell data attributes
             # if nothing needs to be changed we check
@@ -545,35 +951,24 @@ class GridEditor(QTableWidget):
                 cell_data.formula = kwds["formula"]
 
             if "value" in kwds:
-                # to detect if we have deserialized an invalid cell
-                # with in a deep structure (eg list of lists etc), we
-                # call deepcopy. Invalid cell's __deepcopy__ will raise
-                # an exception if called.
-                try:
-                    value = kwds["value"]
-                    _ = copy.deepcopy(value)
-                    cell_data.value = value
-                    cell_data.func.set_value(value)
-                except InvalidCellDuringCopyException:
-                    cell_data.func.invalidate()
+                value = kwds["value"]
+                cell_data.value = value
+                self.pending_ops.append(partial(cell_data.func.set_value, value))
             else:
                 # if we don't have a value, reset the node
-                cell_data.func.invalidate()
+                self.pending_ops.append(cell_data.func.invalidate)
+            self.changed_ids.add(cell_data.node_id)
 
             if "fmt" in kwds:
                 cell_data.format = kwds["fmt"]
 
-            def refresh_cell_callback(row, col, res, *args_, **kwds_):
-                self.data[(row, col)].value = res
-                self.raise_data_changed(row, col)
-
-            cell_data.func.node_calculated.append(
-                partial(refresh_cell_callback, row, col)
-            )
-
-            cell_data.func.node_value_set.append(
-                partial(refresh_cell_callback, row, col)
-            )
+            # NOTE: subscriptions are keyed so setting a cell
+            # repeatedly does not accumulate callbacks. Results
+            # are signalled as they may arrive from the worker.
+            self.node_cells[cell_data.node_id] = (row, col)
+            refresh = partial(self.worker.cellsCalculated.emit, self.cleared_run)
+            cell_data.func.node_calculated.subscribe("grid", refresh, batched=True)
+            cell_data.func.node_value_set.subscribe("grid", refresh, batched=True)
 
         except Exception as e:
             self.parent().status_bar.showMessage(f"Error: {e}", 2000)
@@ -585,42 +980,61 @@ class GridEditor(QTableWidget):
         self.resizeColumnsToContents()
         self.resizeRowsToContents()
 
-    def import_data(self, data):
+    def import_data(self, data, check_invalid=True):
+        """Imports decoded sheet data. Large values remain lazy until
+        displayed or referenced. Set check_invalid False when decoder
+        found no invalid cells to skip searching values for them.
+        """
         self.clear()
 
         # data in format:
         # "r1", "c1", "formula", "value", "format"
-        # NOTE: we block signals to prevent itemChanged being triggered
-        # and calculate() being called too early.
-        self.blockSignals(True)
+        # NOTE: model is reset after loading so no need for signals.
+        self.model().blockSignals(True)
         for r1, c1, formula, value, fmt in data:
-            self.set_cell_data(r1 - 1, c1 - 1, formula=formula, value=value, fmt=fmt)
-            self.setItem(r1 - 1, c1 - 1, QTableWidgetItem(formula))
-        self.blockSignals(False)
+            if check_invalid and contains_invalid_cell(value):
+                # no value resets node for recalculation
+                self.set_cell_data(r1 - 1, c1 - 1, formula=formula, fmt=fmt)
+            elif isinstance(value, LazyValue):
+                self.set_cell_data(r1 - 1, c1 - 1, formula=formula, fmt=fmt)
+                self.data[(r1 - 1, c1 - 1)].restore(value)
+            else:
+                self.set_cell_data(
+                    r1 - 1, c1 - 1, formula=formula, value=resolve_lazy(value), fmt=fmt
+                )
+        self.model().changed.clear()
+        self.model().blockSignals(False)
+        # loaded values are consistent with each other
+        self.changed_ids.clear()
 
         # resize rows, cols if necessary
-        max_row, max_col = [max(d) for d in zip(*self.data.keys())]
-        if self.columnCount() <= max_col:
-            self.setColumnCount(max_col + 1)
-            self.refresh_header_labels()
-        if self.rowCount() <= max_row:
-            self.setRowCount(max_row + 1)
+        if self.data:
+            max_row, max_col = [max(d) for d in zip(*self.data.keys())]
+            self.model().resize(max_row + 1, max_col + 1)
+        self.model().beginResetModel()
+        self.model().endResetModel()
 
         self.calculate()
 
     def export_data(self):
         data = []
         for (row, col), cell_data in self.data.items():
-            data.append(
-                [row + 1, col + 1, cell_data.formula, cell_data.value, cell_data.format]
-            )
+            # NOTE: use raw value so lazy values are saved undecoded
+            value = cell_data._value
+            if isinstance(value, LazyFigure):
+                value = value.to_image()
+            data.append([row + 1, col + 1, cell_data.formula, value, cell_data.format])
         return data
 
     def clear(self):
-        self.data = {}
-        self.clearContents()
+        self.model().reset()
+        self.node_cells.clear()
+        self.changed_ids.clear()
+        NAME_SPACE["RESTORED"].clear()
         self.resize_all()
-        CALC_ENGINE.clear_cache()
+        self.pending_ops = [CALC_ENGINE.clear_cache]
+        self.submit([])
+        self.cleared_run = self.run_id
 
     @property
     def state(self):
@@ -848,6 +1262,10 @@ class Window(QMainWindow):
 
         self.status_bar = QStatusBar(self)
         self.setStatusBar(self.status_bar)
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setMaximumWidth(150)
+        self.progress_bar.hide()
+        self.status_bar.addPermanentWidget(self.progress_bar)
 
         self.read_settings()
 
@@ -939,12 +1357,15 @@ class Window(QMainWindow):
     def open_file(self, file):
         self.clear_all()
         file = Path(file)
-        file_data = json.loads(file.read_text(), cls=JSONDecoder)
+        decoder = JSONDecoder()
+        file_data = decoder.decode(file.read_text())
         # load & exec code, useful to load json importers
         self.text_editor.import_code(file_data["code"])
         self.text_editor.execute_code()
         # load grid data - do not calc
-        self.main_grid.import_data(file_data["data"])
+        self.main_grid.import_data(
+            file_data["data"], check_invalid=decoder.invalid_cell_found
+        )
         self.set_title(file.name)
         # load grid state
         if "grid_state" in file_data:
@@ -954,6 +1375,7 @@ class Window(QMainWindow):
         settings = QSettings("BlairAzzopardi", "SimpleSpreadSheet")
         settings.setValue("geometry", self.saveGeometry())
         settings.setValue("windowState", self.saveState())
+        self.main_grid.stop_calculation()
         super().closeEvent(event)
 
     def read_settings(self):
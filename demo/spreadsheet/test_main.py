@@ -1,6 +1,7 @@
 import unittest
 import re
 import datetime
+import json
 from itertools import count
 from functools import partial
 from random import gauss
@@ -11,6 +12,13 @@ from PyQt5.QtCore import Qt, QPoint
 
 from main import CellData
 from main import Window
+from json_helper import (
+    JSONDecoder,
+    JSONEncoder,
+    LazyValue,
+    InvalidCell,
+    contains_invalid_cell,
+)
 
 
 def _to_array(mo):
@@ -40,6 +48,26 @@ class MainTestCase(unittest.TestCase):
             groups = re.findall(CellData.FORMULA_REGEX, formula, flags=re.IGNORECASE)
             self.assertEqual(groups, results)
 
+    def test_lazy_decode(self):
+        payload = {"_type": "numpy.ndarray", "value": [1, 2, 3]}
+        text = json.dumps([[1, 1, "", payload, None], [1, 2, "", 5, None]])
+        decoder = JSONDecoder()
+        data = decoder.decode(text)
+        self.assertIsInstance(data[0][3], LazyValue)
+        self.assertFalse(data[0][3].resolved)
+        self.assertFalse(decoder.invalid_cell_found)
+
+        # unresolved payloads are written back untouched
+        self.assertEqual(json.loads(json.dumps(data, cls=JSONEncoder)), json.loads(text))
+        self.assertListEqual(data[0][3].resolve().tolist(), [1, 2, 3])
+
+        invalid = json.dumps([[{"_type": "json_helper.InvalidCell", "value": ""}]])
+        decoder = JSONDecoder()
+        data = decoder.decode(invalid)
+        self.assertTrue(decoder.invalid_cell_found)
+        self.assertIsInstance(data[0][0], InvalidCell)
+        self.assertTrue(contains_invalid_cell(data))
+
 
 class SpreadsheetAppTestCase(unittest.TestCase):
     def setUp(self):
@@ -76,6 +104,12 @@ class SpreadsheetAppTestCase(unittest.TestCase):
             grid.rowViewportPosition(row) + grid.rowHeight(row) // 2,
         )
 
+    def wait_for_calculation(self):
+        """Calculation runs on a worker so wait for results."""
+        self.assertTrue(QTest.qWaitFor(lambda: not self.grid.calculating, 5000))
+        # deliver any queued results
+        QApplication.processEvents()
+
     def test_filldown(self):
         gridvp = self.grid.viewport()
 
@@ -86,6 +120,7 @@ class SpreadsheetAppTestCase(unittest.TestCase):
         QTest.mouseClick(gridvp, Qt.LeftButton, Qt.NoModifier, self.cell_pos(0, 0))
         QTest.mouseClick(gridvp, Qt.LeftButton, Qt.ShiftModifier, self.cell_pos(5, 0))
         QTest.keyClick(gridvp, "d", Qt.ControlModifier)
+        self.wait_for_calculation()
         output = [self.grid.data[(r, 0)].value for r in range(0, 6)]
         expected = [
             datetime.date(2020, 1, 1),
@@ -104,10 +139,47 @@ class SpreadsheetAppTestCase(unittest.TestCase):
         QTest.mouseClick(gridvp, Qt.LeftButton, Qt.NoModifier, self.cell_pos(1, 1))
         QTest.mouseClick(gridvp, Qt.LeftButton, Qt.ShiftModifier, self.cell_pos(5, 1))
         QTest.keyClick(gridvp, "d", Qt.ControlModifier)
+        self.wait_for_calculation()
         output = [self.grid.data[(r, 1)].value for r in range(0, 6)]
         expected = [5, 13, 29, 61, 125, 253]
         self.assertListEqual(output, expected)
 
+    def test_model_batches_data_changed(self):
+        model = self.grid.model()
+        emitted = []
+        model.dataChanged.connect(
+            lambda tl, br, roles: emitted.append(
+                [(tl.row(), tl.column()), (br.row(), br.column())]
+            )
+        )
+        with model.batch():
+            for r in range(3):
+                model.cell_changed(r, 1)
+            self.assertListEqual(emitted, [])
+        self.assertListEqual(emitted, [[(0, 1), (2, 1)]])
+
+    def test_restored_precedent_changed(self):
+        def lazy(value):
+            return LazyValue({"_type": "numpy.ndarray", "value": [value]})
+
+        # saved values of r1c2 and r1c3 are decoded only when needed
+        self.grid.import_data(
+            [
+                [1, 1, "5", 5, None],
+                [1, 2, "r1c1 * 2", lazy(10), None],
+                [1, 3, "r1c2 + 1", lazy(11), None],
+            ]
+        )
+        self.wait_for_calculation()
+        self.assertTrue(self.grid.data[(0, 2)].restored)
+
+        # restored dependants are recalculated when precedent changes
+        self.grid.cell_edited(0, 0, "7")
+        self.wait_for_calculation()
+        self.assertFalse(self.grid.data[(0, 2)].restored)
+        self.assertEqual(self.grid.data[(0, 1)].value, 14)
+        self.assertEqual(self.grid.data[(0, 2)].value, 15)
+
     def cell_typer(self, delay, row, col, text):
         """Enters text into cell with delay."""
         QTest.mouseClick(
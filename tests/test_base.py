@@ -1,7 +1,9 @@
 import unittest
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from calcengine import CalcEngine
+from calcengine import CalcEngine, CycleError
 
 # since module path can vary based on whether
 # tests are run as module or as single file
@@ -119,8 +121,8 @@ class CalcEngineBaseTestCase(unittest.TestCase):
         foo2 = Foo()
 
         ids_to_names = {
-            hex(id(foo1)): "INS_foo1",
-            hex(id(foo2)): "INS_foo2",
+            ce.instances.token(foo1): "INS_foo1",
+            ce.instances.token(foo2): "INS_foo2",
         }
 
         def map_id_to_name(msg):
@@ -168,6 +170,22 @@ class CalcEngineBaseTestCase(unittest.TestCase):
         self.assertListEqual(output, expected)
         self.assertEqual(res1, res4)
 
+    def test_instance_eviction(self):
+        foo = Foo()
+        self.assertEqual(foo.c(), 25)
+        token = ce.instances.token(foo)
+        self.assertEqual(len(ce.instances.nodes[token]), 3)
+        self.assertEqual(len(ce.cache), 3)
+
+        # nodes of collected instances are evicted on next calculation
+        del foo
+        self.assertEqual(b(), 100)
+        self.assertSetEqual(set(ce.instances.nodes), set())
+        self.assertEqual(len(ce.cache), 2)
+
+        # new instances never share nodes with collected instances
+        self.assertNotEqual(ce.instances.token(Foo()), token)
+
     def test_set_value_and_invalidate(self):
         # simple smoke test for now
         res1 = f()  # d(0) + c(2, 3) -5 + d(5, y=-3)
@@ -176,6 +194,293 @@ class CalcEngineBaseTestCase(unittest.TestCase):
         res2 = f()  # d(0) + 5 -5 + d(5, y=-3)
         self.assertEqual(res2, 608)
 
+    def test_batched_subscriptions(self):
+        batches = []
+        try:
+            for fn in [a, b, d]:
+                # subscribing twice with same key has no further effect
+                fn.node_calculated.subscribe("test", batches.append, batched=True)
+                fn.node_calculated.subscribe("test", batches.append, batched=True)
+
+            # delivered once when outermost call completes
+            f()
+            self.assertEqual(len(batches), 1)
+            d0_id, _ = d.helper.make_node_id_pair((0,), {})
+            self.assertEqual(len(batches[0]), 4)
+            self.assertEqual(batches[0][d0_id], 300)
+
+            # values set within an explicit batch are coalesced
+            d.node_value_set.subscribe("test", batches.append, batched=True)
+            with ce.batch():
+                d.set_value(1, 0)
+                d.set_value(2, 0)
+                self.assertEqual(len(batches), 1)
+            self.assertDictEqual(batches[1], {d0_id: 2})
+        finally:
+            for fn in [a, b, d]:
+                fn.node_calculated.unsubscribe("test")
+                fn.node_value_set.unsubscribe("test")
+
+    def test_threads(self):
+        calls = []
+        batches = []
+
+        @ce.watch(path=PATH)
+        def slow(x):
+            calls.append(x)
+            return d(x) * 2
+
+        def worker():
+            with ce.batch():
+                results.append(slow(1))
+            # batches are per thread
+            batches.append(ce.event_batch.depth)
+
+        results = []
+        slow.node_calculated.subscribe("test", lambda items: None, batched=True)
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertListEqual(results, [602] * 8)
+        self.assertListEqual(calls, [1])
+        self.assertListEqual(batches, [0] * 8)
+
+    def test_concurrent_nodes(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        @ce.watch(path=PATH)
+        def leaf(x):
+            # passed only if both leaves are calculated at once
+            barrier.wait()
+            return x
+
+        @ce.watch(path=PATH)
+        def branch(x):
+            return leaf(x) + a()
+
+        with ThreadPoolExecutor(2) as executor:
+            self.assertListEqual(list(executor.map(branch, [1, 2])), [101, 102])
+
+        # result of a calculation whose required node changed meanwhile
+        # is returned but not cached
+        started, release = threading.Event(), threading.Event()
+
+        @ce.watch(path=PATH)
+        def slow():
+            value = a()
+            started.set()
+            release.wait(5)
+            return value
+
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(slow)
+            started.wait(5)
+            a.set_value_and_invalidate(1)
+            release.set()
+            self.assertEqual(future.result(), 100)
+        self.assertEqual(slow(), 1)
+
+    def test_cycle_across_threads(self):
+        barrier = threading.Barrier(2, timeout=5)
+        entered = set()
+
+        def enter(name):
+            if name not in entered:
+                entered.add(name)
+                barrier.wait()
+
+        @ce.watch(alias="x", path=PATH)
+        def x():
+            enter("x")
+            return y() + 1
+
+        @ce.watch(alias="y", path=PATH)
+        def y():
+            enter("y")
+            return x() + 1
+
+        # each thread waiting for the other is detected
+        with ThreadPoolExecutor(2) as executor:
+            futures = [executor.submit(x), executor.submit(y)]
+            for future in futures:
+                self.assertIsInstance(future.exception(5), CycleError)
+        self.assertEqual(len(ce.cache), 0)
+
+    def test_node_invalidated(self):
+        invalidated = []
+        ce.node_invalidated.subscribe("test", invalidated.append)
+        try:
+            f()
+            cached = set(ce.cache)
+            # removed nodes notified once per invalidation
+            a.invalidate()
+            self.assertEqual(len(ce.cache), 0)
+            self.assertListEqual(invalidated, [cached])
+
+            # and once per batch, nodes not cached are not notified
+            f()
+            with ce.batch():
+                e.invalidate()
+                d.set_value_and_invalidate(1, 0)
+                d.invalidate(7)
+            self.assertEqual(len(invalidated), 2)
+            self.assertEqual(len(invalidated[1]), 2)
+
+            # clearing the cache notifies all nodes
+            cached = set(ce.cache)
+            ce.clear_cache()
+            self.assertSetEqual(invalidated[-1], cached)
+        finally:
+            ce.node_invalidated.unsubscribe("test")
+
+    def test_map(self):
+        calls = []
+
+        @ce.watch(path=PATH)
+        def square(x):
+            calls.append(x)
+            return x * x + a()
+
+        self.assertEqual(square(2), 104)
+        batches = []
+        square.node_calculated.subscribe("test", batches.append, batched=True)
+
+        # only distinct misses are calculated, and notified in one batch
+        self.assertListEqual(square.map([1, 2, 3, 1]), [101, 104, 109, 101])
+        self.assertListEqual(calls, [2, 1, 3])
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 2)
+
+        # misses require the same nodes as a single call
+        a.invalidate()
+        self.assertListEqual(square.map([(2,), (4,)]), [104, 116])
+        self.assertListEqual(calls, [2, 1, 3, 2, 4])
+
+        # vectorized implementation and executor
+        self.assertListEqual(
+            square.map([5, 6], vectorized=lambda xs: [x * x for (x,) in xs]),
+            [25, 36],
+        )
+        self.assertEqual(square(5), 25)
+        with ThreadPoolExecutor(4) as executor:
+            self.assertListEqual(
+                square.map(range(7, 10), executor=executor), [149, 164, 181]
+            )
+        self.assertListEqual(sorted(calls[5:]), [7, 8, 9])
+
+        # from a watched function, or holding the lock, with nested nodes
+        @ce.watch(path=PATH)
+        def portfolio(xs):
+            with ThreadPoolExecutor(2) as executor:
+                return sum(square.map(xs, executor=executor))
+
+        self.assertEqual(portfolio((10, 11, 12)), 665)
+        with ce.lock, ThreadPoolExecutor(2) as executor:
+            self.assertListEqual(
+                square.map([13, 14], executor=executor), [269, 296]
+            )
+
+        # methods
+        foo = Foo()
+        self.assertListEqual(Foo.b.map([(foo, 1), (foo, 2)]), [11, 12])
+        Foo.a.set_value_and_invalidate(20, foo)
+        self.assertEqual(foo.b(1), 21)
+
+    def test_map_calculations(self):
+        calls = []
+        started, release = threading.Event(), threading.Event()
+        release.set()
+
+        @ce.watch(path=PATH)
+        def fib(n):
+            calls.append(n)
+            if n == 3:
+                started.set()
+                release.wait(5)
+            return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+        # misses calling each other are not cycles
+        self.assertListEqual(fib.map([4, 1, 2]), [3, 1, 1])
+        self.assertListEqual(sorted(calls), [0, 1, 2, 3, 4])
+
+        # concurrent callers wait for a miss rather than recalculate it
+        fib.invalidate(3)
+        started.clear()
+        release.clear()
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(fib, 3)
+            started.wait(5)
+            threading.Timer(0.1, release.set).start()
+            self.assertListEqual(fib.map([3, 5]), [2, 5])
+            self.assertEqual(future.result(), 2)
+        self.assertEqual(calls.count(3), 2)
+
+        @ce.watch(path=PATH)
+        def g(x):
+            return g.map([x])[0]
+
+        with self.assertRaises(CycleError):
+            g(1)
+        self.assertEqual(len(ce._pending), 0)
+
+    def test_normalize(self):
+        calls = []
+
+        @ce.watch(path=PATH, normalize=True)
+        def h(x, y=0):
+            calls.append((x, y))
+            return 3 * b() + x - y
+
+        @ce.watch(path=PATH)
+        def k():
+            return h(5, y=-3) + h(x=5, y=-3) + h(5, -3) + h(1) + h(1, 0)
+
+        self.assertEqual(k(), 3 * 308 + 2 * 301)
+        self.assertListEqual(calls, [(5, -3), (1, 0)])
+
+        # any spelling invalidates the node and nodes requiring it
+        h.invalidate(x=5, y=-3)
+        self.assertEqual(len(ce.cache), 3)
+        h.set_value_and_invalidate(0, 1, y=0)
+        self.assertEqual(k(), 3 * 308)
+        self.assertListEqual(calls, [(5, -3), (1, 0), (5, -3)])
+
+    def test_cycle(self):
+        @ce.watch(alias="R1C1", path=PATH)
+        def R1C1():
+            return R2C1() + 1
+
+        @ce.watch(alias="R2C1", path=PATH)
+        def R2C1():
+            return R1C1() * 2
+
+        @ce.watch(alias="R3C1", path=PATH)
+        def R3C1(x):
+            return R1C1() if x else R3C1(x=1)
+
+        for fn, args, cycle in [
+            [R1C1, (), ["R1C1()", "R2C1()", "R1C1()"]],
+            [R2C1, (), ["R2C1()", "R1C1()", "R2C1()"]],
+            [R3C1, (0,), ["R1C1()", "R2C1()", "R1C1()"]],
+        ]:
+            with self.subTest(fn.__name__):
+                with self.assertRaises(CycleError) as cm:
+                    fn(*args)
+                self.assertEqual(
+                    str(cm.exception),
+                    "Cycle detected: "
+                    + " -> ".join(PATH + "." + label for label in cycle),
+                )
+                self.assertEqual(cm.exception.path[0], cm.exception.path[-1])
+                # failed nodes are not cached
+                self.assertEqual(len(ce.cache), 0)
+
+        # cycle broken by setting a value
+        R2C1.set_value(5)
+        self.assertEqual(R3C1(0), 6)
+
     @unittest.skip("TODO")
     def test_lambda(self):
         g()
@@ -0,0 +1,92 @@
+import io
+import unittest
+
+from calcengine import CalcEngine
+from calcengine.compression import Compression
+from calcengine.node import CompressedNodeData
+
+PATH = "test."
+
+ce = CalcEngine()
+
+size = ce.var("size", 10000)
+
+
+@ce.watch(path=PATH, compress=Compression(min_size=1000))
+def a(x):
+    return [x] * size()
+
+
+@ce.watch(path=PATH, compress="bz2")
+def b():
+    return len(a(1)) + len(a(2))
+
+
+@ce.watch(path=PATH)
+def c():
+    return a(1)[:3]
+
+
+class CompressionTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        size.value = 10000
+
+    def test_compress(self):
+        self.assertEqual(b(), 20000)
+        self.assertListEqual(c(), [1, 1, 1])
+        stats = ce.compression_stats()
+        # b is too small to compress
+        self.assertEqual(stats.nodes, 2)
+        self.assertGreater(stats.ratio, 10)
+        self.assertEqual(stats.saved_bytes, stats.raw_bytes - stats.compressed_bytes)
+
+        # values are decompressed on access
+        compression = ce.cache[a.helper.make_node_id_pair((2,), {})[0]].compression
+        decompressed = compression.decompressed
+        self.assertListEqual(a(2), [2] * 10000)
+        self.assertIsNot(a(2), a(2))
+        self.assertEqual(compression.decompressed - decompressed, 3)
+
+        # small values are held as is
+        size.value = 2
+        self.assertEqual(b(), 4)
+        self.assertEqual(ce.compression_stats().nodes, 0)
+        self.assertListEqual(a.map([1, 3]), [[1, 1], [3, 3]])
+
+    def test_set_value(self):
+        a(1)
+        a.set_value([0] * 5, 1)
+        self.assertListEqual(a(1), [0] * 5)
+        a.set_value_and_invalidate("x" * 2000, 1)
+        self.assertEqual(a(1), "x" * 2000)
+        self.assertGreater(ce.compression_stats().ratio, 10)
+
+    def test_snapshot(self):
+        b()
+        stats = ce.compression_stats()
+        file = io.BytesIO()
+        ce.snapshot(file)
+        file.seek(0)
+
+        # values are restored compressed, without decompressing them
+        self.assertEqual(ce.restore(file), 3)
+        self.assertEqual(ce.compression_stats(), stats)
+        node = ce.cache[a.helper.make_node_id_pair((1,), {})[0]]
+        self.assertIs(type(node), CompressedNodeData)
+        self.assertEqual(node.compression.decompressed, 0)
+        self.assertListEqual(a(1), [1] * 10000)
+
+    def test_codecs(self):
+        for codec in ["zlib", "lzma", "bz2"]:
+            with self.subTest(codec):
+                compression = Compression(codec, min_size=0)
+                data, size_ = compression.compress([0] * 1000)
+                self.assertLess(len(data), size_)
+                self.assertListEqual(compression.decompress(data), [0] * 1000)
+        with self.assertRaises(ValueError):
+            Compression("unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
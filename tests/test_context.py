@@ -0,0 +1,136 @@
+import unittest
+from collections import Counter
+
+from calcengine import CalcEngine
+
+PATH = "test."
+
+ce = CalcEngine()
+calls = Counter()
+
+
+@ce.watch(path=PATH)
+def rate():
+    calls["rate"] += 1
+    return 2
+
+
+@ce.watch(path=PATH)
+def notional(x):
+    calls["notional"] += 1
+    return 100 * x
+
+
+@ce.watch(path=PATH)
+def interest():
+    calls["interest"] += 1
+    return notional(1) * rate()
+
+
+@ce.watch(path=PATH)
+def total():
+    calls["total"] += 1
+    return interest() + notional(2)
+
+
+spread = ce.var("spread", 0)
+
+
+@ce.watch(path=PATH)
+def quote():
+    calls["quote"] += 1
+    return interest() + spread()
+
+
+class CalcContextTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        spread.value = 0
+        calls.clear()
+
+    def test_override(self):
+        self.assertEqual(total(), 400)
+        calls.clear()
+
+        scenario = ce.context()
+        scenario.override(rate, 3)
+        with scenario:
+            self.assertEqual(total(), 500)
+
+        # only nodes requiring overridden node recalculated
+        self.assertDictEqual(dict(calls), {"interest": 1, "total": 1})
+
+        # base is unaffected and scenario values are not copied
+        self.assertEqual(total(), 400)
+        notional_id = notional.helper.make_node_id_pair((2,), {})[0]
+        self.assertNotIn(notional_id, scenario.cache)
+        self.assertIs(scenario.lookup(notional_id), ce.cache[notional_id])
+
+    def test_nested_and_set_value(self):
+        total()
+        with ce.context() as scenario:
+            notional.set_value(1000, 1)
+            self.assertEqual(total(), 2200)
+            with ce.context() as child:
+                self.assertIs(child.parent, scenario)
+                rate.set_value(1)
+                self.assertEqual(total(), 1200)
+            self.assertEqual(total(), 2200)
+            notional.invalidate(1)
+            self.assertEqual(total(), 400)
+        self.assertIsNone(ce.current_context)
+        self.assertEqual(total(), 400)
+
+    def test_base_calculated_after_override(self):
+        scenario = ce.context()
+        scenario.override(rate, 3)
+        self.assertEqual(total(), 400)
+        with scenario:
+            self.assertEqual(total(), 500)
+            with ce.context() as child:
+                child.override(notional, 0, 2)
+                self.assertEqual(total(), 300)
+        self.assertEqual(total(), 400)
+
+    def test_base_changed(self):
+        scenario = ce.context()
+        scenario.override(rate, 3)
+        with scenario:
+            self.assertEqual(total(), 500)
+            self.assertEqual(quote(), 300)
+
+        # changes of the base cache reach the context
+        spread.value = 5
+        notional.set_value_and_invalidate(300, 2)
+        with scenario:
+            self.assertEqual(quote(), 305)
+            self.assertEqual(total(), 600)
+
+        # unless overridden in the context
+        calls.clear()
+        rate.set_value_and_invalidate(4)
+        with scenario:
+            self.assertEqual(total(), 600)
+        self.assertDictEqual(dict(calls), {})
+        self.assertEqual(total(), 700)
+
+    def test_shadow_keeps_other_checks(self):
+        total()
+        scenario, other = ce.context(), ce.context()
+        child = scenario.context()
+        with other:
+            total()
+        with child:
+            total()
+        self.assertTrue(other._checked)
+
+        # only checks of the overriding context and descendants reset
+        scenario.override(rate, 3)
+        self.assertTrue(other._checked)
+        self.assertFalse(child._checked)
+        with child:
+            self.assertEqual(total(), 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
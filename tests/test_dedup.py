@@ -0,0 +1,77 @@
+import unittest
+
+from calcengine import CalcEngine
+from calcengine.dedup import ValueStore, content_key
+
+PATH = "test."
+
+ce = CalcEngine()
+
+
+@ce.watch(path=PATH)
+def reference(date):
+    # same large value for every date
+    return {"rates": list(range(1000))}
+
+
+@ce.watch(path=PATH)
+def small(date):
+    return [0]
+
+
+@ce.watch(path=PATH)
+def report():
+    return reference(1), reference(2), reference(3), small(1), small(2)
+
+
+class DedupTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        self.store = ce.enable_dedup(min_size=100)
+
+    def tearDown(self):
+        ce.disable_dedup()
+
+    def test_share(self):
+        values = report()
+        self.assertIs(values[0], values[1])
+        self.assertIs(values[0], values[2])
+        self.assertIsNot(values[3], values[4])
+
+        stats = self.store.stats()
+        self.assertEqual(stats.values, 2)  # reference and report
+        self.assertEqual(stats.nodes, 4)
+        _, size = content_key(values[0])
+        self.assertEqual(stats.saved_bytes, 2 * size)
+
+        # released on eviction
+        reference.invalidate(1)
+        self.assertEqual(self.store.stats().saved_bytes, size)
+        reference.invalidate(2)
+        reference.invalidate(3)
+        self.assertEqual(self.store.stats(), type(stats)())
+
+    def test_set_value(self):
+        reference(1)
+        reference.set_value({"rates": list(range(1000))}, 2)
+        self.assertIs(reference(1), reference(2))
+        reference.set_value({"rates": []}, 2)
+        self.assertEqual(self.store.stats().saved_bytes, 0)
+        ce.clear_cache()
+        self.assertEqual(self.store.stats().values, 0)
+
+    def test_content_key(self):
+        self.assertEqual(content_key([1, 2]), content_key([1, 2]))
+        self.assertNotEqual(content_key([1, 2]), content_key([1.0, 2]))
+        self.assertIsNone(content_key(lambda: None))
+
+        store = ValueStore(min_size=0)
+        a, b = [1], [1]
+        self.assertIs(store.share("x", a), a)
+        self.assertIs(store.share("y", b), a)
+        self.assertIs(store.share("x", [2]), store.share("z", [2]))
+        self.assertEqual(store.stats().values, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import gc
+import threading
+import unittest
+
+from calcengine import AsyncioDispatcher, CalcEngine, ThreadDispatcher
+
+PATH = "test."
+
+ce = CalcEngine()
+
+
+@ce.watch(path=PATH)
+def a():
+    return 1
+
+
+@ce.watch(path=PATH)
+def b(x):
+    return a() + x
+
+
+@ce.watch(path=PATH)
+def c():
+    return b(1) + b(2)
+
+
+class DispatchTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+
+    def tearDown(self):
+        ce.set_dispatcher(None)
+        for fn in [a, b, c]:
+            fn.node_calculated.unsubscribe("test")
+            fn.node_calculated.unsubscribe("fail")
+
+    def test_thread(self):
+        errors, threads, batches = [], [], []
+        dispatcher = ce.set_dispatcher(
+            ThreadDispatcher(on_error=lambda f, e: errors.append(e))
+        )
+
+        def fail(value):
+            raise RuntimeError(value)
+
+        a.node_calculated.subscribe("fail", fail)
+        a.node_calculated.subscribe(
+            "test", lambda value: threads.append(threading.current_thread())
+        )
+        for fn in [b, c]:
+            fn.node_calculated.subscribe("test", batches.append, batched=True)
+
+        # subscriber exceptions do not abort the calculation
+        self.assertEqual(c(), 5)
+        self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(len(errors), 1)
+        self.assertListEqual(threads, [dispatcher._thread])
+
+        # batches from several subscriptions are merged per key
+        self.assertEqual(sum(len(items) for items in batches), 3)
+        a_id, _ = a.helper.make_node_id_pair((), {})
+        self.assertSetEqual(set().union(*batches), set(ce.cache) - {a_id})
+        dispatcher.close(5)
+
+    def test_asyncio(self):
+        received = []
+
+        async def subscriber(value):
+            await asyncio.sleep(0)
+            received.append(value)
+
+        async def main():
+            ce.set_dispatcher(AsyncioDispatcher(asyncio.get_running_loop()))
+            c.node_calculated.subscribe("test", subscriber)
+            # calculate on another thread
+            await asyncio.get_running_loop().run_in_executor(None, c)
+            for _ in range(5):
+                await asyncio.sleep(0)
+
+        asyncio.run(main())
+        self.assertListEqual(received, [5])
+
+    def test_rewatch(self):
+        count = len(ce.events)
+        # eg a spreadsheet cell's formula edited many times
+        for i in range(100):
+            ce.watch(alias="cell", path=PATH)(lambda: i)
+        gc.collect()
+        self.assertEqual(len(ce.events), count)
+
+
+if __name__ == "__main__":
+    unittest.main()
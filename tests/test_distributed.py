@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import unittest
+
+from calcengine import CalcEngine, Coordinator
+
+PATH = "test."
+
+ce = CalcEngine()
+
+rate = ce.var("rate", 2)
+
+
+@ce.watch(path=PATH)
+def a(x):
+    return x * rate()
+
+
+@ce.watch(path=PATH)
+def b(x):
+    # a(x) is not planned as argument is not constant
+    return a(x) + a(2)
+
+
+@ce.watch(path=PATH)
+def pid(x):
+    return os.getpid()
+
+
+@ce.watch(path=PATH)
+def c():
+    return b(1) + a(1) + a(3)
+
+
+@ce.watch(path=PATH)
+def d():
+    return c() + (pid(1) > 0) + (pid(2) > 0)
+
+
+class DistributedTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.coordinator = Coordinator(
+            ce, processes=2, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.coordinator.close()
+
+    def setUp(self):
+        ce.clear_cache()
+        rate.value = 2
+
+    def test_run(self):
+        calculated = []
+        a.node_calculated.append(calculated.append)
+        try:
+            self.assertEqual(self.coordinator.run(d), 16)
+        finally:
+            a.node_calculated.remove(calculated.append)
+
+        # planned nodes calculated by workers and merged
+        self.assertListEqual(sorted(calculated), [2, 4, 6])
+        self.assertNotIn(os.getpid(), {pid(1), pid(2)})
+
+        # merged nodes are on the graph
+        rate.value = 3
+        self.assertEqual(d(), 23)
+        self.assertEqual(self.coordinator.run(d), 23)
+
+    def test_cached(self):
+        self.assertEqual(c(), 14)
+        calculated = []
+        c.node_calculated.append(calculated.append)
+        try:
+            self.assertEqual(self.coordinator.run(d), 16)
+        finally:
+            c.node_calculated.remove(calculated.append)
+        # only nodes not already cached are sent to workers
+        self.assertListEqual(calculated, [])
+        self.assertNotIn(os.getpid(), {pid(1), pid(2)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import queue
+import threading
+import unittest
+
+from calcengine import CalcEngine
+
+PATH = "test."
+
+ce = CalcEngine()
+
+rate = ce.var("rate", 2)
+
+
+@ce.watch(path=PATH)
+def a():
+    return 10
+
+
+@ce.watch(path=PATH)
+def b(x):
+    return a() * x * rate()
+
+
+@ce.watch(path="other.")
+def c():
+    return b(1) + 1
+
+
+def drain(feed):
+    changes = []
+    while True:
+        try:
+            changes.append(feed.get(timeout=0))
+        except queue.Empty:
+            return changes
+
+
+class FeedTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        rate.value = 2
+
+    def test_kinds(self):
+        a_id, _ = a.helper.make_node_id_pair((), {})
+        b_id, _ = b.helper.make_node_id_pair((1,), {})
+        c_id, _ = c.helper.make_node_id_pair((), {})
+        with ce.feed() as feed:
+            c()
+            self.assertListEqual(
+                [(change.node_id, change.kind) for change in drain(feed)],
+                [(a_id, "calculated"), (b_id, "calculated"), (c_id, "calculated")],
+            )
+            a.set_value_and_invalidate(20)
+            changes = [tuple(change) for change in drain(feed)]
+            self.assertTupleEqual(changes[0], (a_id, "set", 20))
+            self.assertSetEqual(
+                set(changes[1:]),
+                {(b_id, "invalidated", None), (c_id, "invalidated", None)},
+            )
+        self.assertListEqual(ce.feeds, [])
+
+    def test_filters(self):
+        with ce.feed(prefix=PATH, kinds=["calculated"]) as by_prefix, ce.feed(
+            functions=[c, rate]
+        ) as by_function:
+            c()
+            rate.value = 3
+            self.assertEqual(len(drain(by_prefix)), 2)
+            self.assertListEqual(
+                [(change.kind, change.value) for change in drain(by_function)],
+                [("calculated", 21), ("set", 3), ("invalidated", None)],
+            )
+
+    def test_clear_cache(self):
+        with ce.feed(kinds=["invalidated"]) as feed:
+            c()
+            ce.clear_cache()
+            self.assertEqual(len(drain(feed)), 3)
+
+    def test_backpressure(self):
+        with ce.feed(maxsize=2, overflow="drop_oldest") as feed:
+            c()
+            self.assertEqual(feed.dropped, 1)
+            self.assertEqual(len(drain(feed)), 2)
+
+        # blocking feed consumed by another thread
+        ce.clear_cache()
+        feed = ce.feed(maxsize=1)
+        received = []
+        consumer = threading.Thread(target=lambda: received.extend(feed))
+        consumer.start()
+        c()
+        feed.close()
+        consumer.join(5)
+        self.assertEqual(len(received), 3)
+
+    def test_async(self):
+        async def main():
+            feed = ce.feed(functions=[c])
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, c)
+            feed.close()
+            return [change.value async for change in feed]
+
+        self.assertListEqual(asyncio.run(main()), [21])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from collections import Counter
+
+from calcengine import CalcEngine
+from calcengine.fingerprint import fingerprint
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PATH = "test."
+
+ce = CalcEngine()
+calls = Counter()
+
+
+@ce.watch(path=PATH)
+def total(values, weights=None):
+    calls["total"] += 1
+    weights = weights or {}
+    return sum(v * weights.get(i, 1) for i, v in enumerate(values))
+
+
+@ce.watch(path=PATH, key=lambda x: x.lower())
+def shout(text):
+    calls["shout"] += 1
+    return text.upper()
+
+
+@ce.watch(path=PATH)
+def describe(value):
+    return type(value).__name__
+
+
+class Unhashable:
+    __hash__ = None  # type: ignore
+
+
+class FingerprintTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        calls.clear()
+
+    def test_containers(self):
+        self.assertEqual(fingerprint(1), 1)
+        self.assertEqual(fingerprint([1, [2]]), fingerprint([1, [2]]))
+        self.assertNotEqual(fingerprint([1, 2]), fingerprint((1, 2)))
+        self.assertEqual(
+            fingerprint({"a": [1], "b": 2}), fingerprint({"b": 2, "a": [1]})
+        )
+        with self.assertRaises(TypeError):
+            fingerprint([Unhashable()])
+
+    def test_unhashable_arguments(self):
+        self.assertEqual(total([1, 2, 3]), 6)
+        self.assertEqual(total([1, 2, 3]), 6)
+        self.assertEqual(total([1, 2, 3], weights={0: 10}), 15)
+        self.assertEqual(calls["total"], 2)
+
+        total.invalidate([1, 2, 3])
+        self.assertEqual(total([1, 2, 3]), 6)
+        self.assertEqual(calls["total"], 3)
+
+        # fingerprints never equal hashable arguments
+        self.assertEqual(describe([1, 2]), "list")
+        self.assertEqual(describe(("list", (1, 2))), "tuple")
+        self.assertNotEqual(fingerprint([1, 2]), ("list", (1, 2)))
+
+    def test_key(self):
+        self.assertEqual(shout("Hi"), "HI")
+        self.assertEqual(shout("hI"), "HI")
+        self.assertEqual(calls["shout"], 1)
+
+    @unittest.skipIf(np is None, "numpy not installed")
+    def test_numpy(self):
+        a = np.arange(1000.0)
+        self.assertEqual(total(a), a.sum())
+        self.assertEqual(total(a.copy()), a.sum())
+        self.assertEqual(calls["total"], 1)
+
+        # views are fingerprinted by contents, dtype and shape
+        self.assertNotEqual(fingerprint(a[::2]), fingerprint(a[:500]))
+        self.assertEqual(fingerprint(a[::2]), fingerprint(a[::2].copy()))
+        self.assertNotEqual(fingerprint(a), fingerprint(a.astype(np.float32)))
+        self.assertNotEqual(fingerprint(a), fingerprint(a.reshape(10, 100)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,11 @@
 import unittest
 
-from calcengine.function_helper import find_calls
+from calcengine.function_helper import (
+    FunctionHelper,
+    find_calls,
+    make_normalizer,
+    node_label,
+)
 
 
 def x(*args, **kwds):
@@ -21,6 +26,23 @@ def foo2(a, b):
     y(9, 8)
 
 
+def foo4(a):
+    # nested code, calls with non constant arguments are skipped
+    f = lambda: x(1, k="v")  # noqa: E731
+    return [y(i) for i in range(2)] + [y(a), x(y(3), 4), f()]
+
+
+def make_foo5():
+    z = x
+
+    def foo5():
+        if z(1):
+            return y(2)
+        return z(3, y=y)
+
+    return foo5
+
+
 x.helper = None
 y.helper = None
 
@@ -40,6 +62,9 @@ class Foo:
         self.p(1, 5)
         self.q(2, 3, r=10)
 
+    def foo6(self):
+        return self.p(-1) or (lambda: self.q(r=None))()
+
 
 class FunctionHelperTestCase(unittest.TestCase):
     def test_find_calls(self):
@@ -47,6 +72,9 @@ class FunctionHelperTestCase(unittest.TestCase):
             [foo1, [["x", (2, 3, 4), {}], ["y", (9, 8), {}]]],
             [foo2, [["x", (2, 3), {"y": 4}], ["y", (9, 8), {}]]],
             [Foo().foo3, [['p', (1, 5), {}], ['q', (2, 3), {'r': 10}]]],
+            [foo4, [["x", (1,), {"k": "v"}], ["y", (3,), {}]]],
+            [make_foo5(), [["x", (1,), {}], ["y", (2,), {}]]],
+            [Foo().foo6, [["p", (-1,), {}], ["q", (), {"r": None}]]],
         ]:
             with self.subTest(func.__name__):
                 this = getattr(func, "__self__", None)
@@ -54,6 +82,45 @@ class FunctionHelperTestCase(unittest.TestCase):
                 found_with_names = [[f[0].__name__, f[1], f[2]] for f in found]
                 self.assertListEqual(found_with_names, expected)
 
+    def test_normalizer(self):
+        def func(a, b=2, *args, c, d=4, **kwds):
+            pass
+
+        normalize = make_normalizer(func)
+        canonical = ((1, 2), {"c": 3, "d": 4})
+        for args, kwds in [
+            [(1,), {"c": 3}],
+            [(1, 2), {"d": 4, "c": 3}],
+            [(), {"c": 3, "b": 2, "a": 1}],
+        ]:
+            with self.subTest(args=args, kwds=kwds):
+                self.assertTupleEqual(normalize(args, kwds), canonical)
+        self.assertTupleEqual(
+            normalize((1, 2, 5), {"z": 0, "c": 3}),
+            ((1, 2, 5), {"c": 3, "d": 4, "z": 0}),
+        )
+
+        # invalid calls are unchanged
+        for args, kwds in [[(1,), {}], [(1,), {"a": 1, "c": 3}]]:
+            self.assertTupleEqual(normalize(args, kwds), (args, kwds))
+
+        # positional only parameters and complete positional calls
+        normalize = make_normalizer(lambda a, /, b: None)
+        self.assertTupleEqual(normalize((1,), {"b": 2}), ((1, 2), {}))
+        self.assertTupleEqual(normalize((), {"a": 1, "b": 2}), ((), {"a": 1, "b": 2}))
+        args = (1, 2)
+        self.assertIs(normalize(args, {})[0], args)
+
+    def test_node_label(self):
+        fh = FunctionHelper(x, typed_key=False, path="test", alias="x")
+        for args, kwds, label in [
+            [(), {}, "test.x()"],
+            [(5,), {"y": -3}, "test.x(5, y=-3)"],
+            [("a", None), {}, "test.x('a', None)"],
+        ]:
+            _, long_id = fh.make_node_id_pair(args, kwds)
+            self.assertEqual(node_label(long_id), label)
+
 
 if __name__ == "__main__":
     unittest.main()
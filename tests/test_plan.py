@@ -0,0 +1,166 @@
+import io
+import pickle
+import subprocess
+import sys
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from calcengine import CalcEngine
+
+PATH = "test."
+
+ce = CalcEngine()
+
+rate = ce.var("rate", 2)
+
+calls = []
+
+
+@ce.watch(path=PATH)
+def a():
+    calls.append("a")
+    return 100
+
+
+@ce.watch(path=PATH)
+def b():
+    calls.append("b")
+    return a() * rate()
+
+
+@ce.watch(path=PATH)
+def c(x, y):
+    calls.append("c")
+    return 2 * a() + x * y
+
+
+@ce.watch(path=PATH)
+def d(x, y=0):
+    calls.append("d")
+    return 3 * b() + x - y
+
+
+@ce.watch(path=PATH)
+def e():
+    calls.append("e")
+    _x = d(5, y=-3)
+    return c(2, 3) - 5 + _x
+
+
+@ce.watch(path=PATH)
+def f():
+    calls.append("f")
+    return d(0) + e()
+
+
+# passed only by steps run concurrently
+barrier = threading.Barrier(2, timeout=5)
+
+
+@ce.watch(path=PATH)
+def left():
+    barrier.wait()
+    return 1
+
+
+@ce.watch(path=PATH)
+def right():
+    barrier.wait()
+    return 2
+
+
+@ce.watch(path=PATH)
+def both():
+    return left() + right()
+
+
+class Foo:
+    @ce.watch(path=PATH)
+    def g(self, x):
+        calls.append("g")
+        return self.h() + c(2, 1) + x
+
+    @ce.watch(path=PATH)
+    def h(self):
+        calls.append("h")
+        return 1
+
+
+class PlanTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        rate.value = 2
+        calls.clear()
+
+    def test_order(self):
+        plan = ce.plan(f)
+        names = [step.func.__name__ for step in plan]
+        self.assertEqual(names[-1], "f")
+        for before, after in [("a", "b"), ("b", "d"), ("c", "e"), ("d", "e")]:
+            self.assertLess(names.index(before), names.index(after))
+        self.assertListEqual(
+            [[step.func.__name__ for step in level] for level in plan.levels()],
+            [["a"], ["b", "c"], ["d", "d"], ["e"], ["f"]],
+        )
+
+    def test_run(self):
+        plan = ce.plan(f)
+        self.assertEqual(plan.run(), 1409)
+        # each node calculated once, without recursion
+        self.assertListEqual(calls, ["a", "b", "d", "d", "c", "e", "f"])
+        calls.clear()
+        self.assertEqual(f(), 1409)
+        self.assertListEqual(calls, [])
+
+        # plans are reusable after invalidation
+        rate.value = 3
+        self.assertEqual(plan.run(ThreadPoolExecutor(4)), 2009)
+        self.assertListEqual(sorted(calls), ["b", "d", "d", "e", "f"])
+
+    def test_concurrent(self):
+        plan = ce.plan(both)
+        self.assertListEqual(
+            [[step.func.__name__ for step in level] for level in plan.levels()],
+            [["left", "right"], ["both"]],
+        )
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(plan.run(executor), 3)
+
+    def test_method(self):
+        foo = Foo()
+        plan = ce.plan(Foo.g, foo, 5)
+        self.assertListEqual(
+            [step.func.__name__ for step in plan], ["h", "a", "c", "g"]
+        )
+        self.assertEqual(plan.run(), 208)
+        self.assertEqual(len(calls), 4)
+
+    def test_save(self):
+        file = io.BytesIO()
+        ce.plan(f).save(file)
+        file.seek(0)
+        plan = ce.load_plan(file)
+        self.assertEqual(len(plan), 7)
+        self.assertEqual(plan.run(), 1409)
+
+    def test_save_across_processes(self):
+        file = io.BytesIO()
+        ce.plan(f).save(file)
+        script = (
+            "import pickle, sys\n"
+            "from tests.test_plan import ce\n"
+            "plan = ce.load_plan(sys.stdin.buffer)\n"
+            "sys.stdout.buffer.write(pickle.dumps(plan.run()))\n"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", script],
+            input=file.getvalue(),
+            capture_output=True,
+            check=True,
+        ).stdout
+        self.assertEqual(pickle.loads(out), 1409)
+
+
+if __name__ == "__main__":
+    unittest.main()
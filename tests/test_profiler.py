@@ -0,0 +1,68 @@
+import unittest
+import time
+
+from calcengine import CalcEngine
+
+PATH = "test."
+
+ce = CalcEngine()
+
+
+@ce.watch(path=PATH)
+def a():
+    time.sleep(0.01)
+    return 1
+
+
+@ce.watch(path=PATH)
+def b(x):
+    return a() + x
+
+
+@ce.watch(path=PATH)
+def c():
+    return b(1) + b(2) + a()
+
+
+class ProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+
+    def tearDown(self):
+        ce.disable_profiling()
+
+    def test_disabled(self):
+        self.assertIsNone(ce.profiler)
+        c()
+        self.assertIsNone(ce.disable_profiling())
+
+    def test_stats(self):
+        profiler = ce.enable_profiling()
+        c()
+        c()
+
+        funcs = profiler.by_function()
+        self.assertEqual(funcs[f"{PATH}.a"].misses, 1)
+        self.assertEqual(funcs[f"{PATH}.a"].hits, 2)
+        self.assertEqual(funcs[f"{PATH}.b"].misses, 2)
+        self.assertEqual(funcs[f"{PATH}.c"].calls, 2)
+
+        # inclusive time of c includes a's sleep but exclusive does not
+        stats_c = funcs[f"{PATH}.c"]
+        self.assertGreaterEqual(stats_c.inclusive, 0.01)
+        self.assertLess(stats_c.exclusive, 0.01)
+        self.assertGreater(stats_c.size, 0)
+
+        node_id, stats = profiler.top(1)[0]
+        self.assertEqual(stats.name, f"{PATH}.a")
+
+        stacks = dict(line.rsplit(" ", 1) for line in profiler.collapsed().splitlines())
+        self.assertSetEqual(
+            set(stacks),
+            {f"{PATH}.c", f"{PATH}.c;{PATH}.b", f"{PATH}.c;{PATH}.b;{PATH}.a"},
+        )
+        self.assertGreaterEqual(int(stacks[f"{PATH}.c;{PATH}.b;{PATH}.a"]), 10000)
+
+
+if __name__ == "__main__":
+    unittest.main()
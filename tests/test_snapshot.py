@@ -0,0 +1,95 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+from calcengine import CalcEngine
+
+PATH = "test."
+
+ce = CalcEngine()
+calls = Counter()
+
+rate = ce.var("rate", 2)
+
+
+@ce.watch(path=PATH)
+def notional(x):
+    calls["notional"] += 1
+    return bytearray(b"x" * x)
+
+
+@ce.watch(path=PATH)
+def interest():
+    calls["interest"] += 1
+    return len(notional(100)) * rate()
+
+
+class Foo:
+    @ce.watch(path=PATH)
+    def a(self):
+        return 1
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        calls.clear()
+        rate.value = 2
+
+    def test_restore(self):
+        self.assertEqual(interest(), 200)
+        Foo().a()
+        fp = io.BytesIO()
+        ce.snapshot(fp)
+
+        ce.clear_cache()
+        fp.seek(0)
+        # method nodes are not restored
+        self.assertEqual(ce.restore(fp), 2)
+        self.assertEqual(interest(), 200)
+        self.assertEqual(calls, Counter(interest=1, notional=1))
+
+        # graph and readers of variables are restored
+        rate.value = 3
+        self.assertEqual(interest(), 300)
+        self.assertEqual(calls, Counter(interest=2, notional=1))
+
+        # values of variables are restored with nodes reading them
+        rate.value = 5
+        fp.seek(0)
+        ce.restore(fp)
+        self.assertEqual(rate.value, 2)
+        self.assertEqual(interest(), 200)
+        rate.value = 4
+        self.assertEqual(interest(), 400)
+
+    def test_other_process(self):
+        self.assertEqual(interest(), 200)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.bin")
+            ce.snapshot(path)
+            code = (
+                "from tests.test_snapshot import ce, calls, interest, notional;"
+                f"ce.restore({path!r});"
+                "print(interest(), len(notional(100)), sum(calls.values()))"
+            )
+            output = subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                text=True,
+                check=True,
+                env=dict(os.environ, PYTHONHASHSEED="1234"),
+            ).stdout
+        self.assertEqual(output.split(), ["200", "100", "0"])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ce.restore(io.BytesIO(b"not a snapshot"))
+
+
+if __name__ == "__main__":
+    unittest.main()
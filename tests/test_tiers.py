@@ -0,0 +1,136 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+
+from calcengine import CalcEngine
+from calcengine.node import NodeData
+from calcengine.tiers import (
+    COLD,
+    HOT,
+    WARM,
+    ColdNodeData,
+    WarmNodeData,
+    pickled_size,
+)
+
+PATH = "test."
+
+ce = CalcEngine()
+
+
+@ce.watch(path=PATH)
+def v(i):
+    return str(i) * 1000
+
+
+@ce.watch(path=PATH)
+def slow():
+    time.sleep(0.01)
+    return "s" * 1000
+
+
+@ce.watch(path=PATH)
+def total():
+    return len(slow() + v(1) + v(2) + v(3) + v(4))
+
+
+class TiersTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        self.directory = tempfile.TemporaryDirectory()
+        self.tiers = ce.enable_tiering(
+            hot_bytes=2500, warm_bytes=50, directory=self.directory.name
+        )
+
+    def tearDown(self):
+        ce.disable_tiering()
+        self.directory.cleanup()
+
+    def node(self, func, *args):
+        return ce.cache[func.helper.make_node_id_pair(args, {})[0]]
+
+    def test_spill(self):
+        self.assertEqual(total(), 5000)
+        stats = self.tiers.stats
+        self.assertEqual(sum(s.nodes for s in stats.values()), 6)
+        self.assertLessEqual(stats[HOT].bytes, 2500)
+        self.assertLessEqual(stats[WARM].bytes, 50)
+        self.assertGreater(stats[COLD].nodes, 0)
+        self.assertEqual(len(os.listdir(self.directory.name)), stats[COLD].nodes)
+
+        # expensive nodes stay in memory
+        self.assertIs(type(self.node(slow)), NodeData)
+
+        # reading promotes transparently
+        cold = [i for i in range(1, 5) if type(self.node(v, i)) is ColdNodeData]
+        self.assertEqual(v(cold[0]), str(cold[0]) * 1000)
+        self.assertEqual(stats[HOT].promotions, 1)
+        self.assertEqual(stats[COLD].hits, 1)
+        self.assertEqual(total(), 5000)
+
+    def test_invalidate(self):
+        total()
+        cold = [i for i in range(1, 5) if type(self.node(v, i)) is ColdNodeData]
+        files = len(os.listdir(self.directory.name))
+        v.invalidate(cold[0])
+        self.assertEqual(len(os.listdir(self.directory.name)), files - 1)
+        self.assertEqual(
+            sum(s.nodes for s in self.tiers.stats.values()), len(ce.cache)
+        )
+
+        ce.clear_cache()
+        self.assertListEqual(os.listdir(self.directory.name), [])
+
+    def test_disable(self):
+        total()
+        v.set_value_and_invalidate("x", 1)
+        self.assertEqual(v(1), "x")
+        tiered = (WarmNodeData, ColdNodeData)
+        self.assertTrue(any(isinstance(node, tiered) for node in ce.cache.values()))
+        ce.disable_tiering()
+        self.assertTrue(all(type(node) is NodeData for node in ce.cache.values()))
+        self.assertEqual(total(), 4001)
+
+    def test_snapshot(self):
+        total()
+        files = sorted(os.listdir(self.directory.name))
+        file = io.BytesIO()
+        ce.snapshot(file)
+
+        # tiered nodes are written without promoting them
+        stats = self.tiers.stats
+        self.assertEqual(stats[HOT].promotions, 0)
+        self.assertListEqual(sorted(os.listdir(self.directory.name)), files)
+
+        file.seek(0)
+        self.assertEqual(ce.restore(file), 6)
+
+        # restored nodes are tracked, tiered nodes stay tiered
+        self.assertEqual(sum(s.nodes for s in stats.values()), 6)
+        self.assertGreater(stats[HOT].bytes, 0)
+        self.assertLessEqual(stats[HOT].bytes, 2500)
+        tiered = [i for i in range(1, 5) if type(self.node(v, i)) is not NodeData]
+        self.assertTrue(tiered)
+        self.assertListEqual(
+            [v(i) for i in range(1, 5)], [str(i) * 1000 for i in range(1, 5)]
+        )
+        self.assertGreaterEqual(stats[HOT].promotions, len(tiered))
+
+    def test_containers(self):
+        value = {i: [i] * 1000 for i in range(10)}
+        self.assertGreater(pickled_size(value), 10000)
+
+        @ce.watch(path=PATH)
+        def frames():
+            return value
+
+        # items of containers count towards the hot tier
+        frames()
+        self.assertLessEqual(self.tiers.stats[HOT].bytes, 2500)
+        self.assertIsNot(type(self.node(frames)), NodeData)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import threading
+import unittest
+from collections import Counter
+
+from calcengine import CalcEngine
+
+PATH = "test."
+
+ce = CalcEngine()
+calls = Counter()
+now = [0.0]
+ce.clock = lambda: now[0]
+
+# blocks price refresh until set
+release = threading.Event()
+
+
+@ce.watch(path=PATH, ttl=5)
+def price(x):
+    calls["price"] += 1
+    return 100 * x + now[0]
+
+
+@ce.watch(path=PATH)
+def reference():
+    calls["reference"] += 1
+    return 1
+
+
+@ce.watch(path=PATH)
+def value():
+    calls["value"] += 1
+    return price(2) + reference()
+
+
+@ce.watch(path=PATH, ttl=5, stale_while_revalidate=10)
+def quote():
+    calls["quote"] += 1
+    if now[0]:
+        release.wait(5)
+    return now[0]
+
+
+class TTLTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        calls.clear()
+        now[0] = 0.0
+        release.clear()
+
+    def test_expiry(self):
+        self.assertEqual(value(), 201)
+        now[0] = 4.0
+        self.assertEqual(value(), 201)
+        self.assertEqual(calls, Counter(value=1, price=1, reference=1))
+
+        # dependants expire with their requirements
+        now[0] = 5.0
+        self.assertEqual(value(), 206)
+        self.assertEqual(calls, Counter(value=2, price=2, reference=1))
+        self.assertListEqual(price.map([2, 3]), [205, 305])
+        self.assertEqual(calls["price"], 3)
+
+        now[0] = 12.0
+        self.assertListEqual(price.map([2, 3]), [212, 312])
+        self.assertEqual(calls["price"], 5)
+
+    def test_stale_while_revalidate(self):
+        refreshed = threading.Event()
+        quote.node_calculated.append(lambda value: refreshed.set())
+        try:
+            self.assertEqual(quote(), 0.0)
+            refreshed.clear()
+
+            # stale value served while recalculated in background
+            now[0] = 6.0
+            self.assertEqual(quote(), 0.0)
+            self.assertEqual(quote(), 0.0)
+            release.set()
+            self.assertTrue(refreshed.wait(5))
+            self.assertEqual(quote(), 6.0)
+            self.assertEqual(calls["quote"], 2)
+
+            # beyond window callers wait for recalculation
+            now[0] = 30.0
+            self.assertEqual(quote(), 30.0)
+            self.assertEqual(calls["quote"], 3)
+        finally:
+            quote.node_calculated.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from collections import Counter
+
+from calcengine import CalcEngine
+
+PATH = "test."
+
+ce = CalcEngine()
+calls = Counter()
+
+rate = ce.var("rate", 2)
+scale = ce.var("scale", 10)
+
+
+@ce.watch(path=PATH)
+def interest():
+    calls["interest"] += 1
+    return 100 * rate()
+
+
+@ce.watch(path=PATH)
+def scaled():
+    calls["scaled"] += 1
+    return scale() * 3
+
+
+@ce.watch(path=PATH)
+def dynamic(inputs):
+    # variables read without a call in the body
+    calls["dynamic"] += 1
+    return sum(v() for v in inputs)
+
+
+@ce.watch(path=PATH)
+def total():
+    calls["total"] += 1
+    return interest() + scaled()
+
+
+class VarTestCase(unittest.TestCase):
+    def setUp(self):
+        ce.clear_cache()
+        calls.clear()
+        rate.value = 2
+        scale.value = 10
+
+    def test_readers(self):
+        self.assertEqual(total(), 230)
+        interest_id, _ = interest.helper.make_node_id_pair((), {})
+        self.assertSetEqual(rate.readers, {interest_id})
+
+        # only readers and nodes requiring them are invalidated
+        rate.value = 3
+        self.assertEqual(total(), 330)
+        self.assertEqual(calls, Counter(interest=2, scaled=1, total=2))
+
+        # unchanged value does not invalidate
+        self.assertFalse(rate.set(3))
+        self.assertEqual(total(), 330)
+        self.assertEqual(calls, Counter(interest=2, scaled=1, total=2))
+
+    def test_read_when_called(self):
+        inputs = (rate, scale)
+        self.assertEqual(dynamic(inputs), 12)
+        dynamic_id, _ = dynamic.helper.make_node_id_pair((inputs,), {})
+        self.assertIn(dynamic_id, rate.readers)
+        self.assertIn(dynamic_id, scale.readers)
+
+        scale.value = 20
+        self.assertEqual(dynamic(inputs), 22)
+        self.assertEqual(calls["dynamic"], 2)
+
+    def test_events_and_duplicates(self):
+        values = []
+        scale.node_value_set.append(values.append)
+        try:
+            scale.value = 10
+            scale.value = 20
+            self.assertListEqual(values, [20])
+        finally:
+            scale.node_value_set.remove(values.append)
+        with self.assertRaises(ValueError):
+            ce.var("rate")
+
+    def test_context(self):
+        self.assertEqual(total(), 230)
+        with ce.context():
+            rate.value = 5
+            self.assertEqual(rate(), 5)
+            self.assertEqual(total(), 530)
+        self.assertEqual(rate(), 2)
+        self.assertEqual(total(), 230)
+
+
+if __name__ == "__main__":
+    unittest.main()